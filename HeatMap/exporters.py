@@ -0,0 +1,236 @@
+# exporters.py
+
+import json
+import struct
+import numpy as np
+from django.core.files import File
+from .geometry import face_ids, fan_triangles
+
+# Rows formatted per string operation and bytes per emitted chunk
+FORMAT_CHUNK_ROWS = 65536
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+class ChunkedContent(File):
+    """
+    File whose content is produced lazily by an iterator of byte chunks,
+    so ``Storage.save()`` streams it to the backend without buffering it.
+    """
+
+    def __init__(self, chunks, name=None):
+        super().__init__(None, name)
+        self._chunks = chunks
+
+    def chunks(self, chunk_size=None):
+        yield from self._chunks
+
+    def multiple_chunks(self, chunk_size=None):
+        return True
+
+
+def encode_chunks(pieces, buffer_size=WRITE_BUFFER_SIZE):
+    """Join an iterator of text (or bytes) pieces into byte chunks of about ``buffer_size``."""
+    parts, size = [], 0
+    for piece in pieces:
+        data = piece.encode('ascii') if isinstance(piece, str) else piece
+        parts.append(data)
+        size += len(data)
+        if size >= buffer_size:
+            yield b''.join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def format_rows(line_format, rows):
+    # One %-format call per chunk instead of one per row
+    rows = np.asarray(rows)
+    for start in range(0, len(rows), FORMAT_CHUNK_ROWS):
+        chunk = rows[start:start + FORMAT_CHUNK_ROWS]
+        yield (line_format * len(chunk)) % tuple(chunk.ravel().tolist())
+
+
+def _face_layouts(mesh):
+    """
+    Per-face corner layout: bit 1 when the face references texture
+    coordinates, bit 2 when it references normals.
+    """
+    first_corners = mesh.face_offsets[:-1]
+    layouts = np.zeros(mesh.face_count, dtype=np.int64)
+    if mesh.face_texcoords is not None:
+        layouts |= (mesh.face_texcoords[first_corners] >= 0).astype(np.int64)
+    if mesh.face_normals is not None:
+        layouts |= (mesh.face_normals[first_corners] >= 0).astype(np.int64) << 1
+    return layouts
+
+
+_CORNER_FORMATS = {0: "%d", 1: "%d/%d", 2: "%d//%d", 3: "%d/%d/%d"}
+
+
+def border_edges(mesh):
+    """Unique undirected edges of all faces as a (E, 2) array of vertex ids."""
+    corners = mesh.face_vertices.astype(np.int64)
+    nonempty = np.diff(mesh.face_offsets) > 0
+    following = np.arange(len(corners)) + 1
+    # The last corner of every face wraps around to its first one
+    following[mesh.face_offsets[1:][nonempty] - 1] = mesh.face_offsets[:-1][nonempty]
+    a, b = corners, corners[following]
+    keys = np.unique(np.minimum(a, b) * len(mesh.vertices) + np.maximum(a, b))
+    return np.stack(np.divmod(keys, len(mesh.vertices)), axis=1)
+
+
+def iter_heatmap_obj(mesh, material_indices, materials, mtl_file_name, border_material=None):
+    """
+    Stream ``mesh`` as OBJ in byte chunks, with face ``i`` using
+    ``materials[material_indices[i]]``.
+
+    Geometry comes straight from the mesh arrays, faces are grouped so each
+    material is selected once, and face outlines (if ``border_material`` is
+    given) are emitted once per shared edge as ``l`` elements.
+    """
+    return encode_chunks(_obj_pieces(mesh, material_indices, materials, mtl_file_name, border_material))
+
+
+def _obj_pieces(mesh, material_indices, materials, mtl_file_name, border_material):
+    yield f"mtllib {mtl_file_name}\n"
+    yield from format_rows("v %.6f %.6f %.6f\n", mesh.vertices)
+    if len(mesh.texcoords):
+        yield from format_rows("vt %.6f %.6f\n", mesh.texcoords)
+    if len(mesh.normals):
+        yield from format_rows("vn %.4f %.4f %.4f\n", mesh.normals)
+
+    # Group faces by material, then by corner layout and size so that every
+    # group can be formatted with one fixed line format
+    sizes = np.diff(mesh.face_offsets)
+    layouts = _face_layouts(mesh)
+    order = np.lexsort((sizes, layouts, material_indices))
+    keys = np.stack((material_indices[order], layouts[order], sizes[order]), axis=1)
+    boundaries = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+    group_starts = np.concatenate(([0], boundaries))
+    group_ends = np.concatenate((boundaries, [len(order)]))
+
+    current_material = None
+    for start, end in zip(group_starts, group_ends):
+        material, layout, size = keys[start]
+        if size == 0:
+            continue
+        if material != current_material:
+            yield f"usemtl {materials[material]}\n"
+            current_material = material
+        faces = order[start:end]
+        positions = (mesh.face_offsets[faces][:, None] + np.arange(size)).ravel()
+        columns = [mesh.face_vertices[positions]]
+        if layout & 1:
+            columns.append(mesh.face_texcoords[positions])
+        if layout & 2:
+            columns.append(mesh.face_normals[positions])
+        corners = np.stack(columns, axis=1).astype(np.int64) + 1
+        line_format = "f " + " ".join([_CORNER_FORMATS[layout]] * size) + "\n"
+        yield from format_rows(line_format, corners.reshape(len(faces), -1))
+
+    if border_material is not None:
+        yield f"usemtl {border_material}\n"
+        yield from format_rows("l %d %d\n", border_edges(mesh) + 1)
+
+
+def iter_mtl(colors, extra_materials=None):
+    """Stream an MTL library with one ``color_i`` material per '#RRGGBB' color."""
+    lines = []
+    for i, color in enumerate(colors):
+        r, g, b = [int(color[j:j + 2], 16) / 255.0 for j in (1, 3, 5)]
+        lines.append(f"newmtl color_{i}\nKd {r:.2f} {g:.2f} {b:.2f}\n")
+    for name, (r, g, b) in (extra_materials or {}).items():
+        lines.append(f"newmtl {name}\nKd {r:.1f} {g:.1f} {b:.1f}\n")
+    return encode_chunks(lines)
+
+
+# glTF constants
+_GLB_MAGIC = 0x46546C67
+_CHUNK_JSON = 0x4E4F534A
+_CHUNK_BIN = 0x004E4942
+_FLOAT = 5126
+_UNSIGNED_BYTE = 5121
+_UNSIGNED_INT = 5125
+_ARRAY_BUFFER = 34962
+_ELEMENT_ARRAY_BUFFER = 34963
+
+
+def hex_to_rgba(colors):
+    """Convert '#RRGGBB' strings to an (N, 4) uint8 array in linear colour space, as glTF expects."""
+    srgb = np.array([[int(color[i:i + 2], 16) for i in (1, 3, 5)] for color in colors]) / 255.0
+    linear = np.where(srgb <= 0.04045, srgb / 12.92, ((srgb + 0.055) / 1.055) ** 2.4)
+    rgba = np.concatenate((linear, np.ones((len(colors), 1))), axis=1)
+    return np.round(rgba * 255).astype(np.uint8)
+
+
+def iter_heatmap_glb(mesh, face_colors=None, face_values=None, face_normals=None, face_attributes=None):
+    """
+    Stream ``mesh`` as a binary glTF (GLB) in byte chunks.
+
+    Corners are unshared so per-face data can be stored as vertex
+    attributes: ``face_colors`` (F, 4) uint8 becomes COLOR_0, ``face_values``
+    a float ``_POTENTIAL`` attribute and ``face_normals`` the flat-shading
+    NORMAL; ``face_attributes`` maps extra custom attribute names (``_NAME``)
+    to per-face arrays, written as UNSIGNED_INT when they are integers (so
+    ids stay exact past float32's 2**24) and FLOAT otherwise. Faces are
+    fan-triangulated; every buffer is written straight from the arrays.
+    """
+    corner_faces = face_ids(mesh.face_offsets)
+    triangles, _ = fan_triangles(mesh.face_offsets)
+    positions = np.asarray(mesh.vertices, dtype=np.float32)[mesh.face_vertices]
+
+    views = [(positions, _FLOAT, 'VEC3', _ARRAY_BUFFER, 'POSITION')]
+    if face_normals is not None:
+        views.append((np.asarray(face_normals, dtype=np.float32)[corner_faces], _FLOAT, 'VEC3', _ARRAY_BUFFER, 'NORMAL'))
+    if face_colors is not None:
+        views.append((np.asarray(face_colors, dtype=np.uint8)[corner_faces], _UNSIGNED_BYTE, 'VEC4', _ARRAY_BUFFER, 'COLOR_0'))
+    if face_values is not None:
+        views.append((np.asarray(face_values, dtype=np.float32)[corner_faces], _FLOAT, 'SCALAR', _ARRAY_BUFFER, '_POTENTIAL'))
+    for name, values in (face_attributes or {}).items():
+        values = np.asarray(values)
+        if np.issubdtype(values.dtype, np.integer):
+            views.append((values.astype(np.uint32)[corner_faces], _UNSIGNED_INT, 'SCALAR', _ARRAY_BUFFER, name))
+        else:
+            views.append((values.astype(np.float32)[corner_faces], _FLOAT, 'SCALAR', _ARRAY_BUFFER, name))
+    views.append((triangles.astype(np.uint32).ravel(), _UNSIGNED_INT, 'SCALAR', _ELEMENT_ARRAY_BUFFER, None))
+
+    buffer_views, accessors, attributes = [], [], {}
+    offset = 0
+    for index, (array, component_type, kind, target, attribute) in enumerate(views):
+        byte_length = array.nbytes
+        buffer_views.append({'buffer': 0, 'byteOffset': offset, 'byteLength': byte_length, 'target': target})
+        accessor = {
+            'bufferView': index, 'componentType': component_type,
+            'count': len(array), 'type': kind,
+        }
+        if attribute == 'COLOR_0':
+            accessor['normalized'] = True
+        if attribute == 'POSITION':
+            accessor['min'] = positions.min(axis=0).tolist() if len(positions) else [0, 0, 0]
+            accessor['max'] = positions.max(axis=0).tolist() if len(positions) else [0, 0, 0]
+        accessors.append(accessor)
+        if attribute:
+            attributes[attribute] = index
+        # Every buffer view starts on a 4-byte boundary
+        offset += byte_length + (-byte_length % 4)
+
+    gltf = {
+        'asset': {'version': '2.0', 'generator': 'Solaris HeatMap'},
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0}],
+        'meshes': [{'primitives': [{'attributes': attributes, 'indices': len(views) - 1, 'mode': 4}]}],
+        'buffers': [{'byteLength': offset}],
+        'bufferViews': buffer_views,
+        'accessors': accessors,
+    }
+    json_chunk = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+    json_chunk += b' ' * (-len(json_chunk) % 4)
+
+    total_length = 12 + 8 + len(json_chunk) + 8 + offset
+    yield struct.pack('<III', _GLB_MAGIC, 2, total_length)
+    yield struct.pack('<II', len(json_chunk), _CHUNK_JSON) + json_chunk
+    yield struct.pack('<II', offset, _CHUNK_BIN)
+    for array, *_ in views:
+        data = np.ascontiguousarray(array).tobytes()
+        yield data + b'\0' * (-len(data) % 4)
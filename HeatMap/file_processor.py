@@ -1,34 +1,58 @@
 # file_processor.py
 
 import os
+import uuid
 import numpy as np
+import pandas as pd
 import math
 from datetime import datetime
-import pytz
 from django.conf import settings
-from datetime import datetime
-from datetime import datetime
+from .mesh import load_obj_mesh
+from .mesh_cache import (
+    get_bvh, get_cached_mesh, get_lod, get_object_index, get_scale, known_object_index, source_version, submesh,
+)
+from .occlusion import shaded_faces
+from .parallel import map_tasks, parallel_enabled, partition, worker_mesh
+from .result_cache import result_cache_key
+from .exporters import encode_chunks, format_rows, hex_to_rgba, iter_heatmap_glb, iter_heatmap_obj, iter_mtl
+from SunLocation.irradiance import CLEARSKY, clearsky_irradiance
+from SunLocation.sites import get_site
+
+# Panel constants; site coordinates come from SunLocation.sites
+EFFICIENCY = 0.15  # η as 15%
+EFFICIENCY_ROOFTOP = 0.18
+EFFICIENCY_BIPV = 0.12
+COLORS = [
+    "#FFD700", "#FFA500", "#FF8C00", "#FF6347", "#FF4500",
+    "#FF0000", "#E34234", "#CD5C5C", "#DC143C", "#B22222",
+    "#8B0000", "#A52A2A", "#800000", "#660000", "#4B0000"
+]
+
+# Files the heatmap can be delivered as, and the compact per-face encodings
+# served against the separately cached geometry asset
+OUTPUT_FORMATS = ('obj', 'glb')
+VALUE_FORMATS = ('bins', 'values')
+
+# 'flat' scales every face by one scene-wide cos θ, 'orientation' uses the
+# angle between each face normal and the sun
+HEATMAP_MODES = ('flat', 'orientation')
+
+# Color scales: equal steps from min to max ('linear'), caller-given
+# breakpoints ('absolute'), equal face counts ('quantile') or equal ratios
+# between the smallest positive value and the max ('log')
+HEATMAP_SCALES = ('linear', 'absolute', 'quantile', 'log')
+
+# Quantiles of larger meshes come from histogram passes of this many bins,
+# filled this many faces at a time
+QUANTILE_HISTOGRAM_BINS = 1 << 16
+QUANTILE_CHUNK = 1 << 20
 
 def parse_obj_file(file_path):
-    vertices = []
-    faces = []
-    with open(file_path, 'r') as file:
-        for line in file:
-            if line.startswith('v '):
-                vertices.append(list(map(float, line.split()[1:4])))
-            elif line.startswith('f '):
-                faces.append([int(i.split('/')[0]) - 1 for i in line.split()[1:]])
-    return np.array(vertices), faces
-
-def calculate_polygon_area(vertices):
-    if len(vertices) < 3:
-        return 0
-    x = vertices[:, 0]
-    z = vertices[:, 2]
-    return 0.5 * np.abs(np.dot(x, np.roll(z, 1)) - np.dot(z, np.roll(x, 1)))
-
-def calculate_cos_theta(latitude, longitude, time):
-    timezone = pytz.timezone('Asia/Kolkata')
+    mesh = load_obj_mesh(file_path)
+    return mesh.vertices, mesh.faces()
+
+def calculate_cos_theta(latitude, longitude, time, tz=None):
+    timezone = tz or get_site().timezone
     dt = timezone.localize(time)
     solar_declination = -23.44 * math.cos(math.radians(360 / 365 * (dt.timetuple().tm_yday + 10)))
     solar_hour_angle = (time.hour - 12) * 15
@@ -39,58 +63,704 @@ def calculate_cos_theta(latitude, longitude, time):
     )
     return max(0, cos_theta)
 
-def update_mtl_file(output_path, colors):
-    with open(output_path, 'w') as file:
-        for i, color in enumerate(colors):
-            r, g, b = [int(color[i:i+2], 16) / 255.0 for i in (1, 3, 5)]
-            file.write(f"newmtl color_{i}\nKd {r:.2f} {g:.2f} {b:.2f}\n")
-        file.write("newmtl black_border\nKd 0.0 0.0 0.0\n")
-    return [f"color_{i}" for i in range(len(colors))] + ["black_border"]
-
-def modify_obj_file(vertices, faces, potentials, ranges, obj_path, output_path, materials, mtl_file_name):
-    with open(obj_path, 'r') as infile, open(output_path, 'w') as outfile:
-        outfile.write(f"mtllib {mtl_file_name}\n")
-        face_index = 0
-        for line in infile:
-            if line.startswith('f '):
-                potential = potentials[face_index]
-                material_index = np.digitize(potential, ranges, right=True)
-                outfile.write(f"usemtl {materials[material_index]}\n")
-                face_index += 1
-            outfile.write(line)
-        for face in faces:
-            for i in range(len(face)):
-                v1, v2 = face[i], face[(i + 1) % len(face)]
-                outfile.write("usemtl black_border\n")
-                outfile.write(f"f {v1 + 1} {v2 + 1} {v2 + 1}\n")
-
-def process_3d_model(solar_irradiance, timestamp):
-    # Define file paths
-    obj_path = os.path.join(settings.MEDIA_ROOT, "model.obj")
-    mtl_path = os.path.join(settings.MEDIA_ROOT, "model.mtl")
-    updated_obj_path = os.path.join(settings.MEDIA_ROOT, "updated.obj")
-    updated_mtl_path = os.path.join(settings.MEDIA_ROOT, "updated.mtl")
-
-    # Constants
-    latitude = 23.030357
-    longitude = 72.517845
-    efficiency = 0.15  # η as 15%
-    colors = [
-        "#FFD700", "#FFA500", "#FF8C00", "#FF6347", "#FF4500",
-        "#FF0000", "#E34234", "#CD5C5C", "#DC143C", "#B22222",
-        "#8B0000", "#A52A2A", "#800000", "#660000", "#4B0000"
-    ]
+def daytime(sun_vectors):
+    # Whether the sun is above the horizon, for one sun vector or a row per timestamp
+    return np.asarray(sun_vectors)[..., 1] > 0
+
+def calculate_incidence(normals, sun_vector):
+    # cos of the incidence angle for every face, back-facing faces clamped
+    # to 0 and every face 0 while the sun is below the horizon
+    if not daytime(sun_vector):
+        return np.zeros(len(normals))
+    return np.clip(normals @ sun_vector, 0, None)
+
+def apply_shadows(cached, potentials, sun_vector):
+    # Zero out faces whose centroid cannot see the sun; only lit faces cast
+    # rays, and a sun below the horizon shades every face
+    if not daytime(sun_vector):
+        potentials[:] = 0
+        return potentials
+    lit = np.flatnonzero(potentials > 0)
+    if len(lit):
+        # A submesh is shaded by the whole model it was cut from
+        source, faces = (cached.parent, cached.parent_faces[lit]) if cached.parent is not None else (cached, lit)
+        bvh = get_bvh(source)
+        if parallel_enabled(len(faces)):
+            tasks = [
+                (source.sidecar_dir, faces[start:stop], sun_vector)
+                for start, stop in partition(len(faces), settings.HEATMAP_PARALLEL_CHUNK_FACES)
+            ]
+            shaded = np.concatenate(map_tasks(_shaded_faces_task, tasks))
+        else:
+            shaded = shaded_faces(bvh, source.centroids[faces], source.unit_normals[faces], faces, sun_vector)
+        potentials[lit[shaded]] = 0
+    return potentials
+
+def _shaded_faces_task(sidecar_dir, faces, sun_vector):
+    # Process-pool side of apply_shadows for one block of faces. The worker
+    # may have mapped the mesh before its BVH was built, so look it up lazily
+    cached = worker_mesh(sidecar_dir)
+    return shaded_faces(get_bvh(cached), cached.centroids[faces], cached.unit_normals[faces], faces, sun_vector)
+
+# Extra material used for the face outlines of OBJ output
+BORDER_MATERIAL = ("black_border", (0.0, 0.0, 0.0))
+
+def calculate_cos_theta_series(latitude, times):
+    # Vectorized calculate_cos_theta over a DatetimeIndex of local times
+    solar_declination = np.radians(-23.44 * np.cos(np.radians(360 / 365 * (times.dayofyear.to_numpy() + 10))))
+    solar_hour_angle = np.radians((times.hour.to_numpy() - 12) * 15)
+    latitude = math.radians(latitude)
+    cos_theta = (
+        math.sin(latitude) * np.sin(solar_declination)
+        + math.cos(latitude) * np.cos(solar_declination) * np.cos(solar_hour_angle)
+    )
+    return np.clip(cos_theta, 0, None)
+
+def face_weights(cached, mode):
+    # Per-face area term of the potential for the given mode; a region's
+    # faces keep their weights in the whole model
+    if cached.parent is not None:
+        return face_weights(cached.parent, mode)[cached.parent_faces]
+    if mode == 'orientation':
+        return np.asarray(cached.areas)
+    areas = np.asarray(cached.projected_areas)
+    average_area = np.mean(areas[areas > 0])
+    return np.where(areas > 0, areas, average_area)
+
+def calculate_potentials(cached, solar_irradiance, timestamp, mode='flat', shadows=False, site=None,
+                         efficiency=EFFICIENCY):
+    site = site or get_site()
+    if solar_irradiance == CLEARSKY:
+        # Both modes scale by an incidence cosine, so the clear sky's beam
+        # (direct normal) component is the matching irradiance
+        solar_irradiance = clearsky_irradiance(site, [timestamp])['dni'][0]
+    if mode == 'orientation' or shadows:
+        sun_vector = site.sun_vectors([timestamp])[0]
+    if mode == 'orientation':
+        incidence = calculate_incidence(cached.unit_normals, sun_vector)
+    else:
+        incidence = calculate_cos_theta(site.latitude, site.longitude, timestamp, site.timezone)
+    potentials = face_weights(cached, mode) * solar_irradiance * efficiency * incidence
+    if shadows:
+        potentials = apply_shadows(cached, potentials, sun_vector)
+    return potentials
+
+def _shadowed_hours(cached, suns, cos_theta, mode, step_hours, progress=None, irradiance=None):
+    # Shadows differ per timestamp, so each sun position is traced on its own;
+    # ``irradiance``, if given, weights each timestamp
+    face_count = cached.mesh.face_count
+    incidence_hours = np.zeros(face_count)
+    sunlit_hours = np.zeros(face_count)
+    for i in range(len(suns)):
+        if mode == 'orientation':
+            incidence = calculate_incidence(cached.unit_normals, suns[i])
+        else:
+            incidence = np.full(face_count, cos_theta[i])
+        incidence = apply_shadows(cached, incidence, suns[i])
+        incidence_hours += incidence * (step_hours if irradiance is None else step_hours * irradiance[i])
+        sunlit_hours += (incidence > 0) * step_hours
+        if progress:
+            progress((i + 1) / len(suns))
+    return incidence_hours, sunlit_hours
+
+def _orientation_hours(normals, suns, step_hours, chunk_elements, progress=None, irradiance=None):
+    # Incidence of every face at every sun position, one block of timestamps at a time
+    incidence_hours = np.zeros(len(normals))
+    sunlit_hours = np.zeros(len(normals))
+    chunk = max(1, chunk_elements // max(len(normals), 1))
+    for start in range(0, len(suns), chunk):
+        incidence = np.clip(normals @ suns[start:start + chunk].T, 0, None)
+        if irradiance is None:
+            incidence_hours += incidence.sum(axis=1) * step_hours
+        else:
+            incidence_hours += incidence @ irradiance[start:start + chunk] * step_hours
+        sunlit_hours += np.count_nonzero(incidence, axis=1) * step_hours
+        if progress:
+            progress(min(start + chunk, len(suns)) / len(suns))
+    return incidence_hours, sunlit_hours
+
+def _shadowed_hours_task(sidecar_dir, suns, cos_theta, mode, step_hours, irradiance):
+    # Process-pool side of _shadowed_hours for one block of timestamps
+    return _shadowed_hours(worker_mesh(sidecar_dir), suns, cos_theta, mode, step_hours, irradiance=irradiance)
+
+def _orientation_hours_task(sidecar_dir, start, stop, suns, step_hours, chunk_elements, irradiance):
+    # Process-pool side of _orientation_hours for one block of faces
+    normals = np.asarray(worker_mesh(sidecar_dir).unit_normals[start:stop])
+    return _orientation_hours(normals, suns, step_hours, chunk_elements, irradiance=irradiance)
+
+def integrate_potentials(cached, solar_irradiance, times, mode='flat', shadows=False, progress=None, site=None,
+                         efficiency=EFFICIENCY):
+    """
+    Integrate face potentials over ``times`` (a regular DatetimeIndex).
+
+    Returns per-face energy (potential x hours) and sunlit hours. Incidence
+    for all faces and timestamps is a (faces x timesteps) matrix product,
+    evaluated a block of timestamps at a time to bound memory. ``progress``,
+    if given, is called with the completed fraction as the work advances.
+    Sun positions are those of ``site`` (the default site if not given).
+    With ``solar_irradiance`` CLEARSKY, every timestamp is weighted by the
+    site's clear-sky direct normal irradiance. ``efficiency`` may be a
+    per-face array.
+
+    Large models are split across the process pool (see parallel.py): by
+    timestamp when tracing shadows, by face otherwise.
+    """
+    step_hours = pd.Timedelta(times.freq).total_seconds() / 3600
+    site = site or get_site()
+    irradiance = None
+    if solar_irradiance == CLEARSKY:
+        irradiance = clearsky_irradiance(site, times)['dni']
+        solar_irradiance = 1.0
+    weights = face_weights(cached, mode) * solar_irradiance * efficiency
+    face_count = len(weights)
+    chunk_elements = settings.HEATMAP_SERIES_CHUNK_ELEMENTS
+    # Pool workers map the mesh from its sidecar, which submeshes do not have
+    parallel = parallel_enabled(face_count) and cached.sidecar_dir is not None
+
+    if mode == 'orientation' or shadows:
+        suns = site.sun_vectors(times)
+        up = daytime(suns)
+        suns = suns[up]
+        if irradiance is not None:
+            irradiance = irradiance[up]
+    if mode != 'orientation':
+        cos_theta = calculate_cos_theta_series(site.latitude, times)
+
+    if shadows:
+        cos_theta = cos_theta[up] if mode != 'orientation' else None
+        if parallel:
+            # Every block of timestamps yields full per-face sums; add them up
+            get_bvh(cached)
+            tasks = [
+                (cached.sidecar_dir, suns[start:stop], None if cos_theta is None else cos_theta[start:stop],
+                 mode, step_hours, None if irradiance is None else irradiance[start:stop])
+                for start, stop in partition(len(suns), settings.HEATMAP_PARALLEL_CHUNK_TIMESTEPS)
+            ]
+            incidence_hours = np.zeros(face_count)
+            sunlit_hours = np.zeros(face_count)
+            for block_incidence, block_sunlit in map_tasks(_shadowed_hours_task, tasks, progress):
+                incidence_hours += block_incidence
+                sunlit_hours += block_sunlit
+        else:
+            incidence_hours, sunlit_hours = _shadowed_hours(
+                cached, suns, cos_theta, mode, step_hours, progress, irradiance
+            )
+    elif mode == 'orientation':
+        if parallel:
+            tasks = [
+                (cached.sidecar_dir, start, stop, suns, step_hours, chunk_elements, irradiance)
+                for start, stop in partition(face_count, settings.HEATMAP_PARALLEL_CHUNK_FACES)
+            ]
+            results = map_tasks(_orientation_hours_task, tasks, progress)
+            incidence_hours = np.concatenate([result[0] for result in results])
+            sunlit_hours = np.concatenate([result[1] for result in results])
+        else:
+            normals = np.asarray(cached.unit_normals)
+            incidence_hours, sunlit_hours = _orientation_hours(
+                normals, suns, step_hours, chunk_elements, progress, irradiance
+            )
+    else:
+        weighted = cos_theta if irradiance is None else cos_theta * irradiance
+        incidence_hours = np.full(face_count, weighted.sum() * step_hours)
+        sunlit_hours = np.full(face_count, np.count_nonzero(cos_theta) * step_hours)
+    return weights * incidence_hours, sunlit_hours
+
+def _chunks(values, chunk):
+    for start in range(0, len(values), chunk):
+        yield values[start:start + chunk]
+
+def _order_statistics(values, ranks, bins, chunk):
+    # The ranks-th smallest values, found by narrowing a closed value
+    # interval around each rank with one histogram pass per step until the
+    # interval is a single value or its members fit in one chunk
+    low = min(float(block.min()) for block in _chunks(values, chunk))
+    high = max(float(block.max()) for block in _chunks(values, chunk))
+    # rank -> (interval low, interval high, number of values below low)
+    intervals = {rank: (low, high, 0) for rank in ranks}
+    found = {}
+    while intervals:
+        pending = {}
+        for rank, interval in intervals.items():
+            if interval[0] == interval[1]:
+                found[rank] = interval[0]
+            else:
+                pending.setdefault(interval, []).append(rank)
+        if not pending:
+            break
+        histograms = {interval: np.zeros(bins, dtype=np.int64) for interval in pending}
+        for block in _chunks(values, chunk):
+            for (a, b, _), counts in histograms.items():
+                inside = block[(block >= a) & (block <= b)]
+                # Bin i holds edges[i] <= value < edges[i + 1], the last bin also b
+                index = np.searchsorted(np.linspace(a, b, bins + 1), inside, side='right') - 1
+                counts += np.bincount(np.minimum(index, bins - 1), minlength=bins)
+        intervals = {}
+        gather = {}
+        for (a, b, below), ranks_inside in pending.items():
+            counts = histograms[(a, b, below)]
+            edges = np.linspace(a, b, bins + 1)
+            cumulative = below + np.cumsum(counts)
+            for rank in ranks_inside:
+                i = int(np.searchsorted(cumulative, rank, side='right'))
+                interval = (
+                    float(edges[i]), float(b) if i == bins - 1 else float(np.nextafter(edges[i + 1], -np.inf)),
+                    int(cumulative[i] - counts[i]),
+                )
+                if counts[i] <= chunk:
+                    gather.setdefault(interval, []).append(rank)
+                else:
+                    intervals[rank] = interval
+        if gather:
+            members = {interval: [] for interval in gather}
+            for block in _chunks(values, chunk):
+                for (a, b, _), blocks in members.items():
+                    blocks.append(block[(block >= a) & (block <= b)])
+            for (a, b, below), ranks_inside in gather.items():
+                inside = np.concatenate(members[(a, b, below)])
+                offsets = [rank - below for rank in ranks_inside]
+                selected = np.partition(inside, offsets)
+                found.update((rank, float(selected[offset])) for rank, offset in zip(ranks_inside, offsets))
+    return found
+
+def streamed_quantiles(values, quantiles, bins=QUANTILE_HISTOGRAM_BINS, chunk=QUANTILE_CHUNK):
+    """
+    Quantiles of ``values`` without sorting or copying them, equal to
+    np.quantile's default (linear) method. The order statistics either side
+    of every quantile are located by histogram passes over the values, a
+    chunk at a time: each pass narrows the value range around a rank to one
+    of ``bins`` bins, until the values left in it can be selected in
+    memory. An outlier widens only the first pass's bins, not the result.
+    """
+    ranks = np.asarray(quantiles) * (len(values) - 1)
+    lower = np.floor(ranks).astype(np.int64)
+    upper = np.minimum(lower + 1, len(values) - 1)
+    found = _order_statistics(values, sorted(set(lower) | set(upper)), bins, chunk)
+    below = np.array([found[rank] for rank in lower])
+    above = np.array([found[rank] for rank in upper])
+    return below + (ranks - lower) * (above - below)
+
+def face_quantiles(values, quantiles):
+    # Exact quantiles where sorting a copy is affordable, streamed ones beyond
+    if len(values) <= settings.HEATMAP_QUANTILE_EXACT_MAX_FACES:
+        return np.quantile(values, quantiles)
+    return streamed_quantiles(values, quantiles)
+
+def validate_scale(scale, breakpoints=None):
+    if scale not in HEATMAP_SCALES:
+        raise ValueError(f"Unknown color scale '{scale}'. Use one of: {', '.join(HEATMAP_SCALES)}.")
+    if scale == 'absolute':
+        if breakpoints is None or len(breakpoints) != len(COLORS) - 1:
+            raise ValueError(f"The absolute scale needs {len(COLORS) - 1} breakpoints between its colors.")
+        if np.any(np.diff(breakpoints) <= 0):
+            raise ValueError("Breakpoints must be increasing.")
+
+def heatmap_bins(potentials, scale='linear', breakpoints=None):
+    """
+    Upper edges of the color bins and the bin (material) of every face, in
+    one vectorized pass for every ``scale`` (see HEATMAP_SCALES).
+    """
+    if scale == 'absolute':
+        edges = np.asarray(breakpoints, dtype=np.float64)
+    elif scale == 'quantile':
+        edges = face_quantiles(potentials, np.arange(1, len(COLORS)) / len(COLORS))
+    elif scale == 'log' and np.any(potentials > 0):
+        # Faces without a positive value share the lowest bin
+        positive = potentials[potentials > 0]
+        edges = np.geomspace(positive.min(), positive.max(), len(COLORS) + 1)[1:-1]
+    else:
+        min_potential, max_potential = potentials.min(), potentials.max()
+        ranges = np.linspace(min_potential, max_potential, 16)[1:]
+        return ranges, np.digitize(potentials, ranges, right=True)
+    ranges = np.append(edges, max(float(potentials.max()), edges[-1]))
+    return ranges, np.digitize(potentials, edges, right=True)
+
+def output_name():
+    # Unique storage name stem per result, so concurrent requests never share files
+    return f"heatmaps/{uuid.uuid4().hex}"
+
+def write_heatmap(cached, potentials, output_format, name, binned=None, scale='linear', breakpoints=None):
+    """
+    Color the mesh by potential and encode it in ``output_format``. Returns
+    ``{field: (file name, chunk iterator)}`` keyed by the ProcessedModel
+    field each file belongs in; nothing is written until the chunks are consumed.
+    ``binned`` passes already known (ranges, material indices).
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Cannot write a heatmap as '{output_format}'. Use one of: {', '.join(OUTPUT_FORMATS)}.")
+    ranges, material_indices = binned or heatmap_bins(potentials, scale, breakpoints)
+
+    if output_format == 'glb':
+        chunks = iter_heatmap_glb(
+            cached.mesh, face_colors=hex_to_rgba(COLORS)[material_indices],
+            face_values=potentials, face_normals=cached.unit_normals
+        )
+        return {"glb_file": (f"{name}.glb", chunks)}
+
+    obj_name, mtl_name = f"{name}.obj", f"{name}.mtl"
+    materials = [f"color_{i}" for i in range(len(COLORS))]
+    obj_chunks = iter_heatmap_obj(
+        cached.mesh, material_indices, materials, os.path.basename(mtl_name),
+        border_material=BORDER_MATERIAL[0]
+    )
+    mtl_chunks = iter_mtl(COLORS, dict([BORDER_MATERIAL]))
+    return {"obj_file": (obj_name, obj_chunks), "mtl_file": (mtl_name, mtl_chunks)}
+
+def iter_face_summary(cached, energy, sunlit_hours):
+    # One CSV row per face, energy in kWh assuming solar_irradiance in W/m²;
+    # faces of a submesh keep their ids in the full model
+    faces = np.arange(len(energy)) if cached.parent_faces is None else cached.parent_faces
+    table = np.column_stack((faces, cached.areas, energy / 1000, sunlit_hours))
+    pieces = format_rows("%d,%.4f,%.6f,%.2f\n", table)
+    return encode_chunks(["face,area,energy_kwh,sunlit_hours\n", *pieces])
+
+def encode_face_values(potentials, value_format, scale='linear', breakpoints=None):
+    """
+    Compact per-face payload: one uint8 color bin per face ('bins') or the
+    potentials as float16 normalized to the maximum ('values').
+    """
+    ranges, material_indices = heatmap_bins(potentials, scale, breakpoints)
+    if value_format == 'bins':
+        return material_indices.astype(np.uint8).tobytes(), ranges
+    scale = potentials.max() if potentials.max() > 0 else 1.0
+    return (potentials / scale).astype('<f2').tobytes(), ranges
+
+# Bump whenever the geometry asset's layout changes, so clients holding the
+# old (immutably cached) asset fetch the new one
+GEOMETRY_ASSET_VERSION = 2
+
+def geometry_version(cached):
+    return f"{cached.content_hash[:20]}-{GEOMETRY_ASSET_VERSION}"
+
+def geometry_asset(cached):
+    """
+    GLB of the bare mesh, face order preserved and each corner tagged with
+    its face index (_FACE_ID, an unsigned int), written once per model
+    into its sidecar.
+    """
+    path = os.path.join(cached.sidecar_dir, f"geometry-{GEOMETRY_ASSET_VERSION}.glb")
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        chunks = iter_heatmap_glb(
+            cached.mesh, face_normals=cached.unit_normals,
+            face_attributes={"_FACE_ID": np.arange(cached.mesh.face_count)}
+        )
+        with open(tmp_path, 'wb') as file:
+            for chunk in chunks:
+                file.write(chunk)
+        os.replace(tmp_path, path)
+    return path
+
+def validate_options(mode, output_format, lod=0, formats=OUTPUT_FORMATS + VALUE_FORMATS):
+    if mode not in HEATMAP_MODES:
+        raise ValueError(f"Unknown heatmap mode '{mode}'. Use one of: {', '.join(HEATMAP_MODES)}.")
+    if output_format not in formats:
+        raise ValueError(f"Unknown output format '{output_format}'. Use one of: {', '.join(formats)}.")
+    validate_lod(lod)
+
+def validate_lod(lod):
+    levels = len(settings.HEATMAP_LOD_RESOLUTIONS)
+    if not 0 <= lod <= levels:
+        raise ValueError(f"Unknown level of detail {lod}. Use 0 (full detail) to {levels}.")
+
+def select_region(cached, bbox=None, tile=None):
+    """
+    The part of the model a request covers: the objects intersecting a
+    ground-plane ``bbox`` (min_x, min_z, max_x, max_z), the objects of grid
+    ``tile`` (column, row), or the whole model.
+    """
+    if bbox is None and tile is None:
+        return cached
+    return submesh(cached, region_objects(get_object_index(cached), bbox, tile))
+
+def region_objects(object_index, bbox=None, tile=None):
+    # Objects of a bbox or tile, rejecting regions outside the grid or without objects
+    if bbox is not None:
+        objects = object_index.objects_in_bbox(*bbox)
+    else:
+        objects = object_index.objects_in_tile(*tile)
+    if not len(objects):
+        raise ValueError("The selected region contains no objects.")
+    return objects
+
+def object_index(obj_path=None):
+    # Object bounding boxes and tile grid of a source model
+    return get_object_index(get_cached_mesh(obj_path or default_model_path()))
+
+def cached_object_index(obj_path=None):
+    # object_index if it is at hand without parsing the model, else None
+    return known_object_index(obj_path or default_model_path())
+
+def model_version(obj_path=None):
+    # Version of a source model that results are keyed on, read from the
+    # file's stat so a request never waits for the model to be parsed
+    return source_version(obj_path or default_model_path())
+
+def render_target(cached, values, lod=0):
+    # Mesh to draw and its per-face values: the full mesh or a decimated level
+    if not lod:
+        return cached, values
+    level = get_lod(cached, lod)
+    return level.cached, level.aggregate(values)
+
+def binned_target(cached, values, lod=0, scale='linear', breakpoints=None, whole_values=None, inputs=None):
+    """
+    render_target of per-face ``values`` with their color bins. A region
+    (submesh) is binned on the scale of the whole model, so adjacent tiles
+    share one scale; it is computed from the per-face values
+    ``whole_values()`` gives once per request ``inputs`` (see get_scale).
+    """
+    target, values = render_target(cached, values, lod)
+    if cached.parent is None or scale == 'absolute':
+        return target, values, heatmap_bins(values, scale, breakpoints)
+    whole = cached.parent
+    ranges = get_scale(
+        whole, result_cache_key(whole.content_hash, lod=lod, scale=scale, **inputs),
+        lambda: heatmap_bins(render_target(whole, whole_values(), lod)[1], scale)[0]
+    )
+    return target, values, (ranges, region_bins(values, ranges))
+
+def region_bins(values, ranges):
+    # Bins of a region's values on ranges from heatmap_bins of the whole
+    # model; values past its maximum (possible after LOD averaging) take the top bin
+    return np.digitize(values, ranges[:-1], right=True)
+
+def default_model_path():
+    # Source model used when a request does not name an uploaded one
+    return os.path.join(settings.MEDIA_ROOT, "model.obj")
+
+def flat_factor(solar_irradiance, timestamp, site=None):
+    # The request-dependent scalar of a flat, unshadowed heatmap: its
+    # potentials are face_weights(cached, 'flat') times this factor
+    site = site or get_site()
+    if solar_irradiance == CLEARSKY:
+        solar_irradiance = clearsky_irradiance(site, [timestamp])['dni'][0]
+    return float(solar_irradiance * EFFICIENCY * calculate_cos_theta(
+        site.latitude, site.longitude, timestamp, site.timezone
+    ))
+
+def factorized_heatmap(cached, lod=0, scale='linear'):
+    """
+    Request-independent part of a flat, unshadowed heatmap, computed once
+    per model, level of detail and relative color scale: the mesh drawn,
+    its per-face weights and their bin edges and bins. For a factor k > 0
+    the potentials are k * weights and the edges k * ranges, while the bins
+    stay the same. The absolute scale is not relative and does not apply.
+    """
+    key = ('flat', lod, scale)
+    if key not in cached.derived:
+        target, weights = render_target(cached, face_weights(cached, 'flat'), lod)
+        if cached.parent is None:
+            cached.derived[key] = (target, weights, *heatmap_bins(weights, scale))
+        else:
+            # A region is binned on the whole model's scale
+            ranges = factorized_heatmap(cached.parent, lod, scale)[2]
+            cached.derived[key] = (target, weights, ranges, region_bins(weights, ranges))
+    return cached.derived[key]
+
+def factorized_values(cached, lod, value_format, scale='linear'):
+    # encode_face_values of the factorized weights; both encodings are the
+    # same for every positive factor, so they are built once per model
+    key = ('flat', lod, scale, value_format)
+    if key not in cached.derived:
+        target, weights, _, _ = factorized_heatmap(cached, lod, scale)
+        cached.derived[key] = encode_face_values(weights, value_format, scale)[0]
+    return cached.derived[key]
+
+def process_3d_model(solar_irradiance, timestamp, mode='flat', shadows=False, output_format='obj', obj_path=None,
+                     lod=0, bbox=None, tile=None, site=None, scale='linear', breakpoints=None):
+    validate_options(mode, output_format, lod, OUTPUT_FORMATS)
+    validate_scale(scale, breakpoints)
+
+    # Main logic; potentials are always computed at full detail, and only
+    # for the selected region
+    site = site or get_site()
+    cached = select_region(get_cached_mesh(obj_path or default_model_path()), bbox, tile)
+    if mode == 'flat' and not shadows and scale != 'absolute':
+        factor = flat_factor(solar_irradiance, timestamp, site)
+        if factor > 0:
+            target, weights, ranges, bins = factorized_heatmap(cached, lod, scale)
+            return write_heatmap(target, weights * factor, output_format, output_name(), (ranges * factor, bins))
+    potentials = calculate_potentials(cached, solar_irradiance, timestamp, mode, shadows, site)
+    # Shadows are only traced within a region, so the whole model's scale
+    # comes from its unshadowed potentials
+    target, potentials, binned = binned_target(
+        cached, potentials, lod, scale, breakpoints,
+        lambda: calculate_potentials(cached.parent, solar_irradiance, timestamp, mode, False, site),
+        {"solar_irradiance": solar_irradiance, "timestamp": timestamp, "mode": mode, "site": site.cache_key},
+    )
+    return write_heatmap(target, potentials, output_format, output_name(), binned)
+
+def process_3d_model_values(solar_irradiance, timestamp, mode='flat', shadows=False, value_format='bins',
+                            obj_path=None, lod=0, site=None, scale='linear', breakpoints=None):
+    validate_options(mode, value_format, lod)
+    validate_scale(scale, breakpoints)
+
+    cached = get_cached_mesh(obj_path or default_model_path())
+    if mode == 'flat' and not shadows and scale != 'absolute':
+        # Only the bin edges and maximum scale with the request
+        factor = flat_factor(solar_irradiance, timestamp, site)
+        if factor > 0:
+            target, weights, ranges, _ = factorized_heatmap(cached, lod, scale)
+            data = factorized_values(cached, lod, value_format, scale)
+            return data, ranges * factor, float(weights.max() * factor), geometry_version(target)
+    potentials = calculate_potentials(cached, solar_irradiance, timestamp, mode, shadows, site)
+    target, potentials = render_target(cached, potentials, lod)
+    data, ranges = encode_face_values(potentials, value_format, scale, breakpoints)
+    return data, ranges, float(potentials.max()), geometry_version(target)
+
+def current_geometry(obj_path=None, lod=0):
+    # Cached mesh of the heatmap source model (or one of its decimated
+    # levels) and its geometry version
+    cached = get_cached_mesh(obj_path or default_model_path())
+    if lod:
+        cached = get_lod(cached, lod).cached
+    return cached, geometry_version(cached)
+
+def series_times(start, end, step='1h'):
+    # Timestamps of a time-series run, rejecting empty and oversized ranges
+    times = pd.date_range(start, end, freq=step)
+    if not len(times):
+        raise ValueError("The time range is empty.")
+    if len(times) > settings.HEATMAP_MAX_TIMESTEPS:
+        raise ValueError(f"The time range has more than {settings.HEATMAP_MAX_TIMESTEPS} timesteps.")
+    return times
+
+def object_totals(cached, values):
+    """
+    Sum per-face ``values`` over every object (building) with one
+    np.add.reduceat over the face arrays; objects without faces total 0.
+    """
+    offsets = np.asarray(cached.mesh.object_offsets)
+    totals = np.zeros(len(offsets) - 1)
+    filled = np.diff(offsets) > 0
+    if filled.any():
+        totals[filled] = np.add.reduceat(np.asarray(values, dtype=np.float64), offsets[:-1][filled])
+    return totals
+
+def building_summary(cached, values):
+    """
+    Per-building face count, area, total and mean (per face) value and value
+    per m², with rank 1 for the largest total. Rows are in rank order.
+    """
+    faces = np.diff(np.asarray(cached.mesh.object_offsets))
+    areas = object_totals(cached, cached.areas)
+    totals = object_totals(cached, values)
+    order = np.lexsort((np.arange(len(totals)), -totals))
+    ranks = np.empty(len(totals), dtype=np.int64)
+    ranks[order] = np.arange(1, len(totals) + 1)
+    return {
+        "rank": ranks[order],
+        "name": np.asarray(cached.mesh.object_names)[order],
+        "faces": faces[order],
+        "area": areas[order],
+        "total": totals[order],
+        "mean": (totals / np.maximum(faces, 1))[order],
+        "per_m2": (totals / np.where(areas > 0, areas, np.inf))[order],
+    }
+
+def process_buildings(solar_irradiance, timestamp, mode='flat', shadows=False, obj_path=None, bbox=None, tile=None,
+                      site=None):
+    # Per-building potential (W) at one timestamp
+    validate_options(mode, 'obj')
+    cached = select_region(get_cached_mesh(obj_path or default_model_path()), bbox, tile)
+    return building_summary(cached, calculate_potentials(cached, solar_irradiance, timestamp, mode, shadows, site))
+
+def process_buildings_series(solar_irradiance, start, end, step='1h', mode='flat', shadows=False, obj_path=None,
+                             bbox=None, tile=None, site=None):
+    # Per-building energy (kWh) integrated over start..end
+    validate_options(mode, 'obj')
+    times = series_times(start, end, step)
+    cached = select_region(get_cached_mesh(obj_path or default_model_path()), bbox, tile)
+    energy, _ = integrate_potentials(cached, solar_irradiance, times, mode, shadows, site=site)
+    return building_summary(cached, energy / 1000)
+
+# Faces whose normal points up by at least this much (tilt up to 60°) are
+# roofs, steeper ones are walls and those facing down are neither
+ROOF_MIN_UP = 0.5
+FACE_ROOF, FACE_WALL, FACE_OTHER = 0, 1, 2
+
+def classify_faces(unit_normals):
+    # Roof, wall or other class of every face from the up (y) component of its normal
+    up = np.asarray(unit_normals)[:, 1]
+    return np.where(up >= ROOF_MIN_UP, FACE_ROOF, np.where(up > -ROOF_MIN_UP, FACE_WALL, FACE_OTHER))
+
+def building_potentials(cached, potentials, classes):
+    """
+    Per-building roof and wall area and rooftop and BIPV potential, summed
+    from per-face ``potentials`` by face class. Rows are in rank order of
+    the combined potential.
+    """
+    areas = np.asarray(cached.areas)
+    roof = classes == FACE_ROOF
+    wall = classes == FACE_WALL
+    rooftop = object_totals(cached, np.where(roof, potentials, 0))
+    bipv = object_totals(cached, np.where(wall, potentials, 0))
+    order = np.lexsort((np.arange(len(rooftop)), -(rooftop + bipv)))
+    return {
+        "rank": np.arange(1, len(order) + 1),
+        "name": np.asarray(cached.mesh.object_names)[order],
+        "roof_area": object_totals(cached, np.where(roof, areas, 0))[order],
+        "wall_area": object_totals(cached, np.where(wall, areas, 0))[order],
+        "rooftop": rooftop[order],
+        "bipv": bipv[order],
+    }
+
+def process_building_potentials(solar_irradiance, timestamp=None, year=None, shadows=False, obj_path=None,
+                                bbox=None, tile=None, site=None, efficiency_rooftop=EFFICIENCY_ROOFTOP,
+                                efficiency_bipv=EFFICIENCY_BIPV):
+    """
+    Rooftop and BIPV potential of every building from the model geometry:
+    faces are classified as roof or wall by their normal and evaluated by
+    their own orientation to the sun, either at ``timestamp`` (W) or
+    integrated hourly over the calendar ``year`` (kWh).
+    """
+    cached = select_region(get_cached_mesh(obj_path or default_model_path()), bbox, tile)
+    classes = classify_faces(cached.unit_normals)
+    efficiency = np.select([classes == FACE_ROOF, classes == FACE_WALL], [efficiency_rooftop, efficiency_bipv], 0.0)
+    if year is not None:
+        times = series_times(datetime(year, 1, 1), datetime(year, 12, 31, 23), '1h')
+        energy, _ = integrate_potentials(
+            cached, solar_irradiance, times, 'orientation', shadows, site=site, efficiency=efficiency
+        )
+        return building_potentials(cached, energy / 1000, classes)
+    potentials = calculate_potentials(
+        cached, solar_irradiance, timestamp, 'orientation', shadows, site, efficiency
+    )
+    return building_potentials(cached, potentials, classes)
+
+def process_3d_model_series(solar_irradiance, start, end, step='1h', mode='flat', shadows=False,
+                            output_format='obj', progress=None, obj_path=None, lod=0, bbox=None, tile=None,
+                            site=None, scale='linear', breakpoints=None):
+    validate_options(mode, output_format, lod, OUTPUT_FORMATS)
+    validate_scale(scale, breakpoints)
+    times = series_times(start, end, step)
 
     # Main logic
-    vertices, faces = parse_obj_file(obj_path)
-    areas = [calculate_polygon_area(vertices[face]) for face in faces]
-    average_area = np.mean([a for a in areas if a > 0])
-    areas = [a if a > 0 else average_area for a in areas]
-    cos_theta = calculate_cos_theta(latitude, longitude, timestamp)
-    potentials = [a * solar_irradiance * efficiency * cos_theta for a in areas]
-    min_potential, max_potential = min(potentials), max(potentials)
-    ranges = np.linspace(min_potential, max_potential, 16)[1:]
-    materials = update_mtl_file(updated_mtl_path, colors)
-    modify_obj_file(vertices, faces, potentials, ranges, obj_path, updated_obj_path, materials, "updated.mtl")
-
-    return updated_obj_path, updated_mtl_path
+    site = site or get_site()
+    cached = select_region(get_cached_mesh(obj_path or default_model_path()), bbox, tile)
+    energy, sunlit_hours = integrate_potentials(cached, solar_irradiance, times, mode, shadows, progress, site)
+    name = output_name()
+    if scale == 'absolute':
+        # Absolute breakpoints of a time series are in kWh per face
+        target, face_energy = render_target(cached, energy, lod)
+        binned = heatmap_bins(face_energy / 1000, scale, breakpoints)
+    else:
+        target, face_energy, binned = binned_target(
+            cached, energy, lod, scale,
+            whole_values=lambda: integrate_potentials(cached.parent, solar_irradiance, times, mode, site=site)[0],
+            inputs={
+                "solar_irradiance": solar_irradiance, "start": times[0].to_pydatetime(),
+                "end": times[-1].to_pydatetime(), "step": step, "mode": mode, "site": site.cache_key,
+            },
+        )
+    files = write_heatmap(target, face_energy, output_format, name, binned)
+    # The per-face summary always covers the full-detail mesh
+    files["summary_file"] = (f"{name}_summary.csv", iter_face_summary(cached, energy, sunlit_hours))
+
+    summary = {
+        "timesteps": len(times),
+        "total_energy_kwh": round(float(energy.sum()) / 1000, 3),
+        "max_face_energy_kwh": round(float(energy.max()) / 1000, 3),
+        "mean_face_energy_kwh": round(float(energy.mean()) / 1000, 3),
+    }
+    return files, summary
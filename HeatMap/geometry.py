@@ -0,0 +1,88 @@
+# geometry.py
+
+import numpy as np
+
+
+def face_ids(face_offsets):
+    """Face index of every corner in a CSR face layout."""
+    return np.repeat(np.arange(len(face_offsets) - 1), np.diff(face_offsets))
+
+
+def sum_by_face(values, ids, face_count):
+    """Sum the rows of ``values`` grouped by face id (a segmented reduction)."""
+    if values.ndim == 1:
+        return np.bincount(ids, weights=values, minlength=face_count)
+    return np.stack([np.bincount(ids, weights=column, minlength=face_count) for column in values.T], axis=1)
+
+
+def fan_triangles(face_offsets):
+    """
+    Fan-triangulate every face of a CSR face layout at once.
+
+    Returns the (T, 3) corner positions of the triangles (indices into the
+    face index arrays, not vertex ids) and the face each triangle came from.
+    """
+    sizes = np.diff(face_offsets)
+    corner_faces = face_ids(face_offsets)
+    local = np.arange(face_offsets[-1]) - face_offsets[:-1][corner_faces]
+    # Corner j of an n-gon opens the triangle (0, j, j + 1) for 1 <= j <= n - 2
+    opens = (local >= 1) & (local <= sizes[corner_faces] - 2)
+    second = np.flatnonzero(opens)
+    triangle_faces = corner_faces[second]
+    first = face_offsets[:-1][triangle_faces]
+    return np.stack((first, second, second + 1), axis=1), triangle_faces
+
+
+def face_geometry(vertices, face_offsets, face_vertices):
+    """
+    Compute the true 3D area, unit normal and centroid of every face in one
+    vectorized pass, using fan triangulation for n-gons.
+
+    The normal comes from the summed triangle cross products (the polygon's
+    vector area), so areas are exact for planar faces, convex or not.
+    Degenerate faces get a zero normal and the mean of their corners.
+    """
+    face_count = len(face_offsets) - 1
+    corners, triangle_faces = fan_triangles(face_offsets)
+    a, b, c = (vertices[face_vertices[corners[:, i]]] for i in range(3))
+    cross = np.cross(b - a, c - a)
+
+    vector_areas = sum_by_face(0.5 * cross, triangle_faces, face_count)
+    areas = np.linalg.norm(vector_areas, axis=1)
+    normals = np.divide(vector_areas, areas[:, None], out=np.zeros_like(vector_areas), where=areas[:, None] > 0)
+
+    # Area-weighted triangle centroids; the weights are signed along the face
+    # normal so that reflex corners of concave faces cancel out
+    weights = 0.5 * np.einsum('ij,ij->i', cross, normals[triangle_faces])
+    centroids = sum_by_face(weights[:, None] * (a + b + c) / 3, triangle_faces, face_count)
+    corner_means = sum_by_face(vertices[face_vertices], face_ids(face_offsets), face_count)
+    corner_means /= np.maximum(np.diff(face_offsets), 1)[:, None]
+    centroids = np.where(areas[:, None] > 0, centroids / np.where(areas > 0, areas, 1)[:, None], corner_means)
+
+    return areas, normals, centroids
+
+
+def projected_areas(areas, normals, axis=1):
+    """Area of every face projected onto the plane perpendicular to ``axis`` (Y, the ground, by default)."""
+    return areas * np.abs(normals[:, axis])
+
+
+def segment_positions(starts, counts):
+    """Concatenation of ``arange(start, start + count)`` for every segment."""
+    segment_offsets = np.cumsum(counts) - counts
+    return np.arange(counts.sum()) - np.repeat(segment_offsets - starts, counts)
+
+
+def segment_reduce(ufunc, values, starts, counts):
+    """
+    Reduce the rows of ``values`` over segments ``start:start + count`` with
+    ``ufunc`` (e.g. np.minimum). Segments must not be empty.
+    """
+    # reduceat over (start, end) index pairs; a padding row keeps end in range.
+    # Columns are reduced one at a time, which is much faster than axis=0
+    indices = np.stack((starts, starts + counts), axis=1).ravel()
+    columns = [
+        ufunc.reduceat(np.append(column, column[:1]), indices)[::2]
+        for column in np.asarray(values).T
+    ]
+    return np.stack(columns, axis=1)
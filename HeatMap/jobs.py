@@ -0,0 +1,170 @@
+# jobs.py
+
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .file_processor import process_3d_model, process_3d_model_series
+from .models import HeatmapJob
+from .result_cache import lookup_result, store_result
+from .uploads import ingest_model, model_path
+from SunLocation.sites import get_site, site_from
+
+IN_FLIGHT = (HeatmapJob.QUEUED, HeatmapJob.RUNNING)
+
+# Share of a job's progress spent computing; the rest is encoding and storing
+COMPUTE_SHARE = 0.9
+
+
+def enqueue_job(cache_key, params):
+    """
+    Queue a heatmap job for ``params``, or return the queued or running job
+    already computing the same result, so identical requests coalesce.
+    """
+    job = HeatmapJob.objects.filter(cache_key=cache_key, status__in=IN_FLIGHT).first()
+    if job is not None:
+        return job
+    try:
+        with transaction.atomic():
+            return HeatmapJob.objects.create(cache_key=cache_key, params=params)
+    except IntegrityError:
+        # An identical request queued its job between our lookup and insert
+        return HeatmapJob.objects.filter(cache_key=cache_key).order_by('-created_at').first()
+
+
+def claim_job():
+    """
+    Atomically take the oldest queued job, or a running job whose worker
+    stopped sending heartbeats, and mark it running. Returns None if idle.
+    """
+    stale = timezone.now() - timedelta(seconds=settings.HEATMAP_JOB_TIMEOUT)
+    candidates = (
+        HeatmapJob.objects
+        .filter(Q(status=HeatmapJob.QUEUED) | Q(status=HeatmapJob.RUNNING, heartbeat__lt=stale))
+        .order_by('created_at')
+        .values_list('id', 'status', 'heartbeat')[:10]
+    )
+    for job_id, status, heartbeat in candidates:
+        now = timezone.now()
+        # Only one worker's update can match the job's previous state
+        claimed = HeatmapJob.objects.filter(id=job_id, status=status, heartbeat=heartbeat).update(
+            status=HeatmapJob.RUNNING, started_at=now, heartbeat=now, progress=0
+        )
+        if claimed:
+            return HeatmapJob.objects.get(id=job_id)
+    return None
+
+
+def _owned(job):
+    # The job, as long as no other worker has reclaimed it since this one
+    # claimed it; updates through this match nothing once it has been
+    return HeatmapJob.objects.filter(id=job.id, started_at=job.started_at)
+
+
+@contextmanager
+def _heartbeat(job):
+    """
+    Send the job's heartbeat from a background thread while the block runs,
+    so long steps that report no progress (a first BVH build, shadows on a
+    large model) do not make claim_job hand the job to another worker.
+    """
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(settings.HEATMAP_JOB_HEARTBEAT_INTERVAL):
+                _owned(job).update(heartbeat=timezone.now())
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f"heartbeat-{job.id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _progress_reporter(job):
+    # Record progress at most once a second
+    last_update = [0.0]
+
+    def report(fraction):
+        now = time.monotonic()
+        if now - last_update[0] >= 1.0:
+            last_update[0] = now
+            _owned(job).update(progress=COMPUTE_SHARE * fraction, heartbeat=timezone.now())
+    return report
+
+
+def enqueue_ingest(upload):
+    # Background parse of a freshly uploaded model into the mesh cache
+    return enqueue_job(f"ingest-{upload.id.hex}", {"task": "ingest", "model_id": str(upload.id)})
+
+
+def _compute(job):
+    params = job.params
+    progress = _progress_reporter(job)
+    obj_path = model_path(params.get('model'))
+    # Compute with the site exactly as the request resolved it, which its
+    # cache key was built from, even if the site has been edited since
+    site = site_from(params['site']) if isinstance(params.get('site'), dict) else get_site(params.get('site'))
+    if params.get('start'):
+        files, summary = process_3d_model_series(
+            params['solar_irradiance'], datetime.fromisoformat(params['start']),
+            datetime.fromisoformat(params['end']), params['step'], params['mode'],
+            params['shadows'], params['format'], progress=progress, obj_path=obj_path,
+            lod=params.get('lod', 0), bbox=params.get('bbox'), tile=params.get('tile'), site=site,
+            scale=params.get('scale', 'linear'), breakpoints=params.get('breakpoints')
+        )
+    else:
+        files = process_3d_model(
+            params['solar_irradiance'], datetime.fromisoformat(params['timestamp']),
+            params['mode'], params['shadows'], params['format'], obj_path=obj_path,
+            lod=params.get('lod', 0), bbox=params.get('bbox'), tile=params.get('tile'), site=site,
+            scale=params.get('scale', 'linear'), breakpoints=params.get('breakpoints')
+        )
+        summary = None
+    _owned(job).update(progress=COMPUTE_SHARE, heartbeat=timezone.now())
+    return store_result(job.cache_key, files, summary)
+
+
+def run_job(job):
+    """
+    Execute a claimed job and record its result or error, unless another
+    worker has reclaimed the job meanwhile and records its own.
+    """
+    try:
+        with _heartbeat(job):
+            if job.params.get('task') == 'ingest':
+                ingest_model(job.params['model_id'])
+                processed_model = None
+            else:
+                # A previous job may already have stored this result
+                processed_model = lookup_result(job.cache_key) or _compute(job)
+        job.status, job.result, job.progress = HeatmapJob.DONE, processed_model, 1.0
+    except Exception as e:
+        job.status, job.error = HeatmapJob.FAILED, str(e)
+    job.finished_at = timezone.now()
+    _owned(job).update(
+        status=job.status, result=job.result, progress=job.progress, error=job.error, finished_at=job.finished_at
+    )
+    return job
+
+
+def work(poll_interval=None, once=False):
+    """Worker loop: run jobs as they arrive, or until the queue is empty if ``once``."""
+    poll_interval = settings.HEATMAP_JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    while True:
+        job = claim_job()
+        if job is not None:
+            run_job(job)
+        elif once:
+            return
+        else:
+            time.sleep(poll_interval)
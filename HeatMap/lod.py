@@ -0,0 +1,90 @@
+# lod.py
+
+from dataclasses import dataclass
+import numpy as np
+from .geometry import fan_triangles, sum_by_face
+from .mesh import ObjMesh
+
+
+@dataclass
+class LodLevel:
+    """
+    A decimated version of a cached mesh. ``cached`` holds the coarse mesh
+    and its per-face geometry; every surviving fine triangle contributes its
+    area (``weights``) from original face ``source_faces`` to coarse face
+    ``targets``.
+    """
+    cached: object
+    source_faces: np.ndarray
+    targets: np.ndarray
+    weights: np.ndarray
+
+    def aggregate(self, values):
+        """Area-weighted mean of per-face ``values`` over each coarse face."""
+        face_count = self.cached.mesh.face_count
+        values = np.asarray(values)[self.source_faces]
+        total = np.bincount(self.targets, self.weights, face_count)
+        weighted = np.bincount(self.targets, self.weights * values, face_count)
+        # Coarse faces made only of zero-area triangles take the plain mean
+        plain = np.bincount(self.targets, values, face_count) / np.maximum(np.bincount(self.targets, minlength=face_count), 1)
+        return np.where(total > 0, weighted / np.where(total > 0, total, 1), plain)
+
+
+def cluster_vertices(vertices, cell_size):
+    """
+    Snap vertices to a uniform grid. Returns the cluster of every vertex and
+    the mean position of every cluster.
+    """
+    cells = np.floor((vertices - vertices.min(axis=0)) / cell_size).astype(np.int64)
+    keys = np.ravel_multi_index(cells.T, tuple(cells.max(axis=0) + 1))
+    _, clusters, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    positions = sum_by_face(np.asarray(vertices, dtype=np.float64), clusters, len(counts)) / counts[:, None]
+    return clusters, positions
+
+
+def decimate(vertices, face_offsets, face_vertices, cell_size):
+    """
+    Vertex-clustering decimation of a polygon mesh into a triangle mesh.
+
+    Faces are fan-triangulated, corners are moved to their grid cluster,
+    triangles that collapse are dropped and triangles over the same three
+    clusters are merged. Returns the coarse mesh and, for every surviving
+    fine triangle, its source face, coarse face and area.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    corners, triangle_faces = fan_triangles(face_offsets)
+    fine = vertices[face_vertices[corners]]
+    vector_areas = 0.5 * np.cross(fine[:, 1] - fine[:, 0], fine[:, 2] - fine[:, 0])
+
+    clusters, positions = cluster_vertices(vertices, cell_size)
+    triangles = clusters[face_vertices[corners]]
+    keep = (
+        (triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2])
+        & (triangles[:, 0] != triangles[:, 2])
+    )
+    triangles, triangle_faces, vector_areas = triangles[keep], triangle_faces[keep], vector_areas[keep]
+
+    # Triangles over the same clusters merge whatever their winding; keep
+    # the winding that agrees with the summed orientation of the merged ones
+    _, first, targets = np.unique(np.sort(triangles, axis=1), axis=0, return_index=True, return_inverse=True)
+    targets = targets.ravel()
+    coarse = triangles[first]
+    merged_normals = sum_by_face(vector_areas, targets, len(first))
+    corner_positions = positions[coarse]
+    coarse_normals = np.cross(
+        corner_positions[:, 1] - corner_positions[:, 0], corner_positions[:, 2] - corner_positions[:, 0]
+    )
+    flip = np.einsum('ij,ij->i', coarse_normals, merged_normals) < 0
+    coarse[flip] = coarse[flip][:, ::-1]
+
+    # Keep only the clusters still referenced by a triangle
+    used, compact = np.unique(coarse, return_inverse=True)
+    mesh = ObjMesh(
+        vertices=positions[used],
+        face_offsets=np.arange(0, 3 * len(coarse) + 1, 3, dtype=np.int32),
+        face_vertices=compact.ravel().astype(np.int32),
+        texcoords=np.zeros((0, 2)),
+        normals=np.zeros((0, 3)),
+    )
+    weights = np.linalg.norm(vector_areas, axis=1)
+    return mesh, triangle_faces, targets, weights
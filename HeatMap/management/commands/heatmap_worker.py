@@ -0,0 +1,49 @@
+# heatmap_worker.py
+
+import multiprocessing
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def _worker_main(poll_interval, once):
+    # Runs in a child process; set Django up again when the child was spawned
+    import django
+    django.setup()
+    from django.db import connections
+    from HeatMap.jobs import work
+
+    # Never reuse database connections inherited from the parent
+    connections.close_all()
+    try:
+        work(poll_interval, once)
+    except KeyboardInterrupt:
+        pass
+
+
+class Command(BaseCommand):
+    help = "Run a pool of worker processes that execute queued heatmap jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.HEATMAP_JOB_WORKERS)
+        parser.add_argument('--poll-interval', type=float, default=settings.HEATMAP_JOB_POLL_INTERVAL)
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        from django.db import connections
+        connections.close_all()
+
+        workers = [
+            multiprocessing.Process(target=_worker_main, args=(options['poll_interval'], options['once']))
+            for _ in range(max(1, options['workers']))
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} heatmap worker(s).")
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
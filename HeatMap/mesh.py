@@ -0,0 +1,204 @@
+# mesh.py
+
+from dataclasses import dataclass
+import numpy as np
+
+_WHITESPACE = np.zeros(256, dtype=bool)
+_WHITESPACE[list(b' \t\r\n\v\f')] = True
+
+
+@dataclass
+class ObjMesh:
+    """
+    Compact in-memory representation of a Wavefront OBJ file.
+
+    Faces are stored CSR-style: the corners of face ``i`` are
+    ``face_vertices[face_offsets[i]:face_offsets[i + 1]]``. All indices are
+    zero-based; a missing ``vt``/``vn`` reference is stored as -1 and the
+    corresponding array is None when the file has no such references at all.
+
+    Objects (``o`` records) are CSR over faces: object ``j`` named
+    ``object_names[j]`` owns faces ``object_offsets[j]:object_offsets[j + 1]``.
+    Faces before the first ``o`` record belong to an unnamed object.
+    """
+    vertices: np.ndarray
+    face_offsets: np.ndarray
+    face_vertices: np.ndarray
+    texcoords: np.ndarray
+    normals: np.ndarray
+    face_texcoords: np.ndarray = None
+    face_normals: np.ndarray = None
+    object_offsets: np.ndarray = None
+    object_names: np.ndarray = None
+
+    @property
+    def face_count(self):
+        return len(self.face_offsets) - 1
+
+    @property
+    def object_count(self):
+        return 0 if self.object_offsets is None else len(self.object_offsets) - 1
+
+    @property
+    def face_sizes(self):
+        return np.diff(self.face_offsets)
+
+    def faces(self):
+        """Return the faces as a list of vertex index arrays (legacy layout)."""
+        return np.split(self.face_vertices, self.face_offsets[1:-1])
+
+
+def _select_records(buf, starts, lengths, mask):
+    """
+    Gather the selected lines into one contiguous, newline-terminated buffer
+    and return it with the offset of every record inside it.
+    """
+    body = buf[np.repeat(mask, lengths)]
+    record_lengths = lengths[mask]
+    record_starts = np.concatenate(([0], np.cumsum(record_lengths)[:-1]))
+    return body, record_starts
+
+
+def _tokens_per_record(body, record_starts):
+    is_space = _WHITESPACE[body]
+    token_start = ~is_space & np.concatenate(([True], is_space[:-1]))
+    return np.add.reduceat(token_start.astype(np.int64), record_starts)
+
+
+def _parse_integers(body, expected):
+    values = np.fromstring(body.tobytes(), dtype=np.int64, sep=' ')
+    if len(values) != expected:
+        raise ValueError("Malformed numeric record in OBJ file.")
+    return values
+
+
+def _parse_float_records(buf, starts, lengths, mask, width, dtype):
+    if not mask.any():
+        return np.zeros((0, width), dtype=dtype)
+    body, record_starts = _select_records(buf, starts, lengths, mask)
+    values = np.fromstring(body.tobytes(), dtype=np.float64, sep=' ')
+    if len(values) == len(record_starts) * width:
+        rows = values.reshape(-1, width)
+    else:
+        # Optional trailing components (w, vertex colours) are present
+        counts = _tokens_per_record(body, record_starts)
+        if len(values) != counts.sum() or counts.min() < width:
+            raise ValueError("Malformed numeric record in OBJ file.")
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        rows = values[offsets[:, None] + np.arange(width)]
+    return np.ascontiguousarray(rows, dtype=dtype)
+
+
+def _parse_face_records(buf, starts, lengths, mask, v_before, vt_before, vn_before):
+    body, record_starts = _select_records(buf, starts, lengths, mask)
+    sizes = _tokens_per_record(body, record_starts)
+    slash = ord('/')
+
+    # Normalise every corner to the full v/vt/vn layout, using 0 (never a
+    # valid OBJ index) for missing references: "a//c" -> "a/0/c", "a" -> "a/0/0"
+    empty = np.flatnonzero((body[:-1] == slash) & (body[1:] == slash)) + 1
+    body = np.insert(body, empty, ord('0'))
+    is_space = _WHITESPACE[body]
+    token_start = ~is_space & np.concatenate(([True], is_space[:-1]))
+    token_end = np.flatnonzero(~is_space & np.concatenate((is_space[1:], [True]))) + 1
+    token_id = np.cumsum(token_start) - 1
+    slashes = np.bincount(token_id[body == slash], minlength=len(token_end))
+    if slashes.max(initial=0) > 2:
+        raise ValueError("Malformed face record in OBJ file.")
+    padding = 2 - slashes
+    body = np.insert(
+        body,
+        np.repeat(token_end, padding * 2),
+        np.tile(np.array([slash, ord('0')], dtype=np.uint8), int(padding.sum())),
+    )
+    body[body == slash] = ord(' ')
+    corners = int(sizes.sum())
+    values = _parse_integers(body, corners * 3).reshape(corners, 3)
+
+    offsets = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+    columns = {}
+    for position, before in enumerate((v_before, vt_before, vn_before)):
+        raw = values[:, position]
+        if position and not raw.any():
+            columns[position] = None
+            continue
+        before = np.repeat(before, sizes)
+        # Positive indices are 1-based, negative ones are relative to the
+        # number of records read so far
+        columns[position] = np.where(raw < 0, before + raw, raw - 1).astype(np.int32)
+    if (columns[0] < 0).any():
+        raise ValueError("Face record without a vertex index in OBJ file.")
+    return offsets, columns
+
+
+def _parse_objects(buf, starts, lengths, is_o, is_f):
+    """Object names and CSR face offsets from the ``o`` records."""
+    face_count = int(is_f.sum())
+    if is_o.any():
+        body, _ = _select_records(buf, starts, lengths, is_o)
+        names = [line[1:].strip().decode('utf-8', 'replace') for line in body.tobytes().split(b'\n')[:-1]]
+        offsets = np.cumsum(is_f)[is_o]
+    else:
+        names, offsets = [], np.zeros(0, dtype=np.int64)
+    if not len(offsets) or offsets[0] > 0:
+        names.insert(0, '')
+        offsets = np.concatenate(([0], offsets))
+    return np.append(offsets, face_count).astype(np.int64), np.array(names, dtype=str)
+
+
+def load_obj_mesh(file_path, dtype=np.float64):
+    """
+    Parse an OBJ file in a single bulk pass over its bytes.
+
+    Only geometry records (``v``, ``vt``, ``vn`` and ``f``) and object
+    boundaries (``o``) are kept.
+    """
+    with open(file_path, 'rb') as file:
+        # A trailing newline guarantees every line, including the last, ends in one
+        buf = np.frombuffer(file.read() + b'\n', dtype=np.uint8).copy()
+    newlines = np.flatnonzero(buf == ord('\n'))
+    starts = np.concatenate(([0], newlines[:-1] + 1))
+    lengths = newlines - starts + 1
+
+    # Classify every line by its keyword; bytes past a short line are its newline
+    first = buf[starts]
+    second = buf[np.minimum(starts + 1, newlines)]
+    third = buf[np.minimum(starts + 2, newlines)]
+    is_v = (first == ord('v')) & _WHITESPACE[second]
+    is_vt = (first == ord('v')) & (second == ord('t')) & _WHITESPACE[third]
+    is_vn = (first == ord('v')) & (second == ord('n')) & _WHITESPACE[third]
+    is_f = (first == ord('f')) & _WHITESPACE[second]
+    is_o = (first == ord('o')) & _WHITESPACE[second]
+
+    # Blank out the keywords so record bodies parse as plain numbers
+    buf[starts[is_v | is_vt | is_vn | is_f]] = ord(' ')
+    buf[starts[is_vt | is_vn] + 1] = ord(' ')
+
+    vertices = _parse_float_records(buf, starts, lengths, is_v, 3, dtype)
+    texcoords = _parse_float_records(buf, starts, lengths, is_vt, 2, dtype)
+    normals = _parse_float_records(buf, starts, lengths, is_vn, 3, dtype)
+
+    face_columns = {0: np.zeros(0, dtype=np.int32), 1: None, 2: None}
+    if is_f.any():
+        # Records read before each face, used to resolve relative indices
+        v_before = np.cumsum(is_v)[is_f]
+        vt_before = np.cumsum(is_vt)[is_f]
+        vn_before = np.cumsum(is_vn)[is_f]
+        face_offsets, face_columns = _parse_face_records(
+            buf, starts, lengths, is_f, v_before, vt_before, vn_before
+        )
+    else:
+        face_offsets = np.zeros(1, dtype=np.int64)
+    object_offsets, object_names = _parse_objects(buf, starts, lengths, is_o, is_f)
+
+    return ObjMesh(
+        vertices=vertices,
+        face_offsets=face_offsets,
+        face_vertices=face_columns[0],
+        texcoords=texcoords,
+        normals=normals,
+        face_texcoords=face_columns[1],
+        face_normals=face_columns[2],
+        object_offsets=object_offsets,
+        object_names=object_names,
+    )
@@ -0,0 +1,430 @@
+# mesh_cache.py
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import numpy as np
+from django.conf import settings
+from .mesh import ObjMesh, load_obj_mesh
+from .geometry import face_geometry, projected_areas, segment_positions
+from .occlusion import BVH, build_bvh
+from .lod import LodLevel, decimate
+from .tiles import ObjectIndex, build_object_index
+
+# Bump whenever the sidecar layout or the derived arrays change
+SIDECAR_VERSION = 3
+
+MESH_ARRAYS = [
+    'vertices', 'face_offsets', 'face_vertices', 'texcoords', 'normals',
+    'face_texcoords', 'face_normals', 'object_offsets', 'object_names',
+]
+
+
+# Per-face arrays derived from the mesh and stored next to it
+GEOMETRY_ARRAYS = ['areas', 'unit_normals', 'centroids', 'projected_areas']
+
+# How the faces of a decimated level map back onto the full mesh
+LOD_ARRAYS = ['source_faces', 'targets', 'weights']
+
+
+@dataclass
+class CachedMesh:
+    mesh: ObjMesh
+    areas: np.ndarray
+    unit_normals: np.ndarray
+    centroids: np.ndarray
+    projected_areas: np.ndarray
+    content_hash: str
+    sidecar_dir: str
+    bvh: BVH = None
+    lods: dict = field(default_factory=dict)
+    object_index: ObjectIndex = None
+    # Request-independent results derived from the mesh, kept with it
+    derived: dict = field(default_factory=dict)
+    # Set on submeshes: the mesh they were cut from and their faces in it
+    parent: 'CachedMesh' = None
+    parent_faces: np.ndarray = None
+
+
+_lru = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cache_dir():
+    return str(settings.HEATMAP_MESH_CACHE_DIR)
+
+
+def _stat_key(obj_path):
+    stat = os.stat(obj_path)
+    return os.path.realpath(obj_path), stat.st_mtime_ns, stat.st_size
+
+
+def _file_hash(obj_path):
+    digest = hashlib.sha256()
+    with open(obj_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _path_index_file(real_path):
+    name = hashlib.sha1(real_path.encode()).hexdigest()
+    return os.path.join(_cache_dir(), 'paths', f"{name}.json")
+
+
+def _known_content_hash(key):
+    # Content hash recorded for a (path, mtime, size) key, or None if the
+    # file was never hashed or was replaced since
+    real_path, mtime_ns, size = key
+    try:
+        with open(_path_index_file(real_path)) as file:
+            entry = json.load(file)
+        if entry['mtime_ns'] == mtime_ns and entry['size'] == size:
+            return entry['content_hash']
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def _content_hash(key):
+    """
+    Resolve the content hash for a (path, mtime, size) key, only hashing the
+    file when it was replaced since the last time we saw it.
+    """
+    content_hash = _known_content_hash(key)
+    if content_hash is not None:
+        return content_hash
+
+    real_path, mtime_ns, size = key
+    index_file = _path_index_file(real_path)
+    content_hash = _file_hash(real_path)
+    os.makedirs(os.path.dirname(index_file), exist_ok=True)
+    _atomic_write_json(index_file, {
+        'path': real_path, 'mtime_ns': mtime_ns, 'size': size, 'content_hash': content_hash,
+    })
+    return content_hash
+
+
+def _atomic_write_json(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as file:
+        json.dump(data, file)
+    os.replace(tmp_path, path)
+
+
+def _sidecar_path(content_hash):
+    return os.path.join(_cache_dir(), content_hash)
+
+
+def _read_sidecar(sidecar_dir):
+    """Memory-map every array of a sidecar directory, or return None if it is missing or stale."""
+    try:
+        with open(os.path.join(sidecar_dir, 'meta.json')) as file:
+            meta = json.load(file)
+        if meta.get('version') != SIDECAR_VERSION:
+            return None
+        arrays = {}
+        for name in meta['arrays']:
+            arrays[name] = np.load(os.path.join(sidecar_dir, f"{name}.npy"), mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        return None
+    return arrays
+
+
+def _write_sidecar(sidecar_dir, arrays):
+    """
+    Write every array as its own .npy file so readers can memory-map them,
+    then publish the directory with an atomic rename.
+    """
+    parent = os.path.dirname(sidecar_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+    try:
+        stored = []
+        for name, array in arrays.items():
+            if array is None:
+                continue
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(array))
+            stored.append(name)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as file:
+            json.dump({'version': SIDECAR_VERSION, 'arrays': stored}, file)
+        if os.path.isdir(sidecar_dir):
+            shutil.rmtree(sidecar_dir, ignore_errors=True)
+        os.rename(tmp_dir, sidecar_dir)
+    except OSError:
+        # Another process published the same sidecar first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(sidecar_dir):
+            raise
+
+
+def _cached_mesh(arrays, content_hash, sidecar_dir):
+    mesh = ObjMesh(**{name: arrays.get(name) for name in MESH_ARRAYS})
+    geometry = {name: arrays[name] for name in GEOMETRY_ARRAYS}
+    return CachedMesh(mesh, content_hash=content_hash, sidecar_dir=sidecar_dir, **geometry)
+
+
+def _mesh_arrays(mesh):
+    # Mesh arrays plus the per-face geometry derived from them
+    areas, normals, centroids = face_geometry(mesh.vertices, mesh.face_offsets, mesh.face_vertices)
+    arrays = {name: getattr(mesh, name) for name in MESH_ARRAYS}
+    arrays.update(
+        areas=areas, unit_normals=normals, centroids=centroids,
+        projected_areas=projected_areas(areas, normals),
+    )
+    return arrays
+
+
+def _build(obj_path, content_hash):
+    sidecar_dir = _sidecar_path(content_hash)
+    arrays = _read_sidecar(sidecar_dir)
+    if arrays is None:
+        arrays = _mesh_arrays(load_obj_mesh(obj_path))
+        _write_sidecar(sidecar_dir, arrays)
+    return _cached_mesh(arrays, content_hash, sidecar_dir)
+
+
+def open_sidecar(sidecar_dir):
+    """
+    Memory-map a published mesh sidecar, and its BVH if one was built,
+    without consulting settings or the source OBJ. Returns None if missing.
+    """
+    arrays = _read_sidecar(sidecar_dir)
+    if arrays is None:
+        return None
+    cached = _cached_mesh(arrays, os.path.basename(sidecar_dir), sidecar_dir)
+    bvh_arrays = _read_sidecar(os.path.join(sidecar_dir, 'bvh'))
+    if bvh_arrays is not None:
+        cached.bvh = BVH(**bvh_arrays)
+    return cached
+
+
+def get_cached_mesh(obj_path):
+    """
+    Return the parsed mesh and its derived per-face arrays for ``obj_path``.
+
+    Lookups go through an in-process LRU keyed on (path, mtime, size), then
+    through an on-disk sidecar keyed on the file's content hash, so
+    replacing the OBJ file invalidates both automatically.
+    """
+    key = _stat_key(obj_path)
+    with _lock:
+        if key in _lru:
+            _lru.move_to_end(key)
+            return _lru[key]
+
+    cached = _build(obj_path, _content_hash(key))
+
+    with _lock:
+        _lru[key] = cached
+        _lru.move_to_end(key)
+        while len(_lru) > settings.HEATMAP_MESH_CACHE_SIZE:
+            _lru.popitem(last=False)
+    return cached
+
+
+def source_version(obj_path):
+    """
+    Version of an OBJ file from its path, modification time and size alone,
+    which changes whenever the file is replaced. Keys results without
+    reading, hashing or parsing the file.
+    """
+    return hashlib.sha256(json.dumps(_stat_key(obj_path)).encode()).hexdigest()
+
+
+def known_object_index(obj_path):
+    """
+    Object index of ``obj_path`` if this process has the mesh cached or its
+    sidecar already holds one; None rather than parsing or hashing the file.
+    """
+    key = _stat_key(obj_path)
+    with _lock:
+        cached = _lru.get(key)
+    if cached is not None:
+        return get_object_index(cached)
+    content_hash = _known_content_hash(key)
+    if content_hash is None:
+        return None
+    arrays = _read_sidecar(os.path.join(_sidecar_path(content_hash), 'objects', str(settings.HEATMAP_TILE_GRID)))
+    return None if arrays is None else ObjectIndex(**arrays)
+
+
+def get_bvh(cached):
+    """
+    Return the occlusion BVH of a cached mesh, building it on first use.
+
+    The tree is stored in a ``bvh`` sidecar next to the mesh arrays and kept
+    on the cached entry, so it is built once per model, not per sun position.
+    A submesh shares the tree of the mesh it was cut from.
+    """
+    if cached.parent is not None:
+        return get_bvh(cached.parent)
+    if cached.bvh is None:
+        bvh_dir = os.path.join(cached.sidecar_dir, 'bvh')
+        arrays = _read_sidecar(bvh_dir)
+        if arrays is None:
+            mesh = cached.mesh
+            bvh = build_bvh(mesh.vertices, mesh.face_offsets, mesh.face_vertices)
+            _write_sidecar(bvh_dir, bvh.arrays())
+        else:
+            bvh = BVH(**arrays)
+        cached.bvh = bvh
+    return cached.bvh
+
+
+def get_lod(cached, level):
+    """
+    Return decimated level ``level`` (1 is the finest) of a cached mesh.
+
+    Level ``n`` clusters vertices on a grid of HEATMAP_LOD_RESOLUTIONS[n - 1]
+    cells along the longest side of the model. Levels are built once and
+    stored in ``lod/<resolution>`` sidecars next to the mesh. A submesh
+    cuts its levels out of those of the mesh it was cut from, so regions
+    share the whole model's grid.
+    """
+    resolution = settings.HEATMAP_LOD_RESOLUTIONS[level - 1]
+    if resolution not in cached.lods and cached.parent is not None:
+        cached.lods[resolution] = _region_lod(
+            get_lod(cached.parent, level), cached.parent_faces, cached.parent.mesh.face_count
+        )
+    if resolution not in cached.lods:
+        lod_dir = None
+        if cached.sidecar_dir is not None:
+            lod_dir = os.path.join(cached.sidecar_dir, 'lod', str(resolution))
+        arrays = _read_sidecar(lod_dir) if lod_dir else None
+        if arrays is None:
+            mesh = cached.mesh
+            cell_size = float(np.ptp(mesh.vertices, axis=0).max()) / resolution or 1.0
+            coarse, source_faces, targets, weights = decimate(
+                mesh.vertices, mesh.face_offsets, mesh.face_vertices, cell_size
+            )
+            arrays = _mesh_arrays(coarse)
+            arrays.update(source_faces=source_faces, targets=targets, weights=weights)
+            if lod_dir:
+                _write_sidecar(lod_dir, arrays)
+        # Each level is a mesh of its own, with its own geometry version
+        content_hash = hashlib.sha256(f"{cached.content_hash}/lod/{resolution}".encode()).hexdigest()
+        cached.lods[resolution] = LodLevel(
+            _cached_mesh(arrays, content_hash, lod_dir), **{name: arrays[name] for name in LOD_ARRAYS}
+        )
+    return cached.lods[resolution]
+
+
+def get_scale(cached, key, build):
+    """
+    Color bin edges of the whole of a cached mesh for the request inputs
+    hashed in ``key``, computed by ``build()`` on first use and stored in a
+    ``scales/<key>`` sidecar, so the region requests of those inputs share
+    one computation over the whole model, whichever process serves them.
+    """
+    scale_dir = os.path.join(cached.sidecar_dir, 'scales', key)
+    arrays = _read_sidecar(scale_dir)
+    if arrays is not None:
+        return np.asarray(arrays['ranges'])
+    ranges = build()
+    _write_sidecar(scale_dir, {'ranges': ranges})
+    return ranges
+
+
+def _region_lod(whole, faces, face_count):
+    # Level of the submesh made of ``faces`` (of a mesh of ``face_count``
+    # faces) cut out of that mesh's level ``whole``: the coarse faces its
+    # faces feed, aggregating only their contributions
+    local = np.full(face_count, -1)
+    local[faces] = np.arange(len(faces))
+    source_faces = local[whole.source_faces]
+    inside = source_faces >= 0
+    coarse_faces, targets = np.unique(np.asarray(whole.targets)[inside], return_inverse=True)
+    return LodLevel(
+        _cut(whole.cached, coarse_faces), source_faces=source_faces[inside], targets=targets.ravel(),
+        weights=np.asarray(whole.weights)[inside],
+    )
+
+
+def get_object_index(cached):
+    """
+    Return the object bounding boxes and tile grid of a cached mesh,
+    building them on first use into an ``objects`` sidecar.
+    """
+    if cached.object_index is None:
+        index_dir = os.path.join(cached.sidecar_dir, 'objects', str(settings.HEATMAP_TILE_GRID))
+        arrays = _read_sidecar(index_dir)
+        if arrays is None:
+            object_index = build_object_index(cached.mesh, settings.HEATMAP_TILE_GRID)
+            _write_sidecar(index_dir, object_index.arrays())
+        else:
+            object_index = ObjectIndex(**arrays)
+        cached.object_index = object_index
+    return cached.object_index
+
+
+def _compact(indices, rows):
+    # Keep only the referenced rows and renumber the indices (-1 stays -1)
+    if indices is None:
+        return None, rows
+    valid = indices >= 0
+    used, inverse = np.unique(indices[valid], return_inverse=True)
+    compact = np.full(len(indices), -1, dtype=np.int32)
+    compact[valid] = inverse
+    return compact, rows[used]
+
+
+def _cut(cached, faces, object_offsets=None, object_names=None):
+    # CachedMesh of the given faces of a cached mesh, keeping only the
+    # vertices and texture data they use; parent_faces maps back to ``cached``
+    mesh = cached.mesh
+    face_offsets = np.asarray(mesh.face_offsets)
+    sizes = np.diff(face_offsets)[faces]
+    corners = segment_positions(face_offsets[faces], sizes)
+    face_vertices, vertices = _compact(np.asarray(mesh.face_vertices)[corners], np.asarray(mesh.vertices))
+    face_texcoords, texcoords = _compact(
+        None if mesh.face_texcoords is None else np.asarray(mesh.face_texcoords)[corners], np.asarray(mesh.texcoords)
+    )
+    face_normals, normals = _compact(
+        None if mesh.face_normals is None else np.asarray(mesh.face_normals)[corners], np.asarray(mesh.normals)
+    )
+    part = ObjMesh(
+        vertices=vertices,
+        face_offsets=np.concatenate(([0], np.cumsum(sizes))).astype(np.int64),
+        face_vertices=face_vertices,
+        texcoords=texcoords,
+        normals=normals,
+        face_texcoords=face_texcoords,
+        face_normals=face_normals,
+        object_offsets=object_offsets,
+        object_names=object_names,
+    )
+    content_hash = hashlib.sha256(cached.content_hash.encode() + np.asarray(faces).tobytes()).hexdigest()
+    return CachedMesh(
+        part,
+        areas=np.asarray(cached.areas)[faces],
+        unit_normals=np.asarray(cached.unit_normals)[faces],
+        centroids=np.asarray(cached.centroids)[faces],
+        projected_areas=np.asarray(cached.projected_areas)[faces],
+        content_hash=content_hash,
+        sidecar_dir=None,
+        parent=cached,
+        parent_faces=faces,
+    )
+
+
+def submesh(cached, objects):
+    """
+    Cut the faces of ``objects`` (ascending object ids) out of a cached mesh.
+
+    The result is a CachedMesh of its own whose ``parent_faces`` map its
+    faces back to ``cached``, so shadows are still cast by the whole model.
+    """
+    mesh = cached.mesh
+    object_offsets = np.asarray(mesh.object_offsets)
+    object_sizes = np.diff(object_offsets)[objects]
+    faces = segment_positions(object_offsets[objects], object_sizes)
+    return _cut(
+        cached, faces, np.concatenate(([0], np.cumsum(object_sizes))).astype(np.int64),
+        np.asarray(mesh.object_names)[objects],
+    )
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('HeatMap', '0002_processedmodel_summary_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processedmodel',
+            name='glb_file',
+            field=models.FileField(blank=True, null=True, upload_to=''),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('HeatMap', '0003_processedmodel_glb_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processedmodel',
+            name='cache_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='processedmodel',
+            name='last_accessed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='processedmodel',
+            name='size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='processedmodel',
+            name='summary',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
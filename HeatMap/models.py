@@ -1,11 +1,78 @@
 # models.py
 
+import uuid
 from django.db import models
 
 class ProcessedModel(models.Model):
     obj_file = models.FileField(upload_to='', null=True, blank=True)
     mtl_file = models.FileField(upload_to='', null=True, blank=True)
+    summary_file = models.FileField(upload_to='', null=True, blank=True)
+    glb_file = models.FileField(upload_to='', null=True, blank=True)
+    summary = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Result cache bookkeeping, see result_cache.py
+    cache_key = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    last_accessed = models.DateTimeField(null=True, blank=True)
+    size = models.BigIntegerField(default=0)
+
     def __str__(self):
         return f"Processed Model {self.id}"
+
+
+class HeatmapJob(models.Model):
+    """A queued heatmap computation, executed by the heatmap_worker command."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    cache_key = models.CharField(max_length=64, db_index=True)
+    params = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    progress = models.FloatField(default=0)
+    result = models.ForeignKey(ProcessedModel, null=True, blank=True, on_delete=models.SET_NULL)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # At most one queued or running job per result, so identical
+            # requests coalesce onto it
+            models.UniqueConstraint(
+                fields=['cache_key'], condition=models.Q(status__in=['queued', 'running']),
+                name='heatmapjob_unique_in_flight'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Heatmap Job {self.id} ({self.status})"
+
+
+class UploadedModel(models.Model):
+    """A customer OBJ model, uploaded in chunks and parsed into the mesh cache."""
+    UPLOADING = 'uploading'
+    PROCESSING = 'processing'
+    READY = 'ready'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (UPLOADING, 'Uploading'), (PROCESSING, 'Processing'), (READY, 'Ready'), (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=255, blank=True)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=UPLOADING)
+    content_hash = models.CharField(max_length=64, blank=True)
+    face_count = models.IntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Uploaded Model {self.name or self.id} ({self.status})"
@@ -0,0 +1,187 @@
+# occlusion.py
+
+from dataclasses import dataclass, fields
+import numpy as np
+from .geometry import fan_triangles, segment_positions, segment_reduce
+
+# Triangles per BVH leaf and rays traced together per traversal batch
+LEAF_SIZE = 8
+RAY_BATCH_SIZE = 4096
+
+
+@dataclass
+class BVH:
+    """
+    Bounding-volume hierarchy over the fan triangulation of a mesh, stored
+    as flat arrays. Triangles are stored in tree order, so node ``i`` covers
+    triangles ``node_start[i]:node_start[i] + node_count[i]``; leaves have
+    ``node_left == -1``.
+    """
+    node_min: np.ndarray
+    node_max: np.ndarray
+    node_left: np.ndarray
+    node_right: np.ndarray
+    node_start: np.ndarray
+    node_count: np.ndarray
+    triangle_origin: np.ndarray
+    triangle_edge1: np.ndarray
+    triangle_edge2: np.ndarray
+    triangle_faces: np.ndarray
+
+    def arrays(self):
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+
+def build_bvh(vertices, face_offsets, face_vertices, leaf_size=LEAF_SIZE):
+    """
+    Build a BVH with median splits along the longest centroid axis.
+
+    All nodes of one tree level are split together with a single sort, so
+    the build needs one pass per level rather than one per node.
+    """
+    corners, triangle_faces = fan_triangles(face_offsets)
+    triangles = vertices[face_vertices[corners]]
+    triangle_min = triangles.min(axis=1)
+    triangle_max = triangles.max(axis=1)
+    centroids = triangles.mean(axis=1)
+    order = np.arange(len(triangles))
+
+    node_start = [np.zeros(1, dtype=np.int64)]
+    node_count = [np.array([len(triangles)], dtype=np.int64)]
+    parents, left_children, right_children = [], [], []
+    next_node = 1
+    frontier = np.zeros(1, dtype=np.int64)
+    frontier_start, frontier_count = node_start[0], node_count[0]
+
+    while True:
+        splits = frontier_count > leaf_size
+        frontier, frontier_start, frontier_count = frontier[splits], frontier_start[splits], frontier_count[splits]
+        if not len(frontier):
+            break
+
+        # Sort every splitting node's triangles along its longest axis
+        positions = segment_positions(frontier_start, frontier_count)
+        members = np.repeat(np.arange(len(frontier)), frontier_count)
+        member_centroids = centroids[order[positions]]
+        local_starts = np.cumsum(frontier_count) - frontier_count
+        extent = (
+            segment_reduce(np.maximum, member_centroids, local_starts, frontier_count)
+            - segment_reduce(np.minimum, member_centroids, local_starts, frontier_count)
+        )
+        axis = np.argmax(extent, axis=1)
+        keys = member_centroids[np.arange(len(positions)), axis[members]]
+        order[positions] = order[positions][np.lexsort((keys, members))]
+
+        # Children take the lower and upper halves of the sorted range; all
+        # left children of a level come first, then all right children
+        half = frontier_count // 2
+        parents.append(frontier)
+        left_children.append(next_node + np.arange(len(frontier)))
+        right_children.append(left_children[-1] + len(frontier))
+        frontier = next_node + np.arange(2 * len(frontier))
+        next_node += len(frontier)
+        frontier_start = np.concatenate((frontier_start, frontier_start + half))
+        frontier_count = np.concatenate((half, frontier_count - half))
+        node_start.append(frontier_start)
+        node_count.append(frontier_count)
+
+    node_start = np.concatenate(node_start)
+    node_count = np.concatenate(node_count)
+    node_left = np.full(len(node_start), -1, dtype=np.int64)
+    node_right = np.full(len(node_start), -1, dtype=np.int64)
+    if parents:
+        node_left[np.concatenate(parents)] = np.concatenate(left_children)
+        node_right[np.concatenate(parents)] = np.concatenate(right_children)
+
+    sorted_triangles = triangles[order]
+    return BVH(
+        node_min=segment_reduce(np.minimum, triangle_min[order], node_start, node_count),
+        node_max=segment_reduce(np.maximum, triangle_max[order], node_start, node_count),
+        node_left=node_left,
+        node_right=node_right,
+        node_start=node_start,
+        node_count=node_count,
+        triangle_origin=sorted_triangles[:, 0],
+        triangle_edge1=sorted_triangles[:, 1] - sorted_triangles[:, 0],
+        triangle_edge2=sorted_triangles[:, 2] - sorted_triangles[:, 0],
+        triangle_faces=triangle_faces[order],
+    )
+
+
+def _ray_triangle_hits(origins, direction, bvh, triangles, t_min):
+    """Möller-Trumbore test of (ray, triangle) pairs sharing one direction."""
+    edge1 = bvh.triangle_edge1[triangles]
+    edge2 = bvh.triangle_edge2[triangles]
+    p = np.cross(direction, edge2)
+    determinant = np.einsum('ij,ij->i', edge1, p)
+    parallel = np.abs(determinant) < 1e-12
+    inverse = 1.0 / np.where(parallel, 1.0, determinant)
+    s = origins - bvh.triangle_origin[triangles]
+    u = np.einsum('ij,ij->i', s, p) * inverse
+    q = np.cross(s, edge1)
+    v = (q @ direction) * inverse
+    t = np.einsum('ij,ij->i', edge2, q) * inverse
+    return ~parallel & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > t_min)
+
+
+def _occluded_batch(bvh, origins, faces, direction, inverse_direction, t_min):
+    hit = np.zeros(len(origins), dtype=bool)
+    rays = np.arange(len(origins))
+    nodes = np.zeros(len(origins), dtype=np.int64)
+    while len(rays):
+        # Drop rays already known to be blocked, then slab-test the rest
+        pending = ~hit[rays]
+        rays, nodes = rays[pending], nodes[pending]
+        near = (bvh.node_min[nodes] - origins[rays]) * inverse_direction
+        far = (bvh.node_max[nodes] - origins[rays]) * inverse_direction
+        t_enter = np.minimum(near, far).max(axis=1)
+        t_exit = np.maximum(near, far).min(axis=1)
+        crosses = t_exit >= np.maximum(t_enter, 0)
+        rays, nodes = rays[crosses], nodes[crosses]
+
+        leaf = bvh.node_left[nodes] < 0
+        if leaf.any():
+            leaf_rays, leaf_nodes = rays[leaf], nodes[leaf]
+            counts = bvh.node_count[leaf_nodes]
+            triangles = segment_positions(bvh.node_start[leaf_nodes], counts)
+            pair_rays = np.repeat(leaf_rays, counts)
+            # A face never shadows itself
+            candidates = bvh.triangle_faces[triangles] != faces[pair_rays]
+            pair_rays, triangles = pair_rays[candidates], triangles[candidates]
+            blocked = _ray_triangle_hits(origins[pair_rays], direction, bvh, triangles, t_min)
+            hit[pair_rays[blocked]] = True
+
+        inner = ~leaf
+        rays = np.concatenate((rays[inner], rays[inner]))
+        nodes = np.concatenate((bvh.node_left[nodes[inner]], bvh.node_right[nodes[inner]]))
+    return hit
+
+
+def shaded_faces(bvh, centroids, normals, faces, sun_vector, batch_size=RAY_BATCH_SIZE):
+    """
+    Cast one shadow ray per face centroid toward the sun and return a mask
+    of the faces whose ray is blocked by another part of the mesh.
+
+    ``faces`` are the ids of the faces the centroids belong to. The BVH does
+    not depend on the sun, so one tree serves any number of sun positions.
+    """
+    direction = np.asarray(sun_vector, dtype=np.float64)
+    direction = direction / np.linalg.norm(direction)
+    safe_direction = np.where(np.abs(direction) < 1e-12, 1e-12, direction)
+    inverse_direction = 1.0 / safe_direction
+
+    # Lift the origins off their face to avoid hitting coplanar neighbours
+    scale = float(np.abs(bvh.node_max[0] - bvh.node_min[0]).max()) if len(bvh.node_min) else 1.0
+    t_min = 1e-7 * scale
+    origins = np.asarray(centroids) + np.asarray(normals) * (1e-6 * scale)
+
+    shaded = np.zeros(len(origins), dtype=bool)
+    if not len(bvh.triangle_faces):
+        return shaded
+    faces = np.asarray(faces)
+    for start in range(0, len(origins), batch_size):
+        stop = start + batch_size
+        shaded[start:stop] = _occluded_batch(
+            bvh, origins[start:stop], faces[start:stop], direction, inverse_direction, t_min
+        )
+    return shaded
@@ -0,0 +1,83 @@
+# parallel.py
+
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from .mesh_cache import open_sidecar
+
+# Meshes a pool process keeps memory-mapped at once
+WORKER_MESH_CACHE_SIZE = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Pool processes never fan out again
+_in_worker = False
+_worker_meshes = {}
+
+
+def _init_worker():
+    global _in_worker
+    _in_worker = True
+
+
+def parallel_enabled(face_count):
+    """Whether work over ``face_count`` faces should be spread across the process pool."""
+    if _in_worker:
+        return False
+    return settings.HEATMAP_PARALLEL_WORKERS > 1 and face_count >= settings.HEATMAP_PARALLEL_MIN_FACES
+
+
+def partition(count, chunk_size):
+    # (start, stop) ranges of at most chunk_size items, at least one per worker
+    per_worker = -(-count // settings.HEATMAP_PARALLEL_WORKERS)
+    chunk = max(1, min(chunk_size, per_worker))
+    return [(start, min(start + chunk, count)) for start in range(0, count, chunk)]
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.HEATMAP_PARALLEL_WORKERS, initializer=_init_worker
+            )
+        return _executor
+
+
+def map_tasks(function, tasks, progress=None):
+    """
+    Run ``function(*task)`` for every task on the process pool and return
+    the results in task order. ``progress`` is called with the completed
+    fraction as tasks finish.
+    """
+    global _executor
+    executor = _get_executor()
+    try:
+        futures = {executor.submit(function, *task): i for i, task in enumerate(tasks)}
+        results = [None] * len(tasks)
+        for done, future in enumerate(as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            if progress:
+                progress(done / len(tasks))
+    except BrokenProcessPool:
+        # A worker died; start a fresh pool on the next call
+        with _executor_lock:
+            _executor = None
+        raise
+    return results
+
+
+def worker_mesh(sidecar_dir):
+    """
+    Cached mesh of ``sidecar_dir`` inside a pool process. Its arrays are
+    memory-mapped from the sidecar's .npy files, so every worker shares the
+    same pages instead of receiving a pickled copy of the mesh.
+    """
+    cached = _worker_meshes.get(sidecar_dir)
+    if cached is None:
+        if len(_worker_meshes) >= WORKER_MESH_CACHE_SIZE:
+            _worker_meshes.clear()
+        cached = _worker_meshes[sidecar_dir] = open_sidecar(sidecar_dir)
+    return cached
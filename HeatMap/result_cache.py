@@ -0,0 +1,81 @@
+# result_cache.py
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+from .exporters import ChunkedContent
+from .models import ProcessedModel
+
+FILE_FIELDS = ('obj_file', 'mtl_file', 'glb_file', 'summary_file')
+EPOCH = datetime(1970, 1, 1)
+
+
+def quantize_timestamp(timestamp):
+    # Round down to the cache's time quantum so nearby requests share a result
+    quantum = settings.HEATMAP_RESULT_TIME_QUANTUM
+    seconds = int((timestamp - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=seconds - seconds % quantum)
+
+
+def result_cache_key(model_hash, **inputs):
+    """
+    Content address of a heatmap result: the source model's content hash
+    plus the normalized request inputs.
+    """
+    normalized = {}
+    for name, value in inputs.items():
+        if isinstance(value, float):
+            value = float(f"{value:.6g}")
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        normalized[name] = value
+    payload = json.dumps({'model': model_hash, **normalized}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def lookup_result(cache_key):
+    processed_model = ProcessedModel.objects.filter(cache_key=cache_key).order_by('-id').first()
+    if processed_model is not None:
+        ProcessedModel.objects.filter(pk=processed_model.pk).update(last_accessed=timezone.now())
+    return processed_model
+
+
+def store_result(cache_key, outputs, summary=None):
+    """
+    Save a freshly computed result under ``cache_key`` and evict the least
+    recently used results beyond the configured entry and size budgets.
+
+    ``outputs`` maps file fields to (name, chunk iterator) pairs; each file
+    is streamed into the storage backend as it is encoded.
+    """
+    processed_model = ProcessedModel(cache_key=cache_key, last_accessed=timezone.now(), summary=summary)
+    for field, (name, chunks) in outputs.items():
+        getattr(processed_model, field).save(name, ChunkedContent(chunks, name), save=False)
+    processed_model.size = sum(getattr(processed_model, field).size for field in outputs)
+    processed_model.save()
+    evict_results()
+    return processed_model
+
+
+def evict_results():
+    cached = ProcessedModel.objects.exclude(cache_key=None)
+    max_entries = settings.HEATMAP_RESULT_CACHE_MAX_ENTRIES
+    max_bytes = settings.HEATMAP_RESULT_CACHE_MAX_BYTES
+    count = cached.count()
+    total = cached.aggregate(total=Sum('size'))['total'] or 0
+    if count <= max_entries and total <= max_bytes:
+        return
+
+    for processed_model in cached.order_by('last_accessed', 'id').iterator():
+        if count <= max_entries and total <= max_bytes:
+            break
+        for field in FILE_FIELDS:
+            file = getattr(processed_model, field)
+            if file:
+                file.delete(save=False)
+        count -= 1
+        total -= processed_model.size
+        processed_model.delete()
@@ -0,0 +1,43 @@
+# Small scenes shared by the HeatMap tests
+
+import os
+import numpy as np
+
+
+def box_obj(low, high, cells, first_vertex=1):
+    """
+    OBJ lines of an axis-aligned box with every side split into
+    ``cells`` x ``cells`` outward-facing quads.
+    """
+    low, high = np.asarray(low, dtype=np.float64), np.asarray(high, dtype=np.float64)
+    size = high - low
+    x, y, z = np.diag(size)
+    # Corner and two edges of every side, with edge u x edge v pointing out
+    sides = [
+        (low + x, y, z), (low, z, y), (low + y, z, x), (low, x, z), (low + z, x, y), (low, y, x),
+    ]
+    lines, vertex = [], first_vertex
+    steps = np.linspace(0, 1, cells + 1)
+    for corner, u, v in sides:
+        for i in range(cells):
+            for j in range(cells):
+                for a, b in ((i, j), (i + 1, j), (i + 1, j + 1), (i, j + 1)):
+                    point = corner + steps[a] * u + steps[b] * v
+                    lines.append("v {:.6f} {:.6f} {:.6f}".format(*point))
+                lines.append(f"f {vertex} {vertex + 1} {vertex + 2} {vertex + 3}")
+                vertex += 4
+    return lines
+
+
+
+def two_boxes_obj(directory, cells=3):
+    """
+    Write an OBJ of a low box (object 'low') next to a tall one ('tall'),
+    which shades part of it when the sun is low in the east, and return its path.
+    """
+    low = box_obj((0, 0, 0), (4, 2, 3), cells)
+    tall = box_obj((5.3, 0, 0.7), (7.1, 9, 2.6), cells, first_vertex=sum(line.startswith('v ') for line in low) + 1)
+    path = os.path.join(directory, "boxes.obj")
+    with open(path, 'w') as file:
+        file.write("\n".join(["o low", *low, "o tall", *tall]) + "\n")
+    return path
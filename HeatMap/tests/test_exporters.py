@@ -0,0 +1,56 @@
+import json
+import shutil
+import struct
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from HeatMap.exporters import iter_heatmap_glb
+from HeatMap.file_processor import geometry_asset
+from HeatMap.mesh_cache import get_cached_mesh
+from .scenes import two_boxes_obj
+
+
+def read_glb(data):
+    # The JSON document and binary buffer of a GLB
+    json_length, _ = struct.unpack_from('<II', data, 12)
+    gltf = json.loads(data[20:20 + json_length])
+    return gltf, data[20 + json_length + 8:]
+
+
+def read_attribute(gltf, buffer, name):
+    accessor = gltf['accessors'][gltf['meshes'][0]['primitives'][0]['attributes'][name]]
+    view = gltf['bufferViews'][accessor['bufferView']]
+    dtype = {5125: np.uint32, 5126: np.float32}[accessor['componentType']]
+    return accessor, np.frombuffer(buffer, dtype=dtype, count=accessor['count'], offset=view['byteOffset'])
+
+
+class GlbExportTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(override_settings(HEATMAP_MESH_CACHE_DIR=directory))
+        self.cached = get_cached_mesh(two_boxes_obj(directory))
+        self.corner_faces = np.repeat(
+            np.arange(self.cached.mesh.face_count), np.diff(self.cached.mesh.face_offsets)
+        )
+
+    def test_geometry_face_ids_are_unsigned_ints(self):
+        with open(geometry_asset(self.cached), 'rb') as file:
+            gltf, buffer = read_glb(file.read())
+        accessor, face_ids = read_attribute(gltf, buffer, '_FACE_ID')
+        self.assertEqual(accessor['componentType'], 5125)
+        np.testing.assert_array_equal(face_ids, self.corner_faces)
+
+    def test_integer_attributes_stay_exact_past_float32(self):
+        # float32 cannot tell 2**24 and 2**24 + 1 apart
+        ids = np.arange(self.cached.mesh.face_count) + (1 << 24)
+        gltf, buffer = read_glb(b"".join(iter_heatmap_glb(self.cached.mesh, face_attributes={'_FACE_ID': ids})))
+        _, face_ids = read_attribute(gltf, buffer, '_FACE_ID')
+        np.testing.assert_array_equal(face_ids, ids[self.corner_faces])
+
+    def test_float_attributes_stay_float(self):
+        values = np.linspace(0, 1, self.cached.mesh.face_count)
+        gltf, buffer = read_glb(b"".join(iter_heatmap_glb(self.cached.mesh, face_attributes={'_SHADE': values})))
+        accessor, shades = read_attribute(gltf, buffer, '_SHADE')
+        self.assertEqual(accessor['componentType'], 5126)
+        np.testing.assert_allclose(shades, values[self.corner_faces], rtol=1e-6)
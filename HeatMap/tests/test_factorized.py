@@ -0,0 +1,76 @@
+import shutil
+import tempfile
+from datetime import datetime
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from HeatMap import file_processor
+from HeatMap.file_processor import (
+    calculate_potentials, encode_face_values, factorized_heatmap, flat_factor, heatmap_bins, process_3d_model,
+    process_3d_model_values, render_target, write_heatmap,
+)
+from HeatMap.mesh_cache import get_cached_mesh
+from .scenes import two_boxes_obj
+
+
+@override_settings(HEATMAP_LOD_RESOLUTIONS=(16, 8, 4))
+class FactorizedHeatmapTests(SimpleTestCase):
+    timestamps = (datetime(2024, 6, 21, 9), datetime(2024, 6, 21, 12), datetime(2024, 12, 21, 15))
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(override_settings(HEATMAP_MESH_CACHE_DIR=directory))
+        self.obj_path = two_boxes_obj(directory)
+        self.cached = get_cached_mesh(self.obj_path)
+        self.enterContext(mock.patch.object(file_processor, 'output_name', return_value="heatmaps/test"))
+
+    def direct(self, timestamp, lod):
+        potentials = calculate_potentials(self.cached, 800, timestamp, 'flat')
+        return render_target(self.cached, potentials, lod)
+
+    def test_files_equal_direct_computation(self):
+        for timestamp in self.timestamps:
+            for scale in ('linear', 'quantile', 'log'):
+                for output_format in ('obj', 'glb'):
+                    with self.subTest(timestamp=timestamp, scale=scale, output_format=output_format):
+                        files = process_3d_model(
+                            800, timestamp, output_format=output_format, obj_path=self.obj_path, scale=scale
+                        )
+                        expected = write_heatmap(
+                            *self.direct(timestamp, 0), output_format, "heatmaps/test", scale=scale
+                        )
+                        self.assertEqual(files.keys(), expected.keys())
+                        for field, (name, chunks) in files.items():
+                            self.assertEqual(name, expected[field][0])
+                            self.assertEqual(b"".join(chunks), b"".join(expected[field][1]))
+
+    def test_levels_equal_direct_computation(self):
+        # Averaging k * w and scaling the average of w round differently,
+        # so only faces right at a bin edge may land in the neighbouring bin
+        for timestamp in self.timestamps:
+            for scale in ('linear', 'quantile', 'log'):
+                with self.subTest(timestamp=timestamp, scale=scale):
+                    factor = flat_factor(800, timestamp)
+                    target, weights, ranges, bins = factorized_heatmap(self.cached, 2, scale)
+                    expected_target, potentials = self.direct(timestamp, 2)
+                    self.assertIs(target, expected_target)
+                    np.testing.assert_allclose(weights * factor, potentials)
+                    expected_ranges, expected_bins = heatmap_bins(potentials, scale)
+                    np.testing.assert_allclose(ranges * factor, expected_ranges)
+                    at_edge = np.isclose(potentials[:, None], expected_ranges[None, :], rtol=1e-9).any(axis=1)
+                    np.testing.assert_array_equal(bins[~at_edge], expected_bins[~at_edge])
+
+    def test_values_equal_direct_computation(self):
+        for timestamp in self.timestamps:
+            for lod in (0, 2):
+                for value_format in ('bins', 'values'):
+                    with self.subTest(timestamp=timestamp, lod=lod, value_format=value_format):
+                        data, ranges, maximum, _ = process_3d_model_values(
+                            800, timestamp, value_format=value_format, obj_path=self.obj_path, lod=lod
+                        )
+                        _, potentials = self.direct(timestamp, lod)
+                        expected_data, expected_ranges = encode_face_values(potentials, value_format)
+                        self.assertEqual(data, expected_data)
+                        np.testing.assert_allclose(ranges, expected_ranges)
+                        self.assertAlmostEqual(maximum, potentials.max())
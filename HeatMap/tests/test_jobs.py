@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from HeatMap import mesh_cache
+from HeatMap.jobs import _heartbeat, claim_job, enqueue_job, run_job, work
+from HeatMap.models import HeatmapJob
+from SunLocation.sites import get_site
+from .scenes import two_boxes_obj
+
+
+class JobTestCase(TransactionTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(override_settings(MEDIA_ROOT=directory, HEATMAP_MESH_CACHE_DIR=f"{directory}/meshes"))
+        self.obj_path = f"{directory}/model.obj"
+        shutil.move(two_boxes_obj(directory), self.obj_path)
+
+    def params(self, **changes):
+        return {
+            "solar_irradiance": 800, "timestamp": datetime(2024, 6, 21, 10).isoformat(), "mode": 'orientation',
+            "shadows": False, "format": 'obj', "model": None, "site": get_site().describe(), **changes,
+        }
+
+
+class ClaimTests(JobTestCase):
+    def test_identical_requests_share_a_job(self):
+        job = enqueue_job("key", self.params())
+        self.assertEqual(enqueue_job("key", self.params()), job)
+        self.assertNotEqual(enqueue_job("other", self.params()), job)
+
+    def test_claims_oldest_queued_job_once(self):
+        first = enqueue_job("first", self.params())
+        enqueue_job("second", self.params())
+        claimed = claim_job()
+        self.assertEqual(claimed, first)
+        self.assertEqual(claimed.status, HeatmapJob.RUNNING)
+        self.assertIsNotNone(claimed.started_at)
+        self.assertNotEqual(claim_job(), first)
+        self.assertIsNone(claim_job())
+
+    @override_settings(HEATMAP_JOB_TIMEOUT=60)
+    def test_reclaims_job_without_heartbeat(self):
+        enqueue_job("key", self.params())
+        job = claim_job()
+        self.assertIsNone(claim_job())
+        HeatmapJob.objects.filter(id=job.id).update(heartbeat=timezone.now() - timedelta(seconds=61))
+        reclaimed = claim_job()
+        self.assertEqual(reclaimed, job)
+        self.assertGreater(reclaimed.started_at, job.started_at)
+
+    @override_settings(HEATMAP_JOB_HEARTBEAT_INTERVAL=0.02)
+    def test_heartbeat_while_running(self):
+        enqueue_job("key", self.params())
+        job = claim_job()
+        with _heartbeat(job):
+            time.sleep(0.2)
+        self.assertGreater(HeatmapJob.objects.get(id=job.id).heartbeat, job.heartbeat)
+
+
+class RunTests(JobTestCase):
+    def test_records_result(self):
+        enqueue_job("key", self.params())
+        run_job(claim_job())
+        job = HeatmapJob.objects.get(cache_key="key")
+        self.assertEqual((job.status, job.progress, job.error), (HeatmapJob.DONE, 1.0, ''))
+        self.assertEqual(job.result.cache_key, "key")
+        self.assertTrue(job.result.obj_file.read().startswith(b"mtllib"))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_reuses_stored_result(self):
+        enqueue_job("key", self.params())
+        run_job(claim_job())
+        enqueue_job("key", self.params())
+        run_job(claim_job())
+        first, second = HeatmapJob.objects.filter(cache_key="key").order_by('created_at')
+        self.assertEqual(second.result, first.result)
+
+    def test_records_error(self):
+        enqueue_job("key", self.params(mode='sideways'))
+        run_job(claim_job())
+        job = HeatmapJob.objects.get(cache_key="key")
+        self.assertEqual(job.status, HeatmapJob.FAILED)
+        self.assertIn("Unknown heatmap mode 'sideways'", job.error)
+
+    def test_leaves_reclaimed_job_alone(self):
+        enqueue_job("key", self.params())
+        job = claim_job()
+        # Another worker reclaims the job while this one is still running it
+        restarted = job.started_at + timedelta(seconds=1)
+        HeatmapJob.objects.filter(id=job.id).update(started_at=restarted)
+        run_job(job)
+        stored = HeatmapJob.objects.get(id=job.id)
+        self.assertEqual((stored.status, stored.started_at, stored.result), (HeatmapJob.RUNNING, restarted, None))
+
+
+class HeatmapRequestTests(JobTestCase):
+    def post(self, **changes):
+        data = {
+            "solar_irradiance": 800, "datetime": "2024-06-21 10:00:00", "mode": 'orientation', "format": 'obj',
+            **changes,
+        }
+        return self.client.post(reverse('process-3d-model'), data)
+
+    def test_queued_without_parsing_the_model(self):
+        with mock.patch.object(mesh_cache, 'load_obj_mesh', side_effect=AssertionError("parsed")):
+            response = self.post()
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertFalse(os.path.exists(f"{os.path.dirname(self.obj_path)}/meshes"))
+
+        work(once=True)
+        response = self.post()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["cached"])
+
+    def test_replaced_model_gets_new_results(self):
+        self.post()
+        work(once=True)
+        with open(self.obj_path, 'a') as file:
+            file.write("# edited\n")
+        os.utime(self.obj_path, ns=(0, 0))
+        self.assertEqual(self.post().status_code, 202)
+
+    def test_empty_region_of_parsed_model_refused(self):
+        empty = "20,20,30,30"
+        with mock.patch.object(mesh_cache, 'load_obj_mesh', side_effect=AssertionError("parsed")):
+            self.assertEqual(self.post(bbox=empty).status_code, 202)
+        work(once=True)
+        self.assertIn("contains no objects", HeatmapJob.objects.get().error)
+        response = self.post(bbox=empty)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("contains no objects", response.json()["error"])
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from HeatMap.mesh_cache import get_cached_mesh, get_lod, open_sidecar, submesh
+from .scenes import two_boxes_obj
+
+
+@override_settings(HEATMAP_LOD_RESOLUTIONS=(16, 8, 4))
+class LodTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(override_settings(HEATMAP_MESH_CACHE_DIR=directory))
+        self.cached = get_cached_mesh(two_boxes_obj(directory, cells=6))
+
+    def test_face_counts_fall_with_level(self):
+        counts = [get_lod(self.cached, level).cached.mesh.face_count for level in (1, 2, 3)]
+        self.assertGreater(counts[2], 0)
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        self.assertLess(counts[2], counts[0])
+        # Even as triangles, the coarsest level has fewer faces than the polygons it replaces
+        self.assertLess(counts[2], self.cached.mesh.face_count)
+
+    def test_aggregate_is_area_weighted_mean(self):
+        level = get_lod(self.cached, 2)
+        coarse_count = level.cached.mesh.face_count
+        np.testing.assert_allclose(level.aggregate(np.full(self.cached.mesh.face_count, 3.5)), 3.5)
+        values = np.random.default_rng(1).uniform(0, 100, self.cached.mesh.face_count)
+        means = level.aggregate(values)
+        self.assertEqual(len(means), coarse_count)
+        # Every coarse face's mean lies within its source faces' values and
+        # the area-weighted totals are preserved
+        low = np.full(coarse_count, np.inf)
+        high = np.full(coarse_count, -np.inf)
+        np.minimum.at(low, level.targets, values[level.source_faces])
+        np.maximum.at(high, level.targets, values[level.source_faces])
+        self.assertTrue(((means >= low - 1e-9) & (means <= high + 1e-9)).all())
+        totals = np.bincount(level.targets, level.weights, coarse_count)
+        np.testing.assert_allclose((means * totals).sum(), (values[level.source_faces] * level.weights).sum())
+
+    def test_levels_stored_in_sidecar(self):
+        level = get_lod(self.cached, 1)
+        lod_dir = os.path.join(self.cached.sidecar_dir, 'lod', '16')
+        self.assertTrue(os.path.isdir(lod_dir))
+        reopened = get_lod(open_sidecar(self.cached.sidecar_dir), 1)
+        np.testing.assert_array_equal(reopened.cached.mesh.face_vertices, level.cached.mesh.face_vertices)
+        np.testing.assert_array_equal(reopened.targets, level.targets)
+
+
+@override_settings(HEATMAP_LOD_RESOLUTIONS=(16, 8, 4))
+class RegionLodTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(override_settings(HEATMAP_MESH_CACHE_DIR=directory))
+        self.cached = get_cached_mesh(two_boxes_obj(directory, cells=6))
+        self.region = submesh(self.cached, [0])
+
+    def test_cut_from_whole_model_level(self):
+        for level in (1, 2, 3):
+            with self.subTest(level=level):
+                whole = get_lod(self.cached, level).cached
+                part = get_lod(self.region, level).cached
+                self.assertIs(part.parent, whole)
+                self.assertLess(part.mesh.face_count, whole.mesh.face_count)
+                np.testing.assert_array_equal(
+                    part.mesh.vertices[part.mesh.face_vertices],
+                    whole.mesh.vertices[np.concatenate([
+                        whole.mesh.face_vertices[whole.mesh.face_offsets[face]:whole.mesh.face_offsets[face + 1]]
+                        for face in part.parent_faces
+                    ])],
+                )
+
+    def test_aggregates_region_values(self):
+        values = np.random.default_rng(3).uniform(0, 10, self.cached.mesh.face_count)
+        whole = get_lod(self.cached, 2)
+        part = get_lod(self.region, 2)
+        region_values = part.aggregate(values[self.region.parent_faces])
+        # Coarse faces fed only by the region's faces agree with the whole model
+        fed_from_outside = np.unique(
+            whole.targets[~np.isin(whole.source_faces, self.region.parent_faces)]
+        )
+        inside = ~np.isin(part.cached.parent_faces, fed_from_outside)
+        self.assertTrue(inside.any())
+        np.testing.assert_allclose(
+            region_values[inside], whole.aggregate(values)[part.cached.parent_faces[inside]]
+        )
+        self.assertIs(get_lod(self.region, 2), part)
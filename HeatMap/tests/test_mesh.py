@@ -0,0 +1,172 @@
+import os
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase
+from HeatMap.file_processor import parse_obj_file
+from HeatMap.mesh import load_obj_mesh
+
+# Positive indices only, which the old line parser understood: faces
+# before the first object, 'a//c' and bare 'a' corners, and vertices and
+# texture coordinates with optional w or colour components
+LEGACY_OBJ = """\
+# exported model
+mtllib model.mtl
+v 0 0 0
+v 1 0 0 1.0
+v 1 1 0 0.5 0.25 0.125
+v 0 1 0
+vn 0 0 1
+vt 0 0
+vt 1 0 0
+f 1 2 3
+f 1//1 3//1 4//1
+o first
+v 0 0 1
+v 1 0 1
+v 1 1 1
+usemtl color_0
+f 5/1 6/2 7/1
+"""
+
+# Adds relative indices, faces mixing corners with and without
+# references, an object without faces and records the loader skips
+FULL_OBJ = LEGACY_OBJ + """\
+vt 1 1
+f -3/-3 -2/-2 -1/-1
+o empty
+o second
+g walls
+s off
+f 1/1/1 -5/2/1 7/-1/-1 4
+f 5//1 6//1 7//1
+"""
+
+
+def legacy_parse_obj(file_path):
+    # The line parser used before load_obj_mesh
+    vertices = []
+    faces = []
+    with open(file_path, 'r') as file:
+        for line in file:
+            if line.startswith('v '):
+                vertices.append(list(map(float, line.split()[1:4])))
+            elif line.startswith('f '):
+                faces.append([int(i.split('/')[0]) - 1 for i in line.split()[1:]])
+    return np.array(vertices), faces
+
+
+def reference_parse_obj(file_path):
+    """
+    The old line parser extended to texture and normal references (-1 when
+    missing), indices relative to the records read so far, and objects.
+    """
+    counts = {'v': 0, 'vt': 0, 'vn': 0}
+    rows = {'v': [], 'vt': [], 'vn': []}
+    widths = {'v': 3, 'vt': 2, 'vn': 3}
+    corners, face_offsets = [], [0]
+    object_offsets, object_names = [], []
+    with open(file_path, 'r') as file:
+        for line in file:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] in rows:
+                rows[parts[0]].append([float(value) for value in parts[1:widths[parts[0]] + 1]])
+                counts[parts[0]] += 1
+            elif parts[0] == 'o':
+                object_offsets.append(len(face_offsets) - 1)
+                object_names.append(line[1:].strip())
+            elif parts[0] == 'f':
+                for token in parts[1:]:
+                    references = (token.split('/') + ['', ''])[:3]
+                    corner = []
+                    for reference, kind in zip(references, ('v', 'vt', 'vn')):
+                        index = int(reference) if reference else 0
+                        corner.append(-1 if not index else index - 1 if index > 0 else counts[kind] + index)
+                    corners.append(corner)
+                face_offsets.append(len(corners))
+    if not object_offsets or object_offsets[0] > 0:
+        object_offsets.insert(0, 0)
+        object_names.insert(0, '')
+    object_offsets.append(len(face_offsets) - 1)
+    return {
+        "vertices": np.array(rows['v']),
+        "texcoords": np.array(rows['vt']).reshape(-1, 2),
+        "normals": np.array(rows['vn']).reshape(-1, 3),
+        "face_offsets": np.array(face_offsets),
+        "corners": np.array(corners).reshape(-1, 3),
+        "object_offsets": np.array(object_offsets),
+        "object_names": object_names,
+    }
+
+
+class ObjLoaderTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_obj(self, text, name='model.obj'):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as file:
+            file.write(text)
+        return path
+
+    def test_matches_legacy_parser(self):
+        path = self.write_obj(LEGACY_OBJ)
+        vertices, faces = parse_obj_file(path)
+        legacy_vertices, legacy_faces = legacy_parse_obj(path)
+        np.testing.assert_array_equal(vertices, legacy_vertices)
+        self.assertEqual([list(face) for face in faces], legacy_faces)
+
+    def test_matches_reference_parser(self):
+        path = self.write_obj(FULL_OBJ)
+        mesh = load_obj_mesh(path)
+        expected = reference_parse_obj(path)
+        np.testing.assert_array_equal(mesh.vertices, expected["vertices"])
+        np.testing.assert_array_equal(mesh.texcoords, expected["texcoords"])
+        np.testing.assert_array_equal(mesh.normals, expected["normals"])
+        np.testing.assert_array_equal(mesh.face_offsets, expected["face_offsets"])
+        np.testing.assert_array_equal(mesh.face_vertices, expected["corners"][:, 0])
+        np.testing.assert_array_equal(mesh.face_texcoords, expected["corners"][:, 1])
+        np.testing.assert_array_equal(mesh.face_normals, expected["corners"][:, 2])
+        np.testing.assert_array_equal(mesh.object_offsets, expected["object_offsets"])
+        self.assertEqual(list(mesh.object_names), expected["object_names"])
+
+    def test_resolves_relative_and_missing_references(self):
+        mesh = load_obj_mesh(self.write_obj(FULL_OBJ))
+        faces = mesh.faces()
+        # 'f -3/-3 -2/-2 -1/-1' after 7 vertices and 3 texture coordinates
+        np.testing.assert_array_equal(faces[3], [4, 5, 6])
+        np.testing.assert_array_equal(mesh.face_texcoords[9:12], [0, 1, 2])
+        # 'f 1/1/1 -5/2/1 7/-1/-1 4': relative 'vt -1' and 'vn -1', and a bare corner
+        np.testing.assert_array_equal(faces[4], [0, 2, 6, 3])
+        np.testing.assert_array_equal(mesh.face_texcoords[12:16], [0, 1, 2, -1])
+        np.testing.assert_array_equal(mesh.face_normals[12:16], [0, 0, 0, -1])
+        # 'a//c' corners have no texture coordinate
+        np.testing.assert_array_equal(mesh.face_texcoords[3:6], [-1, -1, -1])
+        np.testing.assert_array_equal(mesh.face_normals[3:6], [0, 0, 0])
+
+    def test_drops_optional_components(self):
+        mesh = load_obj_mesh(self.write_obj(FULL_OBJ))
+        np.testing.assert_array_equal(mesh.vertices[1:3], [[1, 0, 0], [1, 1, 0]])
+        np.testing.assert_array_equal(mesh.texcoords[1], [1, 0])
+
+    def test_objects(self):
+        mesh = load_obj_mesh(self.write_obj(FULL_OBJ))
+        # Faces before the first 'o' form an unnamed object; 'empty' has none
+        self.assertEqual(list(mesh.object_names), ['', 'first', 'empty', 'second'])
+        np.testing.assert_array_equal(mesh.object_offsets, [0, 2, 4, 4, 6])
+
+        mesh = load_obj_mesh(self.write_obj("o only\nv 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n", 'object.obj'))
+        self.assertEqual(list(mesh.object_names), ['only'])
+        np.testing.assert_array_equal(mesh.object_offsets, [0, 1])
+
+    def test_without_references(self):
+        mesh = load_obj_mesh(self.write_obj("v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3", 'plain.obj'))
+        self.assertIsNone(mesh.face_texcoords)
+        self.assertIsNone(mesh.face_normals)
+        np.testing.assert_array_equal(mesh.face_vertices, [0, 1, 2])
+
+    def test_rejects_malformed_faces(self):
+        with self.assertRaises(ValueError):
+            load_obj_mesh(self.write_obj("v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1/1/1/1 2 3\n", 'bad.obj'))
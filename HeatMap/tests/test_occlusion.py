@@ -0,0 +1,73 @@
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase
+from HeatMap.geometry import face_geometry, fan_triangles
+from HeatMap.mesh import load_obj_mesh
+from HeatMap.occlusion import build_bvh, shaded_faces
+from .scenes import two_boxes_obj
+
+
+def brute_force_shaded(vertices, face_offsets, face_vertices, centroids, normals, sun_vector):
+    # Test every face's shadow ray against every triangle of every other face
+    corners, triangle_faces = fan_triangles(face_offsets)
+    a, b, c = (vertices[face_vertices[corners[:, i]]] for i in range(3))
+    edge1, edge2 = b - a, c - a
+    scale = float(np.ptp(vertices, axis=0).max())
+    direction = sun_vector / np.linalg.norm(sun_vector)
+    shaded = np.zeros(len(centroids), dtype=bool)
+    for face, (centroid, normal) in enumerate(zip(centroids, normals)):
+        origin = centroid + normal * (1e-6 * scale)
+        for triangle in np.flatnonzero(triangle_faces != face):
+            p = np.cross(direction, edge2[triangle])
+            determinant = edge1[triangle] @ p
+            if abs(determinant) < 1e-12:
+                continue
+            s = origin - a[triangle]
+            u = (s @ p) / determinant
+            q = np.cross(s, edge1[triangle])
+            v = (q @ direction) / determinant
+            t = (edge2[triangle] @ q) / determinant
+            if u >= 0 and v >= 0 and u + v <= 1 and t > 1e-7 * scale:
+                shaded[face] = True
+                break
+    return shaded
+
+
+class ShadowTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.mesh = load_obj_mesh(two_boxes_obj(directory.name))
+        _, self.normals, self.centroids = face_geometry(
+            self.mesh.vertices, self.mesh.face_offsets, self.mesh.face_vertices
+        )
+
+    def test_boxes_face_outwards(self):
+        centre = np.array([2, 1, 1.5])
+        low_box = np.arange(54)
+        outward = np.einsum('ij,ij->i', self.normals[low_box], self.centroids[low_box] - centre)
+        self.assertTrue((outward > 0).all())
+
+    def test_matches_brute_force(self):
+        mesh = self.mesh
+        bvh = build_bvh(mesh.vertices, mesh.face_offsets, mesh.face_vertices, leaf_size=2)
+        faces = np.arange(mesh.face_count)
+        for sun_vector in ([0.71, 0.45, -0.12], [-0.3, 0.8, 0.52], [0.9, 0.2, 0.37], [0.05, 0.99, 0.08]):
+            sun_vector = np.array(sun_vector)
+            with self.subTest(sun_vector=sun_vector):
+                shaded = shaded_faces(bvh, self.centroids, self.normals, faces, sun_vector, batch_size=16)
+                expected = brute_force_shaded(
+                    mesh.vertices, mesh.face_offsets, mesh.face_vertices, self.centroids, self.normals, sun_vector
+                )
+                np.testing.assert_array_equal(shaded, expected)
+
+    def test_tall_box_shades_low_box(self):
+        mesh = self.mesh
+        bvh = build_bvh(mesh.vertices, mesh.face_offsets, mesh.face_vertices)
+        # Sun low in the +x direction, behind the tall box as seen from the low one
+        shaded = shaded_faces(
+            bvh, self.centroids, self.normals, np.arange(mesh.face_count), np.array([0.9, 0.2, 0.37])
+        )
+        low_box_east_side = np.arange(9)
+        self.assertTrue(shaded[low_box_east_side].any())
+        self.assertFalse(shaded[low_box_east_side].all())
@@ -0,0 +1,56 @@
+import shutil
+import tempfile
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase, override_settings
+from HeatMap import parallel
+from HeatMap.file_processor import apply_shadows, calculate_incidence, integrate_potentials
+from HeatMap.mesh_cache import get_cached_mesh
+from SunLocation.sites import get_site
+from .scenes import two_boxes_obj
+
+
+def shutdown_pool():
+    if parallel._executor is not None:
+        parallel._executor.shutdown()
+        parallel._executor = None
+
+
+class ParallelTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(override_settings(
+            HEATMAP_MESH_CACHE_DIR=directory, HEATMAP_PARALLEL_WORKERS=2, HEATMAP_PARALLEL_MIN_FACES=1,
+            HEATMAP_PARALLEL_CHUNK_FACES=8, HEATMAP_PARALLEL_CHUNK_TIMESTEPS=4,
+        ))
+        shutdown_pool()
+        self.addCleanup(shutdown_pool)
+        self.cached = get_cached_mesh(two_boxes_obj(directory))
+
+    def serial(self, function, *args, **kwargs):
+        with override_settings(HEATMAP_PARALLEL_WORKERS=1):
+            return function(*args, **kwargs)
+
+    def test_shadows_after_workers_mapped_the_mesh(self):
+        # The orientation series makes every worker map the mesh before its
+        # BVH exists; shadows traced by those same workers must still work
+        times = pd.date_range(datetime(2024, 6, 21, 5), periods=16, freq='h')
+        series = integrate_potentials(self.cached, 800, times, 'orientation')
+        np.testing.assert_allclose(series, self.serial(integrate_potentials, self.cached, 800, times, 'orientation'))
+
+        sun_vector = np.array([0.9, 0.2, 0.37]) / np.linalg.norm([0.9, 0.2, 0.37])
+        incidence = calculate_incidence(np.asarray(self.cached.unit_normals), sun_vector)
+        shadowed = apply_shadows(self.cached, incidence.copy(), sun_vector)
+        np.testing.assert_array_equal(shadowed, self.serial(apply_shadows, self.cached, incidence.copy(), sun_vector))
+        self.assertLess(np.count_nonzero(shadowed), np.count_nonzero(incidence))
+
+    def test_shadowed_series_matches_serial(self):
+        times = pd.date_range(datetime(2024, 6, 21, 5), periods=16, freq='h')
+        for mode in ('flat', 'orientation'):
+            with self.subTest(mode=mode):
+                np.testing.assert_allclose(
+                    integrate_potentials(self.cached, 800, times, mode, shadows=True, site=get_site()),
+                    self.serial(integrate_potentials, self.cached, 800, times, mode, shadows=True, site=get_site()),
+                )
@@ -0,0 +1,118 @@
+import shutil
+import tempfile
+from datetime import datetime
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase, override_settings
+from HeatMap.file_processor import (
+    building_summary, calculate_potentials, integrate_potentials, object_totals, process_building_potentials,
+    process_buildings, process_buildings_series,
+)
+from HeatMap.mesh_cache import get_cached_mesh
+from SunLocation.sites import get_site
+from .scenes import two_boxes_obj
+
+
+class BoxesTestCase(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(override_settings(HEATMAP_MESH_CACHE_DIR=directory))
+        self.obj_path = two_boxes_obj(directory)
+        self.cached = get_cached_mesh(self.obj_path)
+        self.site = get_site()
+
+
+class PotentialTests(BoxesTestCase):
+    def test_nothing_at_night(self):
+        midnight = datetime(2024, 6, 21, 0)
+        self.assertLess(self.site.sun_vectors([midnight])[0][1], 0)
+        for mode in ('flat', 'orientation'):
+            for shadows in (False, True):
+                with self.subTest(mode=mode, shadows=shadows):
+                    potentials = calculate_potentials(self.cached, 800, midnight, mode, shadows, self.site)
+                    self.assertFalse(potentials.any())
+
+    def test_series_is_sum_of_timestamps(self):
+        # At 7:00 on this day the crude flat cos θ is positive with the sun
+        # still below the horizon
+        times = pd.date_range(datetime(2024, 1, 21), periods=24, freq='h')
+        for mode in ('flat', 'orientation'):
+            for shadows in (False, True):
+                with self.subTest(mode=mode, shadows=shadows):
+                    energy, _ = integrate_potentials(self.cached, 800, times, mode, shadows, site=self.site)
+                    single = sum(
+                        calculate_potentials(self.cached, 800, time, mode, shadows, self.site) for time in times
+                    )
+                    self.assertTrue(single.any())
+                    np.testing.assert_allclose(energy, single)
+
+
+class BuildingSummaryTests(BoxesTestCase):
+    def test_object_totals(self):
+        # Objects 1 and 3 have no faces
+        mesh = SimpleNamespace(object_offsets=np.array([0, 2, 2, 5, 5]))
+        totals = object_totals(SimpleNamespace(mesh=mesh), np.array([1.0, 2, 3, 4, 5]))
+        np.testing.assert_array_equal(totals, [3, 0, 12, 0])
+
+    def test_summary_ranks_buildings(self):
+        timestamp = datetime(2024, 6, 21, 9)
+        summary = process_buildings(800, timestamp, 'orientation', obj_path=self.obj_path, site=self.site)
+        potentials = calculate_potentials(self.cached, 800, timestamp, 'orientation', site=self.site)
+        offsets = self.cached.mesh.object_offsets
+        by_name = {
+            name: (offsets[i + 1] - offsets[i], potentials[offsets[i]:offsets[i + 1]].sum())
+            for i, name in enumerate(self.cached.mesh.object_names)
+        }
+        np.testing.assert_array_equal(summary["rank"], [1, 2])
+        self.assertGreaterEqual(summary["total"][0], summary["total"][1])
+        for row, name in enumerate(summary["name"]):
+            faces, total = by_name[name]
+            self.assertEqual(summary["faces"][row], faces)
+            self.assertAlmostEqual(summary["total"][row], total)
+            self.assertAlmostEqual(summary["mean"][row], total / faces)
+            self.assertAlmostEqual(summary["per_m2"][row], total / summary["area"][row])
+        np.testing.assert_allclose(summary["area"].sum(), np.sum(self.cached.areas))
+
+    def test_series_in_kwh(self):
+        start, end = datetime(2024, 6, 21, 6), datetime(2024, 6, 21, 18)
+        summary = process_buildings_series(
+            800, start, end, obj_path=self.obj_path, site=self.site, bbox=(-1, -1, 4.5, 3.5)
+        )
+        energy, _ = integrate_potentials(self.cached, 800, pd.date_range(start, end, freq='h'), site=self.site)
+        self.assertEqual(list(summary["name"]), ["low"])
+        self.assertAlmostEqual(summary["total"][0], energy[:54].sum() / 1000)
+
+    def test_empty_objects_total_nothing(self):
+        summary = building_summary(
+            SimpleNamespace(
+                mesh=SimpleNamespace(object_offsets=np.array([0, 1, 1]), object_names=np.array(["a", "empty"])),
+                areas=np.array([2.0]),
+            ),
+            np.array([5.0]),
+        )
+        self.assertEqual(list(summary["name"]), ["a", "empty"])
+        np.testing.assert_array_equal(summary["total"], [5, 0])
+        np.testing.assert_array_equal(summary["mean"], [5, 0])
+        np.testing.assert_array_equal(summary["per_m2"], [2.5, 0])
+
+
+class BuildingPotentialTests(BoxesTestCase):
+    def test_nothing_at_night(self):
+        for shadows in (False, True):
+            with self.subTest(shadows=shadows):
+                buildings = process_building_potentials(
+                    800, datetime(2024, 6, 21, 0), shadows=shadows, obj_path=self.obj_path, site=self.site
+                )
+                self.assertEqual(sorted(buildings["name"]), ["low", "tall"])
+                self.assertFalse(buildings["rooftop"].any())
+                self.assertFalse(buildings["bipv"].any())
+
+    def test_roofs_and_walls_at_noon(self):
+        buildings = process_building_potentials(
+            800, datetime(2024, 6, 21, 12), obj_path=self.obj_path, site=self.site
+        )
+        self.assertTrue((buildings["rooftop"] > 0).all())
+        self.assertTrue((buildings["bipv"] > 0).all())
+        np.testing.assert_allclose(buildings["roof_area"][list(buildings["name"]).index("low")], 12)
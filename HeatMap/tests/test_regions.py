@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from HeatMap import file_processor
+from HeatMap.file_processor import calculate_potentials, heatmap_bins, process_3d_model, process_3d_model_series
+from HeatMap.mesh_cache import get_cached_mesh
+from .scenes import two_boxes_obj
+
+LOW_BOX = (-1, -1, 4.5, 3.5)
+TALL_BOX = (5, 0, 8, 3)
+
+
+class RegionScaleTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(override_settings(HEATMAP_MESH_CACHE_DIR=directory))
+        self.obj_path = two_boxes_obj(directory)
+        self.cached = get_cached_mesh(self.obj_path)
+
+    def whole_model_runs(self, function, name, *args, **kwargs):
+        # Calls of ``name`` on the whole model while ``function`` runs
+        original = getattr(file_processor, name)
+        with mock.patch.object(file_processor, name, wraps=original) as wrapped:
+            function(*args, **kwargs)
+        return sum(call.args[0] is self.cached for call in wrapped.call_args_list)
+
+    def test_scale_computed_once_per_inputs(self):
+        timestamp = datetime(2024, 6, 21, 9)
+        runs = [
+            self.whole_model_runs(
+                process_3d_model, 'calculate_potentials', 800, timestamp, 'orientation', obj_path=self.obj_path,
+                bbox=bbox,
+            )
+            for bbox in (LOW_BOX, TALL_BOX, LOW_BOX)
+        ]
+        self.assertEqual(runs, [1, 0, 0])
+        self.assertEqual(len(os.listdir(os.path.join(self.cached.sidecar_dir, 'scales'))), 1)
+        self.assertEqual(self.whole_model_runs(
+            process_3d_model, 'calculate_potentials', 800, timestamp.replace(hour=10), 'orientation',
+            obj_path=self.obj_path, bbox=LOW_BOX,
+        ), 1)
+
+    def test_series_scale_computed_once_per_inputs(self):
+        arguments = (800, datetime(2024, 6, 21, 6), datetime(2024, 6, 21, 18), '1h', 'orientation')
+        runs = [
+            self.whole_model_runs(
+                process_3d_model_series, 'integrate_potentials', *arguments, obj_path=self.obj_path, bbox=bbox
+            )
+            for bbox in (LOW_BOX, TALL_BOX)
+        ]
+        self.assertEqual(runs, [1, 0])
+
+    def test_region_binned_on_whole_model_scale(self):
+        timestamp = datetime(2024, 6, 21, 9)
+        files = process_3d_model(800, timestamp, 'orientation', obj_path=self.obj_path, bbox=LOW_BOX)
+        obj = b"".join(files["obj_file"][1]).decode()
+        ranges, bins = heatmap_bins(calculate_potentials(self.cached, 800, timestamp, 'orientation'))
+        low_faces = np.arange(54)
+        used = {line.split()[1] for line in obj.splitlines() if line.startswith("usemtl color_")}
+        self.assertEqual(used, {f"color_{i}" for i in np.unique(bins[low_faces])})
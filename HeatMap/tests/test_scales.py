@@ -0,0 +1,33 @@
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from HeatMap.file_processor import COLORS, heatmap_bins, streamed_quantiles
+
+QUANTILES = np.arange(1, len(COLORS)) / len(COLORS)
+
+
+class StreamedQuantileTests(SimpleTestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(7)
+
+    def test_single_outlier(self):
+        values = np.append(self.rng.uniform(0, 100, 300_000), 1e8)
+        np.testing.assert_allclose(streamed_quantiles(values, QUANTILES), np.quantile(values, QUANTILES))
+
+    def test_small_chunks_and_bins(self):
+        # Few bins and chunks force several narrowing passes
+        for values in (
+            np.append(self.rng.uniform(0, 100, 5000), [1e8, -1e8]),
+            self.rng.lognormal(0, 6, 5001),
+            np.round(self.rng.uniform(0, 3, 5000)),
+            np.full(100, 2.5),
+        ):
+            with self.subTest(values=values[:3]):
+                np.testing.assert_allclose(
+                    streamed_quantiles(values, QUANTILES, bins=16, chunk=64), np.quantile(values, QUANTILES)
+                )
+
+    @override_settings(HEATMAP_QUANTILE_EXACT_MAX_FACES=1000)
+    def test_quantile_scale_fills_bins_evenly(self):
+        values = np.append(self.rng.uniform(0, 100, 149_999), 1e8)
+        _, binned = heatmap_bins(values, 'quantile')
+        np.testing.assert_array_equal(np.bincount(binned, minlength=len(COLORS)), len(values) // len(COLORS))
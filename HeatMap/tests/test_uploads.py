@@ -0,0 +1,75 @@
+import shutil
+import tempfile
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from HeatMap.jobs import work
+from HeatMap.mesh_cache import get_cached_mesh
+from HeatMap.models import HeatmapJob, UploadedModel
+from HeatMap.uploads import model_path
+from .scenes import two_boxes_obj
+
+
+class ModelUploadTests(TransactionTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(override_settings(
+            HEATMAP_UPLOAD_DIR=f"{directory}/uploads", HEATMAP_MESH_CACHE_DIR=f"{directory}/meshes",
+            HEATMAP_LOD_RESOLUTIONS=(16, 8, 4),
+        ))
+        with open(two_boxes_obj(directory), 'rb') as file:
+            self.content = file.read()
+
+    def start(self, size=None):
+        response = self.client.post(reverse('heatmap-models'), {"name": "boxes", "size": size or len(self.content)})
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def put(self, upload, start, end):
+        return self.client.put(
+            upload["upload_url"], self.content[start:end], content_type='application/octet-stream',
+            headers={"Content-Range": f"bytes {start}-{end - 1}/{len(self.content)}"},
+        )
+
+    def test_chunks_then_ingest(self):
+        upload = self.start()
+        middle = len(self.content) // 2
+        response = self.put(upload, 0, middle)
+        self.assertEqual(response.json()["received"], middle)
+        # A repeated chunk is ignored, one past the received bytes refused
+        self.assertEqual(self.put(upload, 0, middle).json()["received"], middle)
+        self.assertEqual(self.put(upload, middle + 1, len(self.content)).status_code, 409)
+        self.assertEqual(self.client.get(upload["upload_url"]).json()["received"], middle)
+
+        response = self.put(upload, middle, len(self.content))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], UploadedModel.PROCESSING)
+        with self.assertRaisesMessage(ValueError, "is not ready"):
+            model_path(upload["model_id"])
+
+        work(once=True)
+        self.assertEqual(HeatmapJob.objects.get(id=response.json()["job_id"]).status, HeatmapJob.DONE)
+        status = self.client.get(upload["upload_url"]).json()
+        self.assertEqual(status["status"], UploadedModel.READY)
+        path = model_path(upload["model_id"])
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), self.content)
+        cached = get_cached_mesh(path)
+        self.assertEqual(status["face_count"], cached.mesh.face_count)
+        self.assertEqual(set(cached.lods), {16, 8, 4})
+        self.assertIsNotNone(cached.object_index)
+
+    def test_rejects_chunk_past_declared_size(self):
+        upload = self.start(size=10)
+        response = self.put(upload, 0, 20)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("past the declared upload size", response.json()["error"])
+
+    def test_failed_ingest_is_reported(self):
+        self.content = b"v 0 0 0\nf 1 2 oops\n"
+        upload = self.start()
+        self.put(upload, 0, len(self.content))
+        work(once=True)
+        status = self.client.get(upload["upload_url"]).json()
+        self.assertEqual(status["status"], UploadedModel.FAILED)
+        self.assertTrue(status["error"])
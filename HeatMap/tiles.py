@@ -0,0 +1,111 @@
+# tiles.py
+
+import math
+from dataclasses import dataclass, fields
+import numpy as np
+from .geometry import segment_reduce
+
+
+@dataclass
+class ObjectIndex:
+    """
+    Spatial index over the objects (buildings) of a mesh: the bounding box
+    of every object, and a uniform grid of ground-plane (x, z) tiles with
+    each object filed under the tile holding the centre of its box. Tile
+    ``t = row * columns + column`` owns ``tile_objects[tile_offsets[t]:tile_offsets[t + 1]]``.
+    """
+    object_min: np.ndarray
+    object_max: np.ndarray
+    tile_offsets: np.ndarray
+    tile_objects: np.ndarray
+    grid_origin: np.ndarray
+    grid_shape: np.ndarray
+    tile_size: np.ndarray
+
+    def arrays(self):
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+    @property
+    def columns(self):
+        return int(self.grid_shape[0])
+
+    @property
+    def rows(self):
+        return int(self.grid_shape[1])
+
+    def objects_in_tile(self, column, row):
+        if not (0 <= column < self.columns and 0 <= row < self.rows):
+            raise ValueError(f"Tile {column}_{row} is outside the {self.columns}x{self.rows} grid.")
+        tile = row * self.columns + column
+        return np.asarray(self.tile_objects[self.tile_offsets[tile]:self.tile_offsets[tile + 1]])
+
+    def objects_in_bbox(self, min_x, min_z, max_x, max_z):
+        """Objects whose bounding box intersects the ground-plane box."""
+        object_min, object_max = np.asarray(self.object_min), np.asarray(self.object_max)
+        return np.flatnonzero(
+            (object_max[:, 0] >= min_x) & (object_min[:, 0] <= max_x)
+            & (object_max[:, 2] >= min_z) & (object_min[:, 2] <= max_z)
+        )
+
+
+def build_object_index(mesh, grid=16):
+    """
+    Index the objects of ``mesh`` on a grid of ``grid`` tiles along the
+    longer side of its ground-plane footprint.
+    """
+    object_count = mesh.object_count
+    object_min = np.full((object_count, 3), np.inf)
+    object_max = np.full((object_count, 3), -np.inf)
+
+    # Corners of an object's faces are contiguous, so boxes are segment reductions
+    corner_offsets = np.asarray(mesh.face_offsets)[np.asarray(mesh.object_offsets)]
+    counts = np.diff(corner_offsets)
+    filled = counts > 0
+    if filled.any():
+        corners = np.asarray(mesh.vertices)[mesh.face_vertices]
+        object_min[filled] = segment_reduce(np.minimum, corners, corner_offsets[:-1][filled], counts[filled])
+        object_max[filled] = segment_reduce(np.maximum, corners, corner_offsets[:-1][filled], counts[filled])
+
+    ground = [0, 2]
+    if filled.any():
+        origin = object_min[filled][:, ground].min(axis=0)
+        extent = object_max[filled][:, ground].max(axis=0) - origin
+    else:
+        origin, extent = np.zeros(2), np.zeros(2)
+    tile_size = max(float(extent.max()) / grid, 1e-9)
+    shape = np.array([max(1, math.ceil(extent[0] / tile_size)), max(1, math.ceil(extent[1] / tile_size))])
+
+    centres = (object_min[filled][:, ground] + object_max[filled][:, ground]) / 2
+    cells = np.clip(np.floor((centres - origin) / tile_size).astype(np.int64), 0, shape - 1)
+    tiles = cells[:, 1] * shape[0] + cells[:, 0]
+    order = np.argsort(tiles, kind='stable')
+    tile_offsets = np.concatenate(([0], np.cumsum(np.bincount(tiles, minlength=int(shape.prod())))))
+    return ObjectIndex(
+        object_min=object_min,
+        object_max=object_max,
+        tile_offsets=tile_offsets,
+        tile_objects=np.flatnonzero(filled)[order],
+        grid_origin=origin,
+        grid_shape=shape,
+        tile_size=np.array([tile_size]),
+    )
+
+
+def parse_tile(tile):
+    # Tile ids are '<column>_<row>'
+    try:
+        column, row = (int(part) for part in tile.split('_'))
+    except ValueError:
+        raise ValueError(f"Malformed tile id '{tile}'. Use '<column>_<row>'.")
+    return column, row
+
+
+def parse_bbox(bbox):
+    # Ground-plane box 'min_x,min_z,max_x,max_z' in model coordinates
+    try:
+        min_x, min_z, max_x, max_z = (float(part) for part in bbox.split(','))
+    except ValueError:
+        raise ValueError(f"Malformed bbox '{bbox}'. Use 'min_x,min_z,max_x,max_z'.")
+    if min_x > max_x or min_z > max_z:
+        raise ValueError("The bbox minimum must not exceed its maximum.")
+    return min_x, min_z, max_x, max_z
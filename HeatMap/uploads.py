@@ -0,0 +1,123 @@
+# uploads.py
+
+import os
+import re
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from .file_processor import default_model_path
+from .mesh_cache import get_cached_mesh, get_lod, get_object_index
+from .models import UploadedModel
+
+# Bytes copied from the request body per read
+COPY_BUFFER_SIZE = 1 << 20
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+def upload_paths(upload):
+    # Where the upload is assembled, and where it lives once complete
+    stem = os.path.join(str(settings.HEATMAP_UPLOAD_DIR), str(upload.id))
+    return f"{stem}.part", f"{stem}.obj"
+
+
+def get_upload(model_id):
+    try:
+        return UploadedModel.objects.get(id=model_id)
+    except (UploadedModel.DoesNotExist, ValidationError):
+        raise ValueError(f"Unknown model '{model_id}'.")
+
+
+def model_path(model_id=None):
+    """OBJ path of an uploaded model that finished processing, or the default model."""
+    if not model_id:
+        return default_model_path()
+    upload = get_upload(model_id)
+    if upload.status != UploadedModel.READY:
+        raise ValueError(f"Model '{model_id}' is not ready (status: {upload.status}).")
+    return upload_paths(upload)[1]
+
+
+def create_upload(name, size):
+    if size <= 0:
+        raise ValueError("The upload size must be positive.")
+    if size > settings.HEATMAP_UPLOAD_MAX_BYTES:
+        raise ValueError(f"The upload is larger than {settings.HEATMAP_UPLOAD_MAX_BYTES} bytes.")
+    upload = UploadedModel.objects.create(name=name, size=size)
+    os.makedirs(str(settings.HEATMAP_UPLOAD_DIR), exist_ok=True)
+    open(upload_paths(upload)[0], 'wb').close()
+    return upload
+
+
+def parse_content_range(header, length):
+    """
+    (start, end) byte offsets of a chunk from its ``Content-Range`` header,
+    ``end`` exclusive. Without the header the body is taken to start at 0.
+    """
+    if not header:
+        return 0, length
+    match = CONTENT_RANGE.match(header.strip())
+    if match is None:
+        raise ValueError(f"Malformed Content-Range header '{header}'.")
+    start, last = int(match.group(1)), int(match.group(2))
+    if last < start:
+        raise ValueError(f"Malformed Content-Range header '{header}'.")
+    return start, last + 1
+
+
+def write_chunk(upload, stream, start, end):
+    """
+    Copy ``end - start`` bytes of ``stream`` into the upload at offset
+    ``start`` without holding the chunk in memory. Returns the number of
+    bytes received so far.
+    """
+    if upload.status != UploadedModel.UPLOADING:
+        raise ValueError(f"Model '{upload.id}' is not accepting data (status: {upload.status}).")
+    if end > upload.size:
+        raise ValueError("The chunk extends past the declared upload size.")
+    part_path = upload_paths(upload)[0]
+    written = 0
+    with open(part_path, 'r+b') as file:
+        file.seek(start)
+        while written < end - start:
+            data = stream.read(min(COPY_BUFFER_SIZE, end - start - written)) if stream else b''
+            if not data:
+                break
+            file.write(data)
+            written += len(data)
+    if written != end - start:
+        raise ValueError(f"Expected {end - start} bytes but received {written}.")
+
+    # Chunks must arrive in order; a repeated chunk is accepted and ignored
+    UploadedModel.objects.filter(id=upload.id, received=start).update(received=end)
+    upload.refresh_from_db(fields=['received'])
+    return upload.received
+
+
+def finish_upload(upload):
+    """Publish a fully received upload and mark it for background parsing."""
+    part_path, obj_path = upload_paths(upload)
+    os.replace(part_path, obj_path)
+    upload.status = UploadedModel.PROCESSING
+    upload.save(update_fields=['status'])
+
+
+def ingest_model(model_id):
+    """
+    Parse an uploaded model once into the mesh cache, along with its
+    decimated levels of detail and object tile index (run by a job worker).
+    """
+    upload = get_upload(model_id)
+    try:
+        cached = get_cached_mesh(upload_paths(upload)[1])
+        for level in range(1, len(settings.HEATMAP_LOD_RESOLUTIONS) + 1):
+            get_lod(cached, level)
+        get_object_index(cached)
+    except Exception as e:
+        upload.status, upload.error = UploadedModel.FAILED, str(e)
+        upload.save(update_fields=['status', 'error'])
+        raise
+    upload.status = UploadedModel.READY
+    upload.content_hash = cached.content_hash
+    upload.face_count = cached.mesh.face_count
+    upload.save(update_fields=['status', 'content_hash', 'face_count'])
+    return upload
@@ -1,8 +1,19 @@
 from django.urls import path
-from .views import Process3DModelView
+from .views import (
+    BuildingPotentialView, BuildingSummaryView, HeatmapGeometryView, HeatmapJobView, HeatmapTilesView,
+    ModelUploadDetailView, ModelUploadView, Process3DModelView,
+)
 from django.conf.urls.static import static
 from django.conf import settings
 
 urlpatterns = [
     path('heatmap/', Process3DModelView.as_view(), name='process-3d-model'),
+    path('heatmap/jobs/<uuid:job_id>/', HeatmapJobView.as_view(), name='heatmap-job'),
+    path('heatmap/models/', ModelUploadView.as_view(), name='heatmap-models'),
+    path('heatmap/models/<uuid:model_id>/', ModelUploadDetailView.as_view(), name='heatmap-model'),
+    path('heatmap/buildings/', BuildingSummaryView.as_view(), name='heatmap-buildings'),
+    path('heatmap/buildings/potential/', BuildingPotentialView.as_view(), name='heatmap-building-potential'),
+    path('heatmap/tiles/', HeatmapTilesView.as_view(), name='heatmap-tiles'),
+    path('heatmap/geometry/', HeatmapGeometryView.as_view(), name='heatmap-geometry'),
+    path('heatmap/geometry/<str:version>/', HeatmapGeometryView.as_view(), name='heatmap-geometry-asset'),
 ]+ static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,44 +1,444 @@
 # views.py
 
-from django.core.files.base import ContentFile
+import json
+import numpy as np
+from urllib.parse import urlencode
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import ProcessedModel
-from .file_processor import process_3d_model
+from .jobs import enqueue_ingest, enqueue_job
+from .models import HeatmapJob, UploadedModel
+from .result_cache import FILE_FIELDS, lookup_result, quantize_timestamp, result_cache_key
+from .tiles import parse_bbox, parse_tile
+from .uploads import create_upload, finish_upload, get_upload, model_path, parse_content_range, write_chunk
+from .file_processor import (
+    EFFICIENCY_BIPV, EFFICIENCY_ROOFTOP, VALUE_FORMATS, cached_object_index, current_geometry, flat_factor,
+    geometry_asset, model_version, object_index, process_building_potentials, process_buildings,
+    process_buildings_series, process_3d_model_values, region_objects, series_times, validate_lod, validate_options,
+    validate_scale,
+)
 from datetime import datetime
-import os
+from SunLocation.irradiance import parse_irradiance
+from SunLocation.sites import get_site
+
+def site_model(params):
+    # Site of a request and the model it runs on: the named upload, else the
+    # site's default model, else the built-in one
+    site = get_site(params.get('site'))
+    model_id = params.get('model') or site.model_id
+    return site, model_id, model_path(model_id)
+
+
+def file_urls(processed_model):
+    return {
+        f"{field}_url": getattr(processed_model, field).url
+        for field in FILE_FIELDS if getattr(processed_model, field)
+    }
+
+
+def upload_status(upload):
+    status = {
+        "model_id": str(upload.id),
+        "name": upload.name,
+        "status": upload.status,
+        "size": upload.size,
+        "received": upload.received,
+        "upload_url": reverse('heatmap-model', args=[upload.id]),
+    }
+    if upload.status == UploadedModel.READY:
+        status["face_count"] = upload.face_count
+    if upload.status == UploadedModel.FAILED:
+        status["error"] = upload.error
+    return status
+
 
 class Process3DModelView(APIView):
     def post(self, request):
         try:
             # Parse inputs
-            solar_irradiance = float(request.POST.get('solar_irradiance'))
+            solar_irradiance = parse_irradiance(request.POST.get('solar_irradiance'))
+            mode = request.POST.get('mode', 'flat')
+            shadows = request.POST.get('shadows', 'false').lower() in ('1', 'true', 'yes')
+            output_format = request.POST.get('format', 'obj')
+            site, model_id, obj_path = site_model(request.POST)
+            selection = self.parse_selection(request, obj_path)
+            validate_options(mode, output_format, selection["lod"])
+            color_scale = self.parse_scale(request)
+            if request.POST.get('start'):
+                if output_format in VALUE_FORMATS:
+                    raise ValueError(f"Format '{output_format}' serves one datetime; use obj or glb for a time range.")
+                return self.post_series(
+                    request, solar_irradiance, mode, shadows, output_format, site, model_id, obj_path,
+                    selection, color_scale
+                )
             datetime_str = request.POST.get('datetime')
-            timestamp = datetime.strptime(datetime_str, '%Y-%m-%d %H:%M:%S')
+            timestamp = quantize_timestamp(datetime.strptime(datetime_str, '%Y-%m-%d %H:%M:%S'))
+            if output_format in VALUE_FORMATS:
+                if selection["bbox"] or selection["tile"]:
+                    raise ValueError("bbox and tile select parts of obj or glb output only.")
+                return self.post_values(
+                    solar_irradiance, timestamp, mode, shadows, output_format, obj_path, selection["lod"], site,
+                    color_scale
+                )
 
-            # Process the 3D model to generate updated OBJ and MTL contents
-            updated_obj_path, updated_mtl_path = process_3d_model(solar_irradiance, timestamp)
+            # Serve a stored result for identical inputs, otherwise queue a job
+            params = {
+                "solar_irradiance": solar_irradiance, "timestamp": timestamp.isoformat(),
+                "mode": mode, "shadows": shadows, "format": output_format, "model": model_id, "site": site.describe(),
+                **selection, **color_scale,
+            }
+            inputs = {"solar_irradiance": solar_irradiance, "timestamp": timestamp, "site": site.cache_key}
+            if mode == 'flat' and not shadows:
+                # Flat potentials are per-face weights times one scalar, so
+                # requests with the same factor share a result, and OBJ
+                # colors on a relative scale are the same for every positive factor
+                factor = flat_factor(solar_irradiance, timestamp, site)
+                relative = color_scale["scale"] != 'absolute'
+                inputs = {"factor": 'positive' if output_format == 'obj' and relative and factor > 0 else factor}
+            cache_key = result_cache_key(
+                model_version(obj_path), mode=mode, shadows=shadows, format=output_format,
+                **inputs, **selection, **color_scale
+            )
+            return self.cached_or_queued(cache_key, params)
 
-            # Read the content of the updated files
-            with open(updated_obj_path, 'rb') as obj_file, open(updated_mtl_path, 'rb') as mtl_file:
-                obj_content = obj_file.read()
-                mtl_content = mtl_file.read()
+        except Exception as e:
+            return Response({"error": str(e)}, status=400)
 
-            # Create a new ProcessedModel instance and save the files in the database
-            processed_model = ProcessedModel.objects.create(
-                obj_file=ContentFile(obj_content, name="updated.obj"),
-                mtl_file=ContentFile(mtl_content, name="updated.mtl")
-            )
+    def parse_selection(self, request, obj_path):
+        # Level of detail (0 is full detail) and optional region: a ground-plane
+        # bbox 'min_x,min_z,max_x,max_z' or a tile id '<column>_<row>', which
+        # must hold objects of the model. A model not parsed yet is checked
+        # by the job instead, so the request never waits for the parse
+        bbox = request.POST.get('bbox')
+        tile = request.POST.get('tile')
+        if bbox and tile:
+            raise ValueError("Pass either bbox or tile, not both.")
+        selection = {
+            "lod": int(request.POST.get('lod', 0)),
+            "bbox": list(parse_bbox(bbox)) if bbox else None,
+            "tile": list(parse_tile(tile)) if tile else None,
+        }
+        index = cached_object_index(obj_path) if bbox or tile else None
+        if index is not None:
+            region_objects(index, selection["bbox"], selection["tile"])
+        return selection
+
+    def parse_scale(self, request):
+        # Color scale (see HEATMAP_SCALES); 'absolute' takes comma-separated
+        # breakpoints, in W for one timestamp and kWh per face for a range
+        scale = request.POST.get('scale', 'linear')
+        breakpoints = request.POST.get('breakpoints')
+        breakpoints = [float(value) for value in breakpoints.split(',')] if breakpoints else None
+        validate_scale(scale, breakpoints)
+        return {"scale": scale, "breakpoints": breakpoints if scale == 'absolute' else None}
+
+    def post_series(self, request, solar_irradiance, mode, shadows, output_format, site, model_id, obj_path,
+                    selection, color_scale):
+        # Integrate the potential over start..end in steps of 'step' (e.g. '1h', '15min')
+        start = datetime.strptime(request.POST.get('start'), '%Y-%m-%d %H:%M:%S')
+        end = datetime.strptime(request.POST.get('end'), '%Y-%m-%d %H:%M:%S')
+        step = request.POST.get('step', '1h')
+        series_times(start, end, step)
+
+        params = {
+            "solar_irradiance": solar_irradiance, "start": start.isoformat(), "end": end.isoformat(),
+            "step": step, "mode": mode, "shadows": shadows, "format": output_format, "model": model_id,
+            "site": site.describe(), **selection, **color_scale,
+        }
+        cache_key = result_cache_key(
+            model_version(obj_path), solar_irradiance=solar_irradiance, start=start, end=end,
+            step=step, mode=mode, shadows=shadows, format=output_format, site=site.cache_key, **selection,
+            **color_scale
+        )
+        return self.cached_or_queued(cache_key, params)
+
+    def cached_or_queued(self, cache_key, params):
+        processed_model = lookup_result(cache_key)
+        if processed_model is not None:
+            return self.cached_response(processed_model)
+
+        job = enqueue_job(cache_key, params)
+        return Response({
+            "message": "Heatmap job queued.",
+            "job_id": str(job.id),
+            "status": job.status,
+            "status_url": reverse('heatmap-job', args=[job.id]),
+        }, status=202)
+
+    def post_values(self, solar_irradiance, timestamp, mode, shadows, value_format, obj_path, lod, site,
+                    color_scale):
+        # Only the per-face buffer; the mesh comes from HeatmapGeometryView
+        data, ranges, max_potential, version = process_3d_model_values(
+            solar_irradiance, timestamp, mode, shadows, value_format, obj_path, lod, site, **color_scale
+        )
+        response = HttpResponse(data, content_type='application/octet-stream')
+        response['X-Geometry-Version'] = version
+        response['X-Heatmap-Ranges'] = json.dumps([round(float(r), 6) for r in ranges])
+        response['X-Heatmap-Max'] = repr(max_potential)
+        return response
+
+    def cached_response(self, processed_model):
+        response = {
+            "message": "Files processed successfully.",
+            **file_urls(processed_model),
+        }
+        if processed_model.summary is not None:
+            response["summary"] = processed_model.summary
+        response["cached"] = True
+        return Response(response, status=200)
+
+
+class HeatmapGeometryView(APIView):
+    """
+    Geometry of the heatmap model as GLB, served once per model version.
+
+    GET without a version returns the current version and its URL; the
+    versioned URL never changes content and is cacheable forever.
+    """
+
+    def get(self, request, version=None):
+        try:
+            _, model_id, obj_path = site_model(request.GET)
+            lod = int(request.GET.get('lod', 0))
+            validate_lod(lod)
+            cached, current_version = current_geometry(obj_path, lod)
+            if version is None:
+                query = urlencode({name: value for name, value in (('model', model_id), ('lod', lod)) if value})
+                url = reverse('heatmap-geometry-asset', args=[current_version])
+                return Response({
+                    "version": current_version,
+                    "face_count": cached.mesh.face_count,
+                    "url": f"{url}?{query}" if query else url,
+                })
+            if version != current_version:
+                return Response({"error": "Unknown geometry version."}, status=404)
+
+            etag = f'"{current_version}"'
+            if request.headers.get('If-None-Match') == etag:
+                response = HttpResponseNotModified()
+            else:
+                response = FileResponse(open(geometry_asset(cached), 'rb'), content_type='model/gltf-binary')
+            response['ETag'] = etag
+            response['Cache-Control'] = 'public, max-age=31536000, immutable'
+            return response
+
+        except Exception as e:
+            return Response({"error": str(e)}, status=400)
+
+
+class BuildingSummaryView(APIView):
+    """
+    Per-building results: face count, area (m²), total and mean per-face
+    potential, potential per m² and rank, largest total first. Takes the
+    /heatmap/ inputs (a datetime, or start/end/step for energy in kWh),
+    plus an optional bbox or tile and a ``limit`` on the number of rows.
+    """
+
+    def post(self, request):
+        try:
+            solar_irradiance = parse_irradiance(request.POST.get('solar_irradiance'))
+            mode = request.POST.get('mode', 'flat')
+            shadows = request.POST.get('shadows', 'false').lower() in ('1', 'true', 'yes')
+            site, _, obj_path = site_model(request.POST)
+            bbox = request.POST.get('bbox')
+            tile = request.POST.get('tile')
+            region = {"bbox": parse_bbox(bbox) if bbox else None, "tile": parse_tile(tile) if tile else None}
+            limit = request.POST.get('limit')
+
+            if request.POST.get('start'):
+                start = datetime.strptime(request.POST.get('start'), '%Y-%m-%d %H:%M:%S')
+                end = datetime.strptime(request.POST.get('end'), '%Y-%m-%d %H:%M:%S')
+                summary = process_buildings_series(
+                    solar_irradiance, start, end, request.POST.get('step', '1h'), mode, shadows, obj_path,
+                    site=site, **region
+                )
+                unit = "kWh"
+            else:
+                timestamp = datetime.strptime(request.POST.get('datetime'), '%Y-%m-%d %H:%M:%S')
+                summary = process_buildings(solar_irradiance, timestamp, mode, shadows, obj_path, site=site, **region)
+                unit = "W"
+
+            rows = slice(None, int(limit)) if limit else slice(None)
+            buildings = [
+                {
+                    "rank": int(rank), "name": str(name), "faces": int(faces), "area": round(float(area), 4),
+                    "total": round(float(total), 6), "mean": round(float(mean), 6), "per_m2": round(float(per_m2), 6),
+                }
+                for rank, name, faces, area, total, mean, per_m2 in zip(*(summary[key][rows] for key in (
+                    "rank", "name", "faces", "area", "total", "mean", "per_m2"
+                )))
+            ]
+            return Response({"unit": unit, "count": len(summary["rank"]), "buildings": buildings})
+
+        except Exception as e:
+            return Response({"error": str(e)}, status=400)
+
+
+class BuildingPotentialView(APIView):
+    """
+    Rooftop and BIPV potential of every building, derived from the model:
+    faces are classed as roof or wall by their normal. POST a ``datetime``
+    for the potential in W, or a ``year`` for energy over that year in kWh,
+    with ``solar_irradiance``, optional ``shadows``, ``efficiency_rooftop``,
+    ``efficiency_bipv``, bbox or tile and a ``limit`` on the rows.
+    """
+
+    def post(self, request):
+        try:
+            solar_irradiance = parse_irradiance(request.POST.get('solar_irradiance'))
+            shadows = request.POST.get('shadows', 'false').lower() in ('1', 'true', 'yes')
+            site, _, obj_path = site_model(request.POST)
+            bbox = request.POST.get('bbox')
+            tile = request.POST.get('tile')
+            limit = request.POST.get('limit')
+            options = {
+                "shadows": shadows, "obj_path": obj_path, "site": site,
+                "bbox": parse_bbox(bbox) if bbox else None, "tile": parse_tile(tile) if tile else None,
+                "efficiency_rooftop": float(request.POST.get('efficiency_rooftop', EFFICIENCY_ROOFTOP)),
+                "efficiency_bipv": float(request.POST.get('efficiency_bipv', EFFICIENCY_BIPV)),
+            }
 
-            # Construct file URLs
-            obj_file_url = processed_model.obj_file.url
-            mtl_file_url = processed_model.mtl_file.url
+            if request.POST.get('year'):
+                summary = process_building_potentials(solar_irradiance, year=int(request.POST.get('year')), **options)
+                unit = "kWh"
+            else:
+                timestamp = datetime.strptime(request.POST.get('datetime'), '%Y-%m-%d %H:%M:%S')
+                summary = process_building_potentials(solar_irradiance, timestamp, **options)
+                unit = "W"
 
+            rows = slice(None, int(limit)) if limit else slice(None)
+            buildings = [
+                {
+                    "rank": int(rank), "name": str(name), "roof_area": round(float(roof_area), 4),
+                    "wall_area": round(float(wall_area), 4), "rooftop_potential": round(float(rooftop), 6),
+                    "bipv_potential": round(float(bipv), 6),
+                }
+                for rank, name, roof_area, wall_area, rooftop, bipv in zip(*(summary[key][rows] for key in (
+                    "rank", "name", "roof_area", "wall_area", "rooftop", "bipv"
+                )))
+            ]
             return Response({
-                "message": "Files processed successfully.",
-                "obj_file_url": obj_file_url,
-                "mtl_file_url": mtl_file_url
-            }, status=201)
+                "unit": unit,
+                "count": len(summary["rank"]),
+                "total_rooftop_potential": round(float(summary["rooftop"].sum()), 6),
+                "total_bipv_potential": round(float(summary["bipv"].sum()), 6),
+                "buildings": buildings,
+            })
 
         except Exception as e:
             return Response({"error": str(e)}, status=400)
+
+
+class HeatmapTilesView(APIView):
+    """
+    Tile grid of a model for streaming partial heatmaps: the grid origin and
+    tile size in model (x, z) units, and every tile holding objects, each
+    requestable from /heatmap/ with ``tile=<column>_<row>``.
+    """
+
+    def get(self, request):
+        try:
+            index = object_index(site_model(request.GET)[2])
+            counts = np.diff(index.tile_offsets)
+            tiles = []
+            for tile in np.flatnonzero(counts):
+                row, column = divmod(int(tile), index.columns)
+                tiles.append({"tile": f"{column}_{row}", "objects": int(counts[tile])})
+            return Response({
+                "origin": [float(value) for value in index.grid_origin],
+                "tile_size": float(index.tile_size[0]),
+                "columns": index.columns,
+                "rows": index.rows,
+                "tiles": tiles,
+            })
+
+        except Exception as e:
+            return Response({"error": str(e)}, status=400)
+
+
+class HeatmapJobView(APIView):
+    """Status, progress and, once done, result URLs of a queued heatmap job."""
+
+    def get(self, request, job_id):
+        try:
+            job = HeatmapJob.objects.filter(id=job_id).select_related('result').first()
+            if job is None:
+                return Response({"error": "Unknown job."}, status=404)
+
+            response = {
+                "job_id": str(job.id),
+                "status": job.status,
+                "progress": round(job.progress, 3),
+            }
+            if job.status == HeatmapJob.FAILED:
+                response["error"] = job.error
+            if job.status == HeatmapJob.DONE and job.params.get('task') != 'ingest':
+                if job.result is None:
+                    # The result was evicted from the cache since the job finished
+                    return Response({**response, "error": "The result has expired."}, status=410)
+                response.update(file_urls(job.result))
+                if job.result.summary is not None:
+                    response["summary"] = job.result.summary
+            return Response(response)
+
+        except Exception as e:
+            return Response({"error": str(e)}, status=400)
+
+
+class ModelUploadView(APIView):
+    """
+    Start a chunked upload of an OBJ model. POST with the total ``size`` in
+    bytes (and an optional ``name``), then PUT the bytes to ``upload_url``.
+    """
+
+    def post(self, request):
+        try:
+            upload = create_upload(request.POST.get('name', ''), int(request.POST.get('size')))
+            return Response(upload_status(upload), status=201)
+
+        except Exception as e:
+            return Response({"error": str(e)}, status=400)
+
+
+class ModelUploadDetailView(APIView):
+    """
+    GET reports upload and processing status, including the number of bytes
+    received so an interrupted upload can resume from there. PUT appends a
+    chunk of raw bytes, placed by its ``Content-Range: bytes start-end/total``
+    header. Once every byte has arrived the model is parsed in the background.
+    """
+
+    def get(self, request, model_id):
+        try:
+            return Response(upload_status(get_upload(model_id)))
+
+        except Exception as e:
+            return Response({"error": str(e)}, status=400)
+
+    def put(self, request, model_id):
+        try:
+            upload = get_upload(model_id)
+            length = int(request.headers.get('Content-Length') or 0)
+            start, end = parse_content_range(request.headers.get('Content-Range'), length)
+            if start > upload.received:
+                return Response({
+                    "error": "Chunks must be sent in order.", **upload_status(upload)
+                }, status=409)
+
+            # Read the body straight from the request stream, never all at once
+            write_chunk(upload, request.stream, start, end)
+            if upload.received < upload.size:
+                return Response(upload_status(upload))
+
+            finish_upload(upload)
+            job = enqueue_ingest(upload)
+            return Response({
+                **upload_status(upload),
+                "job_id": str(job.id),
+                "status_url": reverse('heatmap-job', args=[job.id]),
+            }, status=202)
+
+        except Exception as e:
+            return Response({"error": str(e)}, status=400)
+
@@ -61,6 +61,7 @@ ROOT_URLCONF = 'Solaris.urls'
 
 CORS_ALLOW_CREDENTIALS: True
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_EXPOSE_HEADERS = ['ETag', 'X-Geometry-Version', 'X-Heatmap-Ranges', 'X-Heatmap-Max']
 
 TEMPLATES = [
     {
@@ -166,3 +167,84 @@ SIMPLE_JWT = {
 
 MEDIA_ROOT = BASE_DIR / 'media'
 MEDIA_URL = '/media/'
+
+# Parsed heatmap meshes are cached on disk (one directory of .npy arrays per
+# OBJ content hash) and in an in-process LRU of this many entries
+HEATMAP_MESH_CACHE_DIR = BASE_DIR / 'cache' / 'meshes'
+HEATMAP_MESH_CACHE_SIZE = 4
+
+# Time-series heatmaps evaluate incidence for blocks of at most this many
+# (face, timestep) pairs, and refuse ranges with more timesteps than the limit
+HEATMAP_SERIES_CHUNK_ELEMENTS = 4_000_000
+HEATMAP_MAX_TIMESTEPS = 200_000
+
+# Heatmap result cache: timestamps are rounded down to this many seconds, and
+# the least recently used results are deleted beyond these budgets
+HEATMAP_RESULT_TIME_QUANTUM = 60
+HEATMAP_RESULT_CACHE_MAX_ENTRIES = 500
+HEATMAP_RESULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# Heatmap jobs: worker processes started by `manage.py heatmap_worker`, how
+# often idle workers poll the queue (seconds), after how many seconds
+# without a heartbeat a running job is considered abandoned and retried, and
+# how often a running job's heartbeat is sent
+HEATMAP_JOB_WORKERS = 2
+HEATMAP_JOB_POLL_INTERVAL = 1.0
+HEATMAP_JOB_TIMEOUT = 600
+HEATMAP_JOB_HEARTBEAT_INTERVAL = 30
+
+# Parallel heatmap computation: models with at least HEATMAP_PARALLEL_MIN_FACES
+# faces are split across a pool of this many processes (1 disables it), in
+# blocks of faces for orientation series and shadow rays, and in blocks of
+# timestamps for shadowed time series
+HEATMAP_PARALLEL_WORKERS = 1
+HEATMAP_PARALLEL_MIN_FACES = 200_000
+HEATMAP_PARALLEL_CHUNK_FACES = 65_536
+HEATMAP_PARALLEL_CHUNK_TIMESTEPS = 24
+
+# Customer models uploaded through /heatmap/models/ are assembled here (kept
+# out of MEDIA_ROOT so they are never served), up to this many bytes each
+HEATMAP_UPLOAD_DIR = BASE_DIR / 'uploads' / 'models'
+HEATMAP_UPLOAD_MAX_BYTES = 1024 ** 3
+
+# Decimated heatmap levels of detail: level n clusters vertices on a grid of
+# HEATMAP_LOD_RESOLUTIONS[n - 1] cells along the longest side of the model
+HEATMAP_LOD_RESOLUTIONS = (256, 128, 64)
+
+# Objects (buildings) are indexed on a grid of this many tiles along the
+# longer side of the model's ground-plane footprint
+HEATMAP_TILE_GRID = 16
+
+# Site used by requests that do not name one (SunLocation.Site): coordinates,
+# altitude in metres and time zone
+DEFAULT_SITE_LATITUDE = 23.030357
+DEFAULT_SITE_LONGITUDE = 72.517845
+DEFAULT_SITE_ALTITUDE = 0
+DEFAULT_SITE_TIME_ZONE = 'Asia/Kolkata'
+
+# Seconds a process serves its cached context of a site before checking
+# whether the site was edited in another process
+SITE_CACHE_TTL = 5
+
+# Batch sun positions (/api/sun_position/batch/): the most location/timestamp
+# pairs computed per request
+SUN_POSITION_BATCH_MAX_POINTS = 500_000
+
+# Precomputed sun paths: one memory-mapped table of minute positions per site
+# and year, built on first use for years in this inclusive range (others are
+# computed with pvlib directly)
+SUN_EPHEMERIS_DIR = BASE_DIR / 'cache' / 'ephemeris'
+SUN_EPHEMERIS_YEARS = (2000, 2050)
+
+# Batch solar potential (/api/solar_potential/batch/): most buildings and
+# timestamps per request
+SOLAR_POTENTIAL_BATCH_MAX_BUILDINGS = 100_000
+SOLAR_POTENTIAL_BATCH_MAX_TIMESTEPS = 35_136
+
+# Clear-sky irradiance (solar_irradiance omitted or 'clearsky'): days of
+# samples kept in memory, per site and local date
+CLEARSKY_CACHE_MAX_DAYS = 4096
+
+# Quantile color scales sort a copy of the face values up to this many faces
+# and use a streamed histogram approximation beyond
+HEATMAP_QUANTILE_EXACT_MAX_FACES = 2_000_000
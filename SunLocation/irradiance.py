@@ -0,0 +1,176 @@
+# irradiance.py
+
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pvlib
+from django.conf import settings
+from .solar import zenith_cosines
+
+# Requests pass this instead of an irradiance to use the site's clear sky
+CLEARSKY = 'clearsky'
+COMPONENTS = ('ghi', 'dni', 'dhi')
+
+# Days are sampled every STEP_MINUTES and interpolated in between, which
+# stays within 1 W/m² of evaluating pvlib's Ineichen model at each timestamp
+STEP_MINUTES = 5
+
+# Location/timestamp pairs evaluated per pvlib call for ad-hoc locations
+LOCATION_CHUNK_ELEMENTS = 1 << 18
+
+_days = OrderedDict()
+_lock = threading.Lock()
+
+
+def parse_irradiance(value):
+    # An irradiance from a request, or CLEARSKY when it is omitted or 'clearsky'
+    if value in (None, '', CLEARSKY):
+        return CLEARSKY
+    return float(value)
+
+
+def _day_starts(site, dates):
+    # Local midnights of ``dates`` and of the following days
+    starts = pd.DatetimeIndex(dates).tz_localize(site.timezone)
+    ends = (pd.DatetimeIndex(dates) + pd.Timedelta(days=1)).tz_localize(site.timezone)
+    return starts, ends
+
+
+def _compute_days(site, dates):
+    """
+    Clear-sky GHI, DNI and DHI (W/m²) of whole local days, as one (3, S)
+    array of samples per day. All days go through a single pvlib call.
+    """
+    starts, ends = _day_starts(site, dates)
+    ranges = [pd.date_range(start, end, freq=f'{STEP_MINUTES}min') for start, end in zip(starts, ends)]
+    clearsky = site.location.get_clearsky(ranges[0].append(ranges[1:]) if len(ranges) > 1 else ranges[0])
+    samples = clearsky[list(COMPONENTS)].to_numpy().T
+    boundaries = np.cumsum([len(times) for times in ranges])[:-1]
+    return np.split(samples, boundaries, axis=1)
+
+
+def _get_days(site, dates):
+    # Cached samples of every date, computing the missing ones together
+    keys = [(site.cache_key, date) for date in dates]
+    with _lock:
+        found = {key: _days[key] for key in keys if key in _days}
+        for key in found:
+            _days.move_to_end(key)
+    missing = [date for key, date in zip(keys, dates) if key not in found]
+    if missing:
+        computed = dict(zip(((site.cache_key, date) for date in missing), _compute_days(site, missing)))
+        found.update(computed)
+        with _lock:
+            _days.update(computed)
+            while len(_days) > settings.CLEARSKY_CACHE_MAX_DAYS:
+                _days.popitem(last=False)
+    return [found[key] for key in keys]
+
+
+def clearsky_irradiance(site, times):
+    """
+    Clear-sky GHI, DNI and DHI (W/m²) at ``site`` for any number of
+    timestamps, as a dict of arrays. Naive timestamps are site-local.
+    Samples are memoized per (site, local date) in a bounded LRU cache.
+    """
+    times = site.localize(times)
+    midnights = times.normalize()
+    codes, unique_dates = pd.factorize(midnights.tz_localize(None))
+    order = np.argsort(codes, kind='stable')
+    day_rows = np.split(order, np.cumsum(np.bincount(codes, minlength=len(unique_dates)))[:-1])
+    irradiance = np.zeros((len(COMPONENTS), len(times)))
+    for rows, samples in zip(day_rows, _get_days(site, list(unique_dates))):
+        steps = (times[rows] - midnights[rows]).total_seconds().to_numpy() / (STEP_MINUTES * 60)
+        positions = np.arange(samples.shape[1])
+        for component in range(len(COMPONENTS)):
+            irradiance[component, rows] = np.interp(steps, positions, samples[component])
+    return dict(zip(COMPONENTS, irradiance))
+
+
+def _daily_turbidity(latitudes, longitudes, times):
+    """
+    Linke turbidity of every location on each distinct UTC date of
+    ``times`` (it does not vary within a date), as an (L, D) array, with
+    the date index of every timestamp. One lookup per location.
+    """
+    codes, dates = pd.factorize(times.tz_convert('UTC').normalize())
+    daily = np.stack([
+        pvlib.clearsky.lookup_linke_turbidity(pd.DatetimeIndex(dates), latitude, longitude).to_numpy()
+        for latitude, longitude in zip(latitudes, longitudes)
+    ])
+    return daily, codes
+
+
+def _location_clearsky_blocks(latitudes, longitudes, times, tz, altitude, chunk_elements):
+    # Clear-sky GHI, DNI and DHI (W/m²) of all locations for one block of
+    # timestamps at a time, as (block slice, {component: (L, block) array})
+    times = pd.DatetimeIndex(times)
+    if times.tz is None:
+        times = times.tz_localize(tz)
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    turbidity, dates = _daily_turbidity(latitudes, longitudes, times)
+    pressure = pvlib.atmosphere.alt2pres(altitude)
+    dni_extra = pvlib.irradiance.get_extra_radiation(times).to_numpy()
+    step = max(1, chunk_elements // max(1, len(latitudes)))
+    for start in range(0, len(times), step):
+        block = slice(start, min(start + step, len(times)))
+        block_times = times[block]
+        shape = (len(latitudes), len(block_times))
+        solar_position = pvlib.solarposition.get_solarposition(
+            block_times[np.tile(np.arange(len(block_times)), len(latitudes))],
+            np.repeat(latitudes, len(block_times)), np.repeat(longitudes, len(block_times)), pressure=pressure,
+        )
+        apparent_zenith = solar_position['apparent_zenith'].to_numpy().reshape(shape)
+        airmass = pvlib.atmosphere.get_absolute_airmass(
+            pvlib.atmosphere.get_relative_airmass(apparent_zenith), pressure
+        )
+        # Night-time airmass is NaN, which comes out as 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            clearsky = pvlib.clearsky.ineichen(
+                apparent_zenith, airmass, turbidity[:, dates[block]], altitude=altitude, dni_extra=dni_extra[block]
+            )
+        yield block, {component: np.nan_to_num(clearsky[component]) for component in COMPONENTS}
+
+
+def location_daily_irradiation(latitudes, longitudes, dates, tz='Asia/Kolkata', altitude=0,
+                               chunk_elements=LOCATION_CHUNK_ELEMENTS):
+    """
+    Clear-sky global horizontal irradiation (kWh/m²), beam plus diffuse, of
+    every location over each whole local day of ``dates`` in ``tz``, as an
+    (L, D) array. GHI from the Ineichen model that Location.get_clearsky
+    uses is sampled every STEP_MINUTES and integrated with the trapezoidal
+    rule. Meant for ad-hoc coordinates such as a building's own; nothing is
+    cached, so these never displace the sites' days in the LRU cache.
+    """
+    days = pd.DatetimeIndex(dates).normalize()
+    days = days.tz_localize(None) if days.tz is not None else days
+    ranges = [
+        pd.date_range(day.tz_localize(tz), (day + pd.Timedelta(days=1)).tz_localize(tz), freq=f'{STEP_MINUTES}min')
+        for day in days
+    ]
+    times = ranges[0].append(ranges[1:]) if len(ranges) > 1 else ranges[0]
+    ghi = np.zeros((len(latitudes), len(times)))
+    for block, clearsky in _location_clearsky_blocks(latitudes, longitudes, times, tz, altitude, chunk_elements):
+        ghi[:, block] = clearsky['ghi']
+    step_hours = STEP_MINUTES / 60
+    irradiation = [
+        (day.sum(axis=1) - (day[:, 0] + day[:, -1]) / 2) * step_hours / 1000
+        for day in np.split(ghi, np.cumsum([len(day_times) for day_times in ranges])[:-1], axis=1)
+    ]
+    return np.stack(irradiation, axis=1)
+
+
+def clearsky_cosine_sums(latitudes, longitudes, times, tz='Asia/Kolkata', chunk_elements=LOCATION_CHUNK_ELEMENTS):
+    """
+    Per-location sum over ``times`` of the clear-sky DNI (kW/m²) times the
+    zenith cosine of solar.zenith_cosines, leaving out times with the sun
+    below the horizon. Timestamps are local clock times in ``tz``.
+    """
+    times = pd.DatetimeIndex(times)
+    sums = np.zeros(len(latitudes))
+    for block, clearsky in _location_clearsky_blocks(latitudes, longitudes, times, tz, 0, chunk_elements):
+        cosines = np.clip(zenith_cosines(latitudes, longitudes, times[block]), 0, None)
+        sums += np.einsum('lt,lt->l', cosines, clearsky['dni'] / 1000)
+    return sums
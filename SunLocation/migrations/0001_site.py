@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('HeatMap', '0006_uploadedmodel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Site',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('altitude', models.FloatField(default=0)),
+                ('timezone', models.CharField(default='Asia/Kolkata', max_length=64)),
+                ('model', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='HeatMap.uploadedmodel')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
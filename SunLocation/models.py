@@ -1,3 +1,38 @@
+import pytz
+from django.core.exceptions import ValidationError
 from django.db import models
+from .sites import clear_site_cache
 
 # Create your models here.
+
+
+class Site(models.Model):
+    """
+    A location the service computes sun positions and heatmaps for. Requests
+    name a site by id; without one they use the DEFAULT_SITE_* settings.
+    """
+    name = models.CharField(max_length=255)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    altitude = models.FloatField(default=0)  # metres above sea level
+    timezone = models.CharField(max_length=64, default='Asia/Kolkata')
+    # Heatmap model used when a request for this site does not name one
+    model = models.ForeignKey('HeatMap.UploadedModel', null=True, blank=True, on_delete=models.SET_NULL)
+    # Version of the record; processes rebuild cached site contexts when it changes
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        if self.timezone not in pytz.all_timezones_set:
+            raise ValidationError({'timezone': f"Unknown time zone '{self.timezone}'."})
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        clear_site_cache()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        clear_site_cache()
+        return result
@@ -0,0 +1,117 @@
+# sites.py
+
+import threading
+import time
+from dataclasses import dataclass
+import pandas as pd
+import pvlib
+import pytz
+from django.conf import settings
+from .solar import sun_direction
+
+
+@dataclass(frozen=True)
+class SiteContext:
+    """
+    Resolved site: coordinates plus the timezone and pvlib Location objects,
+    built once per site and shared by every request for it.
+    """
+    id: int
+    name: str
+    latitude: float
+    longitude: float
+    altitude: float
+    timezone: object
+    location: pvlib.location.Location
+    model_id: str
+
+    @property
+    def cache_key(self):
+        # Everything about the site that changes computed results
+        return f"{self.latitude:.6f},{self.longitude:.6f},{self.altitude:g},{self.timezone.zone}"
+
+    def localize(self, times):
+        # DatetimeIndex of ``times``, naive timestamps taken as site-local
+        times = pd.DatetimeIndex(times)
+        return times.tz_localize(self.timezone) if times.tz is None else times
+
+    def solar_positions(self, times):
+        # Solar elevation and azimuth (degrees) for any number of timestamps
+        solar_position = self.location.get_solarposition(self.localize(times))
+        return solar_position['elevation'].to_numpy(), solar_position['azimuth'].to_numpy()
+
+    def sun_vectors(self, times):
+        # Scene-frame sun unit vectors, one row per timestamp
+        return sun_direction(*self.solar_positions(times))
+
+    def describe(self):
+        # The resolved fields, enough for another process to rebuild exactly
+        # this context with site_from, whatever the site's record says by then
+        return {
+            "id": self.id, "name": self.name, "latitude": self.latitude, "longitude": self.longitude,
+            "altitude": self.altitude, "timezone": self.timezone.zone, "model_id": self.model_id,
+        }
+
+
+_sites = {}
+_lock = threading.Lock()
+
+
+def _context(site_id, name, latitude, longitude, altitude, timezone, model_id):
+    timezone = pytz.timezone(timezone)
+    location = pvlib.location.Location(latitude, longitude, tz=timezone, altitude=altitude, name=name)
+    return SiteContext(site_id, name, latitude, longitude, altitude, timezone, location, model_id)
+
+
+def get_site(site_id=None):
+    """
+    Cached context of site ``site_id``, or of the default site from the
+    DEFAULT_SITE_* settings when no id is given. Saving a site stamps it
+    with a new ``updated_at``; other processes compare it with their cached
+    context at most once every SITE_CACHE_TTL seconds and rebuild a changed one.
+    """
+    key = int(site_id) if site_id not in (None, '') else None
+    now = time.monotonic()
+    with _lock:
+        cached = _sites.get(key)
+    if cached is not None and (key is None or now - cached[1] < settings.SITE_CACHE_TTL):
+        return cached[2]
+
+    if key is None:
+        site = _context(
+            None, 'default', settings.DEFAULT_SITE_LATITUDE, settings.DEFAULT_SITE_LONGITUDE,
+            settings.DEFAULT_SITE_ALTITUDE, settings.DEFAULT_SITE_TIME_ZONE, None,
+        )
+        version = None
+    else:
+        from .models import Site
+        version = Site.objects.filter(pk=key).values_list('updated_at', flat=True).first()
+        if version is None:
+            raise ValueError(f"Unknown site '{site_id}'.")
+        if cached is not None and cached[0] == version:
+            site = cached[2]
+        else:
+            record = Site.objects.filter(pk=key).first()
+            if record is None:
+                raise ValueError(f"Unknown site '{site_id}'.")
+            version = record.updated_at
+            site = _context(
+                record.pk, record.name, record.latitude, record.longitude, record.altitude, record.timezone,
+                str(record.model_id) if record.model_id else None,
+            )
+    with _lock:
+        _sites[key] = (version, now, site)
+    return site
+
+
+def site_from(description):
+    # Context of a SiteContext.describe() result
+    return _context(
+        description['id'], description['name'], description['latitude'], description['longitude'],
+        description['altitude'], description['timezone'], description['model_id'],
+    )
+
+
+def clear_site_cache():
+    with _lock:
+        _sites.clear()
@@ -0,0 +1,81 @@
+# solar.py
+
+import numpy as np
+import pandas as pd
+import pvlib
+
+
+def solar_positions_grid(latitudes, longitudes, times, tz='Asia/Kolkata'):
+    """
+    Solar elevation and azimuth (degrees) for every location/timestamp pair
+    as (L, T) arrays. All pairs go through one pvlib call, which broadcasts
+    per-row coordinates over the repeated timestamps.
+    """
+    times = pd.DatetimeIndex(times)
+    if times.tz is None:
+        times = times.tz_localize(tz)
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    shape = (len(latitudes), len(times))
+    solar_position = pvlib.solarposition.get_solarposition(
+        times[np.tile(np.arange(len(times)), len(latitudes))],
+        np.repeat(latitudes, len(times)),
+        np.repeat(longitudes, len(times)),
+    )
+    return (
+        solar_position['elevation'].to_numpy().reshape(shape),
+        solar_position['azimuth'].to_numpy().reshape(shape),
+    )
+
+
+def sun_direction(elevation, azimuth):
+    """
+    Unit vectors pointing at the sun in the scene frame used by the 3D
+    viewer: x is east, y is up and z is south (north is negative z).
+    """
+    altitude_rad = np.radians(elevation)
+    azimuth_rad = np.radians(azimuth)
+    return np.stack((
+        np.cos(altitude_rad) * np.sin(azimuth_rad),
+        np.sin(altitude_rad),
+        -np.cos(altitude_rad) * np.cos(azimuth_rad),
+    ), axis=-1)
+
+
+# Location/timestamp pairs evaluated per block by daylight_cosine_sums
+ZENITH_CHUNK_ELEMENTS = 1 << 22
+
+
+def zenith_cosines(latitudes, longitudes, times):
+    """
+    cos of the solar zenith angle for every location/timestamp pair as an
+    (L, T) array, using the simple model of SolarPotentialView: Cooper's
+    declination and solar time corrected to the nearest 15° meridian, with
+    ``times`` read as local clock times.
+    """
+    times = pd.DatetimeIndex(times)
+    latitudes = np.radians(np.asarray(latitudes, dtype=np.float64))[:, None]
+    longitudes = np.asarray(longitudes, dtype=np.float64)[:, None]
+
+    declination = np.radians(23.45 * np.sin(np.radians((360 / 365) * (284 + times.dayofyear.to_numpy()))))
+    time_correction = 4 * (longitudes - np.round(longitudes / 15) * 15)
+    local_time = times.hour.to_numpy() + times.minute.to_numpy() / 60 + times.second.to_numpy() / 3600
+    hour_angle = np.radians(15 * (local_time + time_correction / 60 - 12))
+    return np.clip(
+        np.sin(latitudes) * np.sin(declination) + np.cos(latitudes) * np.cos(declination) * np.cos(hour_angle),
+        -1, 1,
+    )
+
+
+def daylight_cosine_sums(latitudes, longitudes, times, chunk_elements=ZENITH_CHUNK_ELEMENTS):
+    """
+    Per-location sum of zenith_cosines over ``times``, leaving out times
+    with the sun below the horizon. Evaluated a block of timestamps at a
+    time to bound memory.
+    """
+    times = pd.DatetimeIndex(times)
+    sums = np.zeros(len(latitudes))
+    step = max(1, chunk_elements // max(1, len(latitudes)))
+    for start in range(0, len(times), step):
+        sums += np.clip(zenith_cosines(latitudes, longitudes, times[start:start + step]), 0, None).sum(axis=1)
+    return sums
@@ -1,3 +1,187 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+from unittest import mock
+import numpy as np
+import pandas as pd
+import pvlib
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from . import ephemeris
+from .ephemeris import MAX_ERROR_DEGREES, build_table, ephemeris_positions, get_table, table_path
+from .irradiance import location_daily_irradiation
+from .models import Site
+from .sites import clear_site_cache, get_site, site_from
+from .solar import sun_direction
 
-# Create your tests here.
+LATITUDE, LONGITUDE = 23.03, 72.52
+
+
+class EphemerisTestCase(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(override_settings(SUN_EPHEMERIS_DIR=directory))
+        self.addCleanup(ephemeris._tables.clear)
+
+
+class EphemerisAccuracyTests(EphemerisTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.table = build_table(LATITUDE, LONGITUDE, 2024)
+
+    def test_within_documented_error(self):
+        path = table_path(LATITUDE, LONGITUDE, 2024)
+        os.makedirs(os.path.dirname(path))
+        np.save(path, self.table)
+        start = pd.Timestamp('2024-01-01', tz='UTC').value
+        end = pd.Timestamp('2025-01-01', tz='UTC').value
+        times = pd.DatetimeIndex(np.random.default_rng(5).integers(start, end, 20_000), tz='UTC')
+
+        elevation, azimuth = ephemeris_positions(LATITUDE, LONGITUDE, times)
+        expected = pvlib.solarposition.get_solarposition(times, LATITUDE, LONGITUDE)
+        expected_elevation = expected['elevation'].to_numpy()
+        self.assertLess(np.abs(elevation - expected_elevation).max(), MAX_ERROR_DEGREES)
+        cosines = np.einsum(
+            'ij,ij->i', sun_direction(elevation, azimuth),
+            sun_direction(expected_elevation, expected['azimuth'].to_numpy()),
+        )
+        self.assertLess(np.degrees(np.arccos(np.clip(cosines, -1, 1))).max(), MAX_ERROR_DEGREES)
+        below_85 = np.abs(expected_elevation) < 85
+        azimuth_error = (azimuth - expected['azimuth'].to_numpy() + 180) % 360 - 180
+        self.assertLess(np.abs(azimuth_error[below_85]).max(), 0.001)
+
+
+class EphemerisBuildTests(EphemerisTestCase):
+    def wait_for_table(self):
+        for _ in range(500):
+            table = get_table(LATITUDE, LONGITUDE, 2024)
+            if table is not None:
+                return table
+            time.sleep(0.01)
+        self.fail("The table was never built.")
+
+    def test_built_once_in_the_background(self):
+        release = threading.Event()
+        table = np.zeros((10, 2), dtype=np.float32)
+
+        def build(*key):
+            release.wait(5)
+            return table
+
+        with mock.patch.object(ephemeris, 'build_table', side_effect=build) as build_table:
+            results = []
+            threads = [
+                threading.Thread(target=lambda: results.append(get_table(LATITUDE, LONGITUDE, 2024)))
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            # Nobody waits for the build
+            self.assertEqual(results, [None] * 8)
+            release.set()
+            np.testing.assert_array_equal(self.wait_for_table(), table)
+        build_table.assert_called_once_with(round(LATITUDE, 4), round(LONGITUDE, 4), 2024)
+        self.assertFalse(os.path.exists(f"{table_path(LATITUDE, LONGITUDE, 2024)}.building"))
+
+    def test_left_to_the_process_holding_the_lock(self):
+        path = table_path(LATITUDE, LONGITUDE, 2024)
+        os.makedirs(os.path.dirname(path))
+        open(f"{path}.building", 'w').close()
+        with mock.patch.object(ephemeris, 'build_table') as build_table:
+            self.assertIsNone(get_table(LATITUDE, LONGITUDE, 2024))
+            for _ in range(500):
+                if not ephemeris._building:
+                    break
+                time.sleep(0.01)
+        build_table.assert_not_called()
+        self.assertTrue(os.path.exists(f"{path}.building"))
+
+
+class ClearSkyIrradiationTests(SimpleTestCase):
+    def test_matches_pvlib_integrated_by_minute(self):
+        latitudes, longitudes = [23.03, 51.5], [72.52, -0.13]
+        dates = [datetime(2024, 3, 20), datetime(2024, 6, 21)]
+        irradiation = location_daily_irradiation(latitudes, longitudes, dates, 'Asia/Kolkata')
+        self.assertEqual(irradiation.shape, (2, 2))
+        for i, (latitude, longitude) in enumerate(zip(latitudes, longitudes)):
+            location = pvlib.location.Location(latitude, longitude, tz='Asia/Kolkata', altitude=0)
+            for j, date in enumerate(dates):
+                with self.subTest(latitude=latitude, date=date):
+                    times = pd.date_range(date, date + pd.Timedelta(days=1), freq='1min', tz='Asia/Kolkata')
+                    ghi = location.get_clearsky(times)['ghi'].to_numpy()
+                    expected = np.trapezoid(ghi, dx=1 / 60) / 1000
+                    self.assertAlmostEqual(irradiation[i, j], expected, delta=expected * 0.002)
+
+    def test_plausible_daily_totals(self):
+        irradiation = location_daily_irradiation([23.03], [72.52], [datetime(2024, 6, 21), datetime(2024, 12, 21)])
+        self.assertTrue(((irradiation > 4) & (irradiation < 10)).all())
+        self.assertGreater(irradiation[0, 0], irradiation[0, 1])
+
+
+class SolarPotentialViewTests(SimpleTestCase):
+    building = {
+        "length": 10, "breadth": 8, "height": 6, "latitude": 23.03, "longitude": 72.52,
+        "date_time": "2024-06-21T11:00:00",
+    }
+
+    def post(self, **data):
+        response = self.client.post(
+            reverse('solar_potential'), {**self.building, **data}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_clearsky_is_daily_irradiation(self):
+        irradiation = location_daily_irradiation([23.03], [72.52], [datetime(2024, 6, 21)])[0, 0]
+        clearsky = self.post(solar_irradiance='clearsky')
+        self.assertEqual(clearsky, self.post(solar_irradiance=irradiation))
+        self.assertEqual(clearsky, self.post())
+        self.assertGreater(clearsky["rooftop_potential_kwh"], 50)
+
+
+class SiteTests(TestCase):
+    def setUp(self):
+        clear_site_cache()
+        self.addCleanup(clear_site_cache)
+        self.record = Site.objects.create(name="Pune", latitude=18.52, longitude=73.86, altitude=560)
+
+    def test_context_of_record(self):
+        site = get_site(self.record.pk)
+        self.assertEqual((site.name, site.latitude, site.longitude, site.altitude), ("Pune", 18.52, 73.86, 560))
+        self.assertEqual(site.timezone.zone, 'Asia/Kolkata')
+        self.assertEqual(site.location.altitude, 560)
+        self.assertEqual(site_from(site.describe()).describe(), site.describe())
+        with self.assertRaisesMessage(ValueError, "Unknown site"):
+            get_site(self.record.pk + 1)
+
+    @override_settings(SITE_CACHE_TTL=60)
+    def test_version_checked_once_per_ttl(self):
+        site = get_site(self.record.pk)
+        with self.assertNumQueries(0):
+            self.assertIs(get_site(str(self.record.pk)), site)
+        # An edit by another process shows up once the TTL has passed
+        Site.objects.filter(pk=self.record.pk).update(latitude=19.0, updated_at=timezone.now())
+        self.assertIs(get_site(self.record.pk), site)
+        with override_settings(SITE_CACHE_TTL=0):
+            self.assertEqual(get_site(self.record.pk).latitude, 19.0)
+
+    @override_settings(SITE_CACHE_TTL=0)
+    def test_unchanged_site_kept(self):
+        site = get_site(self.record.pk)
+        with self.assertNumQueries(1):
+            self.assertIs(get_site(self.record.pk), site)
+
+    @override_settings(SITE_CACHE_TTL=60)
+    def test_saved_in_this_process(self):
+        get_site(self.record.pk)
+        self.record.latitude = 20.0
+        self.record.save()
+        self.assertEqual(get_site(self.record.pk).latitude, 20.0)
@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import SolarPositionView,SolarPotentialView
+from .views import SolarPositionBatchView, SolarPositionView, SolarPotentialBatchView, SolarPotentialView
 
 urlpatterns = [
     path('sun_position/', SolarPositionView.as_view(), name='solar_position'),
+    path('sun_position/batch/', SolarPositionBatchView.as_view(), name='solar_position_batch'),
     path('solar_potential/', SolarPotentialView.as_view(), name='solar_potential'),
+    path('solar_potential/batch/', SolarPotentialBatchView.as_view(), name='solar_potential_batch'),
 ]
\ No newline at end of file
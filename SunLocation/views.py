@@ -3,13 +3,17 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import JSONParser
 from datetime import datetime
-import pytz
 import numpy as np
-import pvlib
 import math
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import serializers
 from django.http import FileResponse
+from django.conf import settings
+import pandas as pd
+from .ephemeris import ephemeris_positions
+from .irradiance import CLEARSKY, clearsky_cosine_sums, location_daily_irradiation, parse_irradiance
+from .sites import get_site
+from .solar import daylight_cosine_sums, solar_positions_grid, sun_direction
 
 class SolarPositionView(APIView):
     # permission_classes = [IsAuthenticated]
@@ -21,30 +25,29 @@ class SolarPositionView(APIView):
             if not date_time:
                 return Response({"error": "Date and time not provided."}, status=status.HTTP_400_BAD_REQUEST)
 
+            # Site to compute for; the default site when none is given
+            try:
+                site = get_site(request.data.get('site'))
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
             # Parse the date and time
             custom_time = date_time
-            tz = pytz.timezone('Asia/Kolkata')  # Set the time zone for Ghaziabad
 
             try:
                 # Convert custom time to a datetime object
                 now = datetime.strptime(custom_time, '%Y-%m-%d %H:%M:%S')
-                now = tz.localize(now)  # Localize the datetime object to the IST time zone
+                now = site.timezone.localize(now)  # Localize the datetime object to the site's time zone
             except ValueError:
                 return Response({"error": "Invalid time format. Use 'YYYY-MM-DD HH:MM:SS'."}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Ghaziabad coordinates
-            latitude = 23.030357 
-            longitude = 72.517845 
-
-            # Create a location object for Ghaziabad
-            location = pvlib.location.Location(latitude, longitude, tz=tz)
+            latitude = site.latitude
+            longitude = site.longitude
 
-            # Calculate solar position for the given time
-            solar_position = location.get_solarposition(now)
-
-            # Extract the relevant solar position values
-            altitude = solar_position['elevation'].values[0]
-            azimuth = solar_position['azimuth'].values[0]
+            # Interpolate the solar position from the site's precomputed sun path
+            elevation, azimuth = ephemeris_positions(latitude, longitude, [now])
+            altitude = elevation[0]
+            azimuth = azimuth[0]
 
             # Assuming a distance of 100 units from the city to the Sun
             r = 100
@@ -70,6 +73,74 @@ class SolarPositionView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class SolarPositionBatchView(APIView):
+    """
+    Sun positions for many timestamps and locations in one call.
+
+    Takes ``datetimes`` (a list of 'YYYY-MM-DD HH:MM:SS' strings) or a
+    ``start``/``end``/``freq`` range, optional ``locations`` (a list of
+    ``{"latitude", "longitude"}`` objects or [lat, lon] pairs) and ``tz``,
+    which default to those of ``site``.
+    The response is columnar: one list of timestamps, and per location
+    lists of elevation, azimuth and the x/y/z position at distance 100.
+    """
+    # permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        try:
+            site = get_site(request.data.get('site'))
+            tz = request.data.get('tz', site.timezone.zone)
+            if request.data.get('datetimes') is not None:
+                times = pd.DatetimeIndex([
+                    datetime.strptime(value, '%Y-%m-%d %H:%M:%S') for value in request.data.get('datetimes')
+                ])
+            elif request.data.get('start') and request.data.get('end'):
+                times = pd.date_range(
+                    datetime.strptime(request.data.get('start'), '%Y-%m-%d %H:%M:%S'),
+                    datetime.strptime(request.data.get('end'), '%Y-%m-%d %H:%M:%S'),
+                    freq=request.data.get('freq', '1h'),
+                )
+            else:
+                return Response({"error": "Provide datetimes or a start and end."}, status=status.HTTP_400_BAD_REQUEST)
+
+            locations = request.data.get('locations') or [
+                [site.latitude, site.longitude]
+            ]
+            coordinates = np.array([
+                (location['latitude'], location['longitude']) if isinstance(location, dict) else location
+                for location in locations
+            ], dtype=np.float64).reshape(-1, 2)
+            if len(coordinates) * len(times) > settings.SUN_POSITION_BATCH_MAX_POINTS:
+                return Response(
+                    {"error": f"At most {settings.SUN_POSITION_BATCH_MAX_POINTS} location/time pairs per request."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            elevation, azimuth = solar_positions_grid(coordinates[:, 0], coordinates[:, 1], times, tz)
+            positions = np.round(100 * sun_direction(elevation, azimuth), 2)
+
+            return Response({
+                'datetime': times.strftime('%Y-%m-%d %H:%M:%S').tolist(),
+                'locations': [
+                    {
+                        'latitude': latitude,
+                        'longitude': longitude,
+                        'elevation': np.round(elevation[i], 4).tolist(),
+                        'azimuth': np.round(azimuth[i], 4).tolist(),
+                        'x': positions[i, :, 0].tolist(),
+                        'y': positions[i, :, 1].tolist(),
+                        'z': positions[i, :, 2].tolist(),
+                    }
+                    for i, (latitude, longitude) in enumerate(coordinates.tolist())
+                ],
+            }, status=status.HTTP_200_OK)
+
+        except (ValueError, TypeError, KeyError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class SolarPotentialView(APIView):
     
     # permission_classes = [IsAuthenticated]
@@ -120,14 +191,16 @@ class SolarPotentialView(APIView):
             latitude = request.data.get('latitude')
             longitude = request.data.get('longitude')
             date_time = request.data.get('date_time')  # ISO 8601 format
-            solar_irradiance = request.data.get('solar_irradiance')  # kWh/m²/day
+            # kWh/m²/day; omitted or 'clearsky' for the day's clear-sky global
+            # irradiation at the building
+            solar_irradiance = parse_irradiance(request.data.get('solar_irradiance'))
             efficiency_bipv = request.data.get('efficiency_bipv', 0.12)  # Default 12%
             efficiency_rooftop = request.data.get('efficiency_rooftop', 0.18)  # Default 18%
 
             # Validate input
-            if not all([length, breadth, height, latitude, longitude, date_time, solar_irradiance]):
+            if not all([length, breadth, height, latitude, longitude, date_time]):
                 return Response(
-                    {"error": "length, breadth, height, latitude, longitude, date_time, and solar_irradiance are required."},
+                    {"error": "length, breadth, height, latitude, longitude and date_time are required."},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
@@ -137,13 +210,17 @@ class SolarPotentialView(APIView):
             height = float(height)
             latitude = float(latitude)
             longitude = float(longitude)
-            solar_irradiance = float(solar_irradiance)
             efficiency_bipv = float(efficiency_bipv)
             efficiency_rooftop = float(efficiency_rooftop)
+            if solar_irradiance == CLEARSKY:
+                solar_irradiance = location_daily_irradiation(
+                    [latitude], [longitude], [datetime.fromisoformat(date_time)],
+                    get_site(request.data.get('site')).timezone.zone,
+                )[0, 0]
 
-            # Calculate θ for BIPV and rooftop
-            theta_bipv = self.calculate_theta(latitude, longitude, date_time)
-            theta_rooftop = self.calculate_theta(latitude, longitude, date_time)
+            # Calculate θ once; rooftop and BIPV share the same sun
+            theta = self.calculate_theta(latitude, longitude, date_time)
+            theta_bipv = theta_rooftop = theta
 
             # Calculate rooftop area and potential
             rooftop_area = length * breadth
@@ -174,6 +251,93 @@ class SolarPotentialView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+
+class SolarPotentialBatchView(APIView):
+    """
+    Rooftop and BIPV potential of many buildings over many timestamps.
+
+    Takes ``buildings`` (a list of ``{"length", "breadth", "height"}``
+    objects with optional ``latitude``/``longitude``, defaulting to those of
+    ``site``), ``date_times`` (ISO 8601 strings) or a ``start``/``end``/
+    ``freq`` range, ``solar_irradiance`` (omitted or 'clearsky' for the
+    clear-sky DNI of each location, in kW/m²) and the optional efficiencies.
+    Potentials use the same model as SolarPotentialView, summed over the
+    timestamps; times with the sun below the horizon add nothing. The
+    response lists one rooftop and one BIPV total per building, in order.
+    """
+    # permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            site = get_site(request.data.get('site'))
+            buildings = request.data.get('buildings')
+            solar_irradiance = parse_irradiance(request.data.get('solar_irradiance'))
+            if not buildings:
+                return Response({"error": "buildings are required."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if len(buildings) > settings.SOLAR_POTENTIAL_BATCH_MAX_BUILDINGS:
+                return Response(
+                    {"error": f"At most {settings.SOLAR_POTENTIAL_BATCH_MAX_BUILDINGS} buildings per request."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            if request.data.get('date_times') is not None:
+                times = pd.DatetimeIndex([datetime.fromisoformat(value) for value in request.data.get('date_times')])
+            elif request.data.get('start') and request.data.get('end'):
+                times = pd.date_range(
+                    datetime.fromisoformat(request.data.get('start')),
+                    datetime.fromisoformat(request.data.get('end')),
+                    freq=request.data.get('freq', '1h'),
+                )
+            else:
+                return Response({"error": "Provide date_times or a start and end."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if len(times) > settings.SOLAR_POTENTIAL_BATCH_MAX_TIMESTEPS:
+                return Response(
+                    {"error": f"At most {settings.SOLAR_POTENTIAL_BATCH_MAX_TIMESTEPS} timestamps per request."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            dimensions = np.array([
+                (building['length'], building['breadth'], building['height'],
+                 building.get('latitude', site.latitude), building.get('longitude', site.longitude))
+                for building in buildings
+            ], dtype=np.float64)
+            length, breadth, height, latitude, longitude = dimensions.T
+            efficiency_bipv = float(request.data.get('efficiency_bipv', 0.12))
+            efficiency_rooftop = float(request.data.get('efficiency_rooftop', 0.18))
+
+            # The sun only depends on the location, so buildings sharing one
+            # are evaluated together
+            locations, location_ids = np.unique(np.stack((latitude, longitude), axis=1), axis=0, return_inverse=True)
+            if solar_irradiance == CLEARSKY:
+                # Each timestamp weighted by the clear-sky DNI (kW/m²) at the location
+                cosine_sums = clearsky_cosine_sums(
+                    locations[:, 0], locations[:, 1], times, site.timezone.zone
+                )[location_ids.ravel()]
+                solar_irradiance = 1.0
+            else:
+                cosine_sums = daylight_cosine_sums(locations[:, 0], locations[:, 1], times)[location_ids.ravel()]
+
+            rooftop_potential = length * breadth * solar_irradiance * efficiency_rooftop * cosine_sums
+            bipv_potential = height * breadth * solar_irradiance * efficiency_bipv * cosine_sums
+
+            return Response({
+                "timestamps": len(times),
+                "rooftop_potential_kwh": np.round(rooftop_potential, 2).tolist(),
+                "bipv_potential_kwh": np.round(bipv_potential, 2).tolist(),
+                "total_rooftop_potential_kwh": round(float(rooftop_potential.sum()), 2),
+                "total_bipv_potential_kwh": round(float(bipv_potential.sum()), 2),
+            }, status=status.HTTP_200_OK)
+
+        except KeyError as e:
+            return Response({"error": f"Every building needs {e.args[0]}."}, status=status.HTTP_400_BAD_REQUEST)
+        except (ValueError, TypeError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 # class HeatMapView(APIView):
 #     def get(self, request, *args, **kwargs):
 #         # File paths